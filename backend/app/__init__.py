@@ -1,21 +1,38 @@
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Runtime profile: 'threading' (default) or 'eventlet' for cooperative I/O.
+# Eventlet has to patch the standard library before pymongo, openai/httpx or
+# anything else creates sockets, locks or threads, so it happens first.
+ASYNC_MODE = os.getenv('ASYNC_MODE', 'threading')
+if ASYNC_MODE == 'eventlet':
+    try:
+        # httpcore (used by openai) imports trio when it is installed, and trio
+        # needs the select.epoll that patching removes
+        import trio  # noqa: F401
+    except ImportError:
+        pass
+    import eventlet
+    eventlet.monkey_patch()
+
 from flask import Flask, request
 from flask_socketio import SocketIO
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from flask_login import LoginManager
 from pymongo import MongoClient
-from dotenv import load_dotenv
-import os
 import logging
-
-# Load environment variables
-load_dotenv()
+import threading
+import time
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
 # Initialize Flask-SocketIO
-socketio = SocketIO(cors_allowed_origins="*")
+socketio = SocketIO(cors_allowed_origins="*", async_mode=ASYNC_MODE)
 
 # Initialize MongoDB
 client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
@@ -24,7 +41,53 @@ db = client.slack_db
 # Initialize Flask-Login
 login_manager = LoginManager()
 
+def _index_steps():
+    """(description, create) for every index the app relies on"""
+    from app.services.search_index import SearchIndex
+    from app.models.conversation import Conversation
+    from app.models.receipt import ReadReceipt
+    from app.services.ai_cache import AIResponseCache
+    from app.services.notes_summaries import NoteSummaryCache
+    from app.services.message_analysis import MessageAnalyses
+    from app.services.speculative_replies import SpeculativeReplies
+    from app.services.job_queue import JobQueue
+    return [
+        # Keyset pagination for channel and DM history: newest-first by (created_at, _id)
+        ('message history', lambda: db.messages.create_index([
+            ('channel_id', 1), ('parent_id', 1), ('created_at', -1), ('_id', -1)
+        ])),
+        # Keyset pagination for thread replies by (created_at, _id), read newest-first
+        ('thread replies', lambda: db.messages.create_index([('parent_id', 1), ('created_at', 1), ('_id', 1)])),
+        # Full-text search postings
+        ('search index', SearchIndex.ensure_indexes),
+        # Recent DM conversations
+        ('conversations', Conversation.ensure_indexes),
+        # Read/delivered watermarks
+        ('read receipts', ReadReceipt.ensure_indexes),
+        # Expiry of shared AI response cache entries
+        ('AI response cache', AIResponseCache.ensure_indexes),
+        # Expiry of cached partial meeting notes
+        ('note summaries', NoteSummaryCache.ensure_indexes),
+        # Reuse of stored message analyses by content hash
+        ('message analyses', MessageAnalyses.ensure_indexes),
+        # Expiry of speculative quick replies and their hourly budget
+        ('speculative replies', SpeculativeReplies.ensure_indexes),
+        # Background job queue
+        ('job queue', JobQueue.ensure_indexes)
+    ]
+
+def ensure_indexes():
+    """Create the indexes that the message query paths rely on (idempotent).
+    Each one is attempted separately, so one failure doesn't leave the others missing.
+    """
+    for name, create in _index_steps():
+        try:
+            create()
+        except Exception as e:
+            print(f"Error creating {name} indexes: {str(e)}")
+
 def create_app(test_config=None):
+    started = time.perf_counter()
     app = Flask(__name__)
     
     # Configure app
@@ -41,7 +104,7 @@ def create_app(test_config=None):
                 "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
                 "allow_headers": ["Content-Type", "Authorization"],
                 "supports_credentials": True,
-                "expose_headers": ["Content-Type", "Authorization"],
+                "expose_headers": ["Content-Type", "Authorization", "X-Next-Cursor", "X-Prev-Cursor"],
                 "max_age": 120,
                 "send_wildcard": False,
                 "vary_header": True
@@ -98,8 +161,13 @@ def create_app(test_config=None):
                 return None
         return None
     
-    # Initialize socketio with app
-    socketio.init_app(app)
+    # Initialize socketio with app, sharing events across processes when a
+    # message queue is configured (see SOCKETIO_MESSAGE_QUEUE)
+    from app.sockets.pubsub import get_client_manager_options
+    socketio.init_app(app, **get_client_manager_options())
+    
+    # Make sure query indexes exist, without holding up boot on the database
+    threading.Thread(target=ensure_indexes, daemon=True).start()
     
     # Import blueprints
     from app.routes.auth import auth_bp
@@ -124,6 +192,10 @@ def create_app(test_config=None):
     # Import socket event handlers
     from app.sockets import events
     
+    # Start background job workers (handlers are registered by the blueprints above)
+    from app.services.job_queue import job_queue
+    job_queue.start_workers()
+    
     # Create uploads directory if it doesn't exist
     uploads_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads')
     os.makedirs(uploads_dir, exist_ok=True)
@@ -150,4 +222,8 @@ def create_app(test_config=None):
             print(f"User {user_id} joining their personal room")
             socketio.emit('user_room_joined', {'user_id': user_id}, room=user_id)
     
+    # Boot time should not depend on upstream services (AI is initialized lazily)
+    app.config['STARTUP_SECONDS'] = time.perf_counter() - started
+    print(f"App created in {app.config['STARTUP_SECONDS'] * 1000:.0f}ms")
+    
     return app
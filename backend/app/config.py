@@ -30,4 +30,73 @@ class Config:
     AI_REQUESTS_PER_MINUTE = 10  # Adjust based on your needs
     
     # Response Caching
-    AI_CACHE_TIMEOUT = 300  # 5 minutes 
\ No newline at end of file
+    AI_CACHE_TIMEOUT = 300  # 5 minutes
+    AI_CACHE_MAX_TEMPERATURE = 0.3  # Sampled (higher temperature) completions are never cached
+    AI_CACHE_MEMORY_SIZE = 1024  # Completions kept in each worker's LRU tier
+
+    # Latency budgets for the three parallel reply suggestions (seconds). Once the
+    # budget is spent the suggestions that have finished are returned.
+    SUGGEST_REPLY_BUDGET = 8.0
+    QUICK_REPLY_BUDGET = 5.0
+    AI_MAX_PARALLEL_REQUESTS = 16  # Upstream calls in flight per worker
+    AI_MAX_BATCH_REQUESTS = 4  # Of those, upstream calls for batch work (notes summaries) per worker
+
+    # Speculative quick replies: new messages and thread replies addressed to users who are
+    # connected get default (professional, medium) quick-reply suggestions generated in the
+    # background, so suggest-quick-reply can answer without waiting on the model
+    SPECULATIVE_REPLIES = os.getenv('SPECULATIVE_REPLIES', 'false').lower() == 'true'
+    SPECULATIVE_REPLY_BUDGET = 200  # Speculative generations per hour for the workspace
+    SPECULATIVE_REPLY_WORKERS = 1  # Background threads per process
+    SPECULATIVE_REPLY_QUEUE = 20  # Messages waiting per process; more are not speculated on
+    SPECULATIVE_REPLY_RETENTION_SECONDS = 24 * 60 * 60
+
+    # Thread context sent with reply suggestions (tokens). The newest and most relevant
+    # messages are kept within the budget and the rest is replaced by a short summary.
+    SUGGEST_CONTEXT_TOKENS = 2000
+    SUGGEST_CONTEXT_WINDOW = 50  # Messages loaded when the context is read server-side
+    SUGGEST_CONTEXT_RECENT = 6  # Newest messages kept before relevance ranking
+    SUGGEST_CONTEXT_SUMMARY_TOKENS = 200  # Reserved for the summary of what was left out
+    CONTEXT_SUMMARY_INPUT_TOKENS = 3000  # Newest left-out messages read by the summarizer
+
+    # Analyze the tone of every new or edited message in the background and store it on the message
+    ANALYZE_NEW_MESSAGES = True
+
+    # Model routing for tone analysis: try the cheaper model first and escalate to the
+    # next one when its output fails validation or its confidence is below the minimum.
+    # A model whose p95 latency for analysis is over the budget (seconds) is skipped in
+    # favour of one within it, and an upstream error moves on to the next model
+    ANALYSIS_MODELS = ['3.5', '4']
+    # Clear-cut messages are classified locally (app/services/tone_classifier.py) without a model call
+    ANALYSIS_LOCAL_CLASSIFIER = True
+    ANALYSIS_MIN_CONFIDENCE = 0.7
+    ANALYSIS_LATENCY_BUDGET = 6.0
+    # Analyses arriving within the window share one upstream call (0 disables batching)
+    ANALYSIS_BATCH_WINDOW = 0.05  # Seconds the first request of a batch waits for others
+    ANALYSIS_BATCH_SIZE = 8  # A full batch is sent without waiting for the window
+    AI_LATENCY_WINDOW = 100  # Recent calls per model used for latency percentiles
+    AI_LATENCY_MIN_SAMPLES = 20  # Calls seen before a model can be skipped as slow
+    AI_LATENCY_MAX_AGE = 300  # Seconds a latency sample counts; a skipped model is retried once they expire
+
+    # Background OpenAI health probing (seconds)
+    AI_HEALTH_INTERVAL = 60  # Between probes while healthy
+    AI_HEALTH_RETRY = 5  # First retry after a failure, doubling up to the interval
+    AI_HEALTH_TIMEOUT = 5  # Per probe request
+    AI_HEALTH_TRIAL_INTERVAL = 5  # While unhealthy, one request is let through this often to detect recovery
+
+    # Hot message cache (newest top-level messages per channel)
+    MESSAGE_CACHE_CHANNELS = 256  # Channels kept before LRU eviction
+    MESSAGE_CACHE_SIZE = 50  # Messages kept per channel
+
+    # Background jobs (notes generation)
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))  # Worker threads per process, 0 to disable
+    JOB_POLL_INTERVAL = 1.0  # Seconds between queue polls when idle
+    JOB_LEASE_SECONDS = 600  # A running job is re-claimed if not finished within this
+    JOB_MAX_ATTEMPTS = 3
+    JOB_RETRY_DELAY = 10  # Seconds before the first retry, doubling afterwards
+    JOB_RETENTION_SECONDS = 7 * 24 * 60 * 60  # Finished jobs are kept for a week
+
+    # Meeting notes over long conversations (map-reduce summarization, in tokens)
+    NOTES_CHUNK_TOKENS = 3000  # Transcript per chunk summary
+    NOTES_MERGE_TOKENS = 6000  # Chunk summaries merged per call
+    NOTES_CHUNK_MODEL = '3.5'  # Chunk summaries; the final merge uses the notes model
+    NOTES_SUMMARY_RETENTION_SECONDS = 30 * 24 * 60 * 60  # Unused chunk summaries expire after 30 days
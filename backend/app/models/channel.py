@@ -1,6 +1,7 @@
 from datetime import datetime
 from bson import ObjectId
 from app import db
+from app.utils.loaders import get_loader
 
 class Channel:
     def __init__(self, name, created_by=None, description='', is_private=False, is_direct=False, members=None, _id=None):
@@ -92,7 +93,7 @@ class Channel:
             channel_name = f"{user1_name} & {user2_name}"
                 
             # Create new DM channel with both users as members
-            return Channel.create(
+            channel = Channel.create(
                 name=channel_name,
                 created_by=member_ids[0],
                 is_direct=True,
@@ -100,6 +101,11 @@ class Channel:
                 members=member_ids,  # Include both users in members array
                 description=f"Direct message between {user1_name} and {user2_name}"
             )
+            
+            # Show the new DM in both users' recent chats right away
+            from app.models.conversation import Conversation
+            Conversation.ensure_for_channel(channel)
+            return channel
         except Exception as e:
             print(f"Error creating DM channel: {str(e)}")
             raise
@@ -226,10 +232,12 @@ class Channel:
 
     def to_response_dict(self):
         """Convert Channel instance to API response dictionary"""
-        # Get member details
+        # Get member details, batch-loaded through the request's hydration loader
+        loader = get_loader()
+        loader.prime_channels([self])
         member_details = []
         for member_id in self.members:
-            member = db.users.find_one({'_id': member_id})
+            member = loader.get_user(member_id)
             if member:
                 member_details.append({
                     'id': str(member['_id']),
@@ -0,0 +1,131 @@
+from datetime import datetime
+from bson import ObjectId
+from pymongo import UpdateOne
+from app import db
+from app.utils.loaders import get_loader
+
+# Length of the last-message preview stored on each conversation
+PREVIEW_LENGTH = 140
+
+class Conversation:
+    """Materialized per-(user, DM channel) row backing the recent chats sidebar.
+
+    Each DM send updates one row per member with the last message preview, its
+    timestamp, a snapshot of the peer's profile and the member's unread count.
+    """
+
+    @staticmethod
+    def ensure_indexes():
+        db.conversations.create_index([('user_id', 1), ('channel_id', 1)], unique=True)
+        db.conversations.create_index([('user_id', 1), ('last_message_at', -1)])
+
+    @staticmethod
+    def _peer_snapshot(peer):
+        return {
+            'id': str(peer['_id']),
+            'username': peer['username'],
+            'display_name': peer.get('display_name', peer['username']),
+            'avatar_url': peer.get('avatar_url')
+        }
+
+    @staticmethod
+    def _member_pairs(channel):
+        """Yield (member_id, peer_doc) for each member of a DM channel"""
+        loader = get_loader()
+        loader.load_users(channel.members)
+        for member_id in channel.members:
+            peer_id = next((m for m in channel.members if m != member_id), None)
+            peer = loader.get_user(peer_id) if peer_id else None
+            if peer:
+                yield member_id, peer
+
+    @staticmethod
+    def ensure_for_channel(channel):
+        """Create empty conversation rows for a new DM channel"""
+        now = datetime.utcnow()
+        ops = [
+            UpdateOne(
+                {'user_id': member_id, 'channel_id': channel._id},
+                {'$setOnInsert': {
+                    'peer': Conversation._peer_snapshot(peer),
+                    'last_message': None,
+                    'last_message_at': now,
+                    'unread_count': 0
+                }},
+                upsert=True
+            )
+            for member_id, peer in Conversation._member_pairs(channel)
+        ]
+        if ops:
+            db.conversations.bulk_write(ops, ordered=False)
+
+    @staticmethod
+    def record_message(channel, sender_id, content, created_at, count_unread=True):
+        """Update every member's conversation row after a DM is sent"""
+        sender_id = ObjectId(sender_id)
+        preview = content[:PREVIEW_LENGTH] if isinstance(content, str) else None
+        ops = []
+        for member_id, peer in Conversation._member_pairs(channel):
+            update = {
+                '$set': {
+                    'peer': Conversation._peer_snapshot(peer),
+                    'last_message': preview,
+                    'last_message_sender_id': str(sender_id),
+                    'last_message_at': created_at
+                }
+            }
+            if member_id == sender_id:
+                update['$set']['unread_count'] = 0
+            elif count_unread:
+                update['$inc'] = {'unread_count': 1}
+            ops.append(UpdateOne({'user_id': member_id, 'channel_id': channel._id}, update, upsert=True))
+        if ops:
+            db.conversations.bulk_write(ops, ordered=False)
+
+    @staticmethod
+    def mark_read(user_id, channel_id):
+        """Reset a user's unread count for a DM channel (no-op for regular channels)"""
+        db.conversations.update_one(
+            {'user_id': ObjectId(user_id), 'channel_id': ObjectId(channel_id), 'unread_count': {'$gt': 0}},
+            {'$set': {'unread_count': 0}}
+        )
+
+    @staticmethod
+    def get_recent(user_id, limit=50):
+        """Get a user's DM conversations, most recent first"""
+        return list(db.conversations.find(
+            {'user_id': ObjectId(user_id)},
+            sort=[('last_message_at', -1)],
+            limit=limit
+        ))
+
+    @staticmethod
+    def to_response_dict(data):
+        last_message_at = data.get('last_message_at')
+        return {
+            'channel_id': str(data['channel_id']),
+            'user': data['peer'],
+            'last_message': data.get('last_message'),
+            'last_message_at': last_message_at.isoformat() if last_message_at else None,
+            'unread_count': data.get('unread_count', 0)
+        }
+
+    @staticmethod
+    def rebuild():
+        """Rebuild all conversation rows from existing DM channels and messages"""
+        from app.models.channel import Channel
+        rebuilt = 0
+        for channel_data in db.channels.find({'is_direct': True}):
+            channel = Channel.from_dict(channel_data)
+            Conversation.ensure_for_channel(channel)
+            last_message = db.messages.find_one(
+                {'channel_id': channel._id, 'parent_id': None},
+                sort=[('created_at', -1), ('_id', -1)]
+            )
+            if last_message:
+                Conversation.record_message(
+                    channel, last_message['sender_id'], last_message.get('content'),
+                    last_message['created_at'], count_unread=False
+                )
+            rebuilt += 1
+        return rebuilt
@@ -3,6 +3,7 @@ import os
 from bson import ObjectId
 from app import db
 from app.config import UPLOAD_FOLDER, ALLOWED_EXTENSIONS
+from app.utils.concurrency import run_blocking
 
 class File:
     def __init__(self, filename, content_type, size, uploader_id, file_type='document', _id=None):
@@ -101,14 +102,17 @@ class File:
             # Create directory if it doesn't exist
             os.makedirs(os.path.dirname(self.storage_path), exist_ok=True)
             
-            # Write file
-            with open(self.storage_path, 'wb') as f:
-                f.write(file_data)
+            # Write file (disk I/O is not cooperative, keep it off the event loop)
+            run_blocking(self._write, file_data)
         except Exception as e:
             # Clean up file record if save fails
             db.files.delete_one({'_id': self._id})
             raise e
 
+    def _write(self, file_data):
+        with open(self.storage_path, 'wb') as f:
+            f.write(file_data)
+
     def delete_file(self):
         """Delete file from disk and database"""
         try:
@@ -2,6 +2,7 @@ from datetime import datetime
 from bson import ObjectId
 from app import db
 from app.models.channel import Channel
+from app.utils.loaders import get_loader
 
 class Invitation:
     def __init__(self, channel_id, inviter_id, invitee_id, status='pending', _id=None):
@@ -86,7 +87,7 @@ class Invitation:
 
     def to_response_dict(self):
         """Convert invitation to dictionary for API response"""
-        channel = Channel.get_by_id(self.channel_id)
+        channel = get_loader().get_channel(self.channel_id)
         return {
             'id': str(self._id),
             'channel_id': str(self.channel_id),
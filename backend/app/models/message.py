@@ -1,10 +1,18 @@
 from datetime import datetime
 from bson import ObjectId
+from pymongo import ReturnDocument
 from app import db
-from app.models.file import File
+from app.utils.loaders import get_loader
+from app.services.message_cache import message_cache
+from app.services.message_analysis import message_analyses
+from app.services.search_index import search_index
+from app.utils.pagination import to_mongo_precision
 from pydantic import BaseModel
 from typing import List, Optional
 
+# Most recent distinct repliers kept on a thread's parent message
+MAX_THREAD_PARTICIPANTS = 10
+
 class MessageAnalysis(BaseModel):
     """Model for message tone and impact analysis"""
     tone: str  # aggressive/weak/neutral/confusing
@@ -21,39 +29,29 @@ class Message(BaseModel):
     created_at: datetime
     updated_at: Optional[datetime] = None
     reply_count: Optional[int] = 0
+    last_reply_at: Optional[datetime] = None
+    thread_participants: Optional[List[str]] = None
     parent_id: Optional[str] = None
     file: Optional[dict] = None
     is_direct: Optional[bool] = False
     analysis: Optional[MessageAnalysis] = None  # Add analysis field to messages
     message_type: Optional[str] = 'text'
-    delivery_status: Optional[dict] = None
     file_id: Optional[str] = None
 
     def __init__(self, **data):
-        # Initialize delivery_status before calling super().__init__
-        delivery_status = data.get('delivery_status', {
-            'sent': True,
-            'delivered': False,
-            'read': False,
-            'delivered_to': [],
-            'read_by': [],
-            'sent_at': data.get('created_at') or datetime.utcnow(),
-            'delivered_at': None,
-            'read_at': None
-        })
-        data['delivery_status'] = delivery_status
-        
         super().__init__(**data)
         self._id = data.get('_id') or ObjectId()
         self.created_at = data.get('created_at') or datetime.utcnow()
         self.updated_at = data.get('updated_at') or datetime.utcnow()
         self.reply_count = data.get('reply_count', 0)
         self.message_type = data.get('message_type', 'text')
+        self._thread_summary = None
 
     @staticmethod
     def create(channel_id, sender_id, content, message_type='text', file_id=None, parent_id=None):
         """Create a new message"""
-        now = datetime.utcnow()
+        # Stored precision, so the cached copy and its cursors match the document
+        now = to_mongo_precision(datetime.utcnow())
         message_data = {
             'id': str(ObjectId()),  # Generate a new ID
             'channel_id': str(channel_id) if isinstance(channel_id, ObjectId) else channel_id,
@@ -64,17 +62,7 @@ class Message(BaseModel):
             'parent_id': str(parent_id) if parent_id and isinstance(parent_id, ObjectId) else parent_id,
             'reply_count': 0,
             'created_at': now,
-            'updated_at': now,
-            'delivery_status': {
-                'sent': True,
-                'delivered': False,
-                'read': False,
-                'delivered_to': [],
-                'read_by': [],
-                'sent_at': now,
-                'delivered_at': None,
-                'read_at': None
-            }
+            'updated_at': now
         }
         
         # Create Message instance
@@ -96,43 +84,102 @@ class Message(BaseModel):
             'parent_id': parent_id if isinstance(parent_id, ObjectId) else ObjectId(parent_id) if parent_id else None,
             'reply_count': 0,
             'created_at': now,
-            'updated_at': now,
-            'delivery_status': message_data['delivery_status']
+            'updated_at': now
         }
         
         db.messages.insert_one(db_data)
         
-        # If this is a reply, update parent's reply count
-        if parent_id:
-            parent_id_obj = parent_id if isinstance(parent_id, ObjectId) else ObjectId(parent_id)
-            reply_count = db.messages.count_documents({'parent_id': parent_id_obj})
-            db.messages.update_one(
-                {'_id': parent_id_obj},
-                {'$set': {'reply_count': reply_count}}
+        # Add to the full-text search index; a failure here must not lose the message
+        try:
+            search_index.index_message(
+                message._id, message._channel_id, content, now, message_type, db_data['parent_id']
             )
+        except Exception as e:
+            print(f"Error indexing message {message._id}: {str(e)}")
+        
+        # If this is a reply, update the parent's thread summary
+        if parent_id:
+            message._thread_summary = Message.record_reply(parent_id, message._sender_id, now)
+            if message._thread_summary:
+                summary = dict(message._thread_summary)
+                message_cache.patch_message(message._channel_id, summary.pop('message_id'), summary)
+        elif message_cache.is_cached(message._channel_id):
+            # Keep the channel's hot page current
+            message_cache.add_message(message._channel_id, message.to_response_dict())
+        else:
+            # A first page being loaded right now predates this message, so it must not be cached
+            message_cache.record_write(message._channel_id)
+        
+        # Tone analysis is stored on the message and pushed to clients once ready
+        message_analyses.schedule(message._id, message._channel_id, content, db_data['parent_id'])
         
         return message
 
+    @staticmethod
+    def record_reply(parent_id, sender_id, replied_at):
+        """Atomically bump a thread's reply count, last reply time and recent participants.
+
+        Runs as a single pipeline update so concurrent replies never lose increments.
+        Returns the parent's updated thread summary, or None if the parent is gone.
+        """
+        parent_id = parent_id if isinstance(parent_id, ObjectId) else ObjectId(parent_id)
+        sender = str(sender_id)
+        parent = db.messages.find_one_and_update(
+            {'_id': parent_id},
+            [{'$set': {
+                'reply_count': {'$add': [{'$ifNull': ['$reply_count', 0]}, 1]},
+                'last_reply_at': {'$max': [{'$ifNull': ['$last_reply_at', replied_at]}, replied_at]},
+                # Move the sender to the end of the list and keep only the latest N
+                'thread_participants': {'$slice': [
+                    {'$concatArrays': [
+                        {'$filter': {
+                            'input': {'$ifNull': ['$thread_participants', []]},
+                            'cond': {'$ne': ['$$this', sender]}
+                        }},
+                        [sender]
+                    ]},
+                    -MAX_THREAD_PARTICIPANTS
+                ]}
+            }}],
+            projection={'reply_count': 1, 'last_reply_at': 1, 'thread_participants': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if not parent:
+            return None
+        return Message.thread_summary_dict(parent)
+
+    @staticmethod
+    def record_reply_deleted(parent_id):
+        """Decrement a thread's reply count after one of its replies is deleted"""
+        parent = db.messages.find_one_and_update(
+            {'_id': ObjectId(parent_id), 'reply_count': {'$gt': 0}},
+            {'$inc': {'reply_count': -1}},
+            projection={'reply_count': 1, 'last_reply_at': 1, 'thread_participants': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if not parent:
+            return None
+        return Message.thread_summary_dict(parent)
+
+    @staticmethod
+    def thread_summary_dict(data):
+        """Serialize the thread summary fields of a parent message document"""
+        last_reply_at = data.get('last_reply_at')
+        return {
+            'message_id': str(data['_id']),
+            'reply_count': data.get('reply_count', 0),
+            'last_reply_at': last_reply_at.isoformat() if last_reply_at else None,
+            'thread_participants': data.get('thread_participants', [])
+        }
+
     @staticmethod
     def get_replies(message_id, limit=50):
         """Get replies for a message"""
-        # Get all replies
         replies = list(db.messages.find(
             {'parent_id': ObjectId(message_id)},
-            sort=[('created_at', 1)],
+            sort=[('created_at', 1), ('_id', 1)],
             limit=limit
         ))
-        
-        # Update parent message with accurate reply count
-        actual_count = db.messages.count_documents({
-            'parent_id': ObjectId(message_id)
-        })
-        
-        db.messages.update_one(
-            {'_id': ObjectId(message_id)},
-            {'$set': {'reply_count': actual_count}}
-        )
-        
         return [Message.from_dict(reply) for reply in replies]
 
     @staticmethod
@@ -152,52 +199,6 @@ class Message(BaseModel):
         ))
         return [Message.from_dict(msg) for msg in messages]
 
-    @staticmethod
-    def mark_delivered(message_id, user_id):
-        """Mark message as delivered to a user"""
-        message = db.messages.find_one({'_id': ObjectId(message_id)})
-        if not message:
-            return None
-            
-        # Update delivery status if not already delivered
-        if str(user_id) not in message.get('delivery_status', {}).get('delivered_to', []):
-            db.messages.update_one(
-                {'_id': ObjectId(message_id)},
-                {
-                    '$set': {
-                        'delivery_status.delivered': True,
-                        'delivery_status.delivered_at': datetime.utcnow()
-                    },
-                    '$addToSet': {
-                        'delivery_status.delivered_to': str(user_id)
-                    }
-                }
-            )
-        return Message.from_dict(db.messages.find_one({'_id': ObjectId(message_id)}))
-
-    @staticmethod
-    def mark_read(message_id, user_id):
-        """Mark message as read by a user"""
-        message = db.messages.find_one({'_id': ObjectId(message_id)})
-        if not message:
-            return None
-            
-        # Update read status if not already read
-        if str(user_id) not in message.get('delivery_status', {}).get('read_by', []):
-            db.messages.update_one(
-                {'_id': ObjectId(message_id)},
-                {
-                    '$set': {
-                        'delivery_status.read': True,
-                        'delivery_status.read_at': datetime.utcnow()
-                    },
-                    '$addToSet': {
-                        'delivery_status.read_by': str(user_id)
-                    }
-                }
-            )
-        return Message.from_dict(db.messages.find_one({'_id': ObjectId(message_id)}))
-
     @staticmethod
     def from_dict(data):
         # Convert ObjectId fields to strings
@@ -214,22 +215,14 @@ class Message(BaseModel):
             created_at=data['created_at'],
             updated_at=data.get('updated_at'),
             reply_count=data.get('reply_count', 0),
+            last_reply_at=data.get('last_reply_at'),
+            thread_participants=data.get('thread_participants', []),
             parent_id=str(data['parent_id']) if data.get('parent_id') else None,
             file=file,
             file_id=file_id,
             is_direct=data.get('is_direct', False),
             analysis=data.get('analysis'),
-            message_type=data.get('message_type', 'text'),
-            delivery_status=data.get('delivery_status', {
-                'sent': True,
-                'delivered': False,
-                'read': False,
-                'delivered_to': [],
-                'read_by': [],
-                'sent_at': data['created_at'],
-                'delivered_at': None,
-                'read_at': None
-            })
+            message_type=data.get('message_type', 'text')
         )
         message._id = data['_id']
         return message
@@ -244,19 +237,20 @@ class Message(BaseModel):
             'file_id': self.file_id,
             'parent_id': self.parent_id,
             'reply_count': self.reply_count,
+            'last_reply_at': self.last_reply_at,
+            'thread_participants': self.thread_participants,
             'created_at': self.created_at,
             'updated_at': self.updated_at,
-            'delivery_status': self.delivery_status,
             'is_direct': self.is_direct,
             'analysis': self.analysis
         }
 
     def to_response_dict(self):
+        loader = get_loader()
+
         # Get the sender's username
         try:
-            # Convert sender_id to ObjectId if it's a string
-            sender_id = ObjectId(self.sender_id) if isinstance(self.sender_id, str) else self.sender_id
-            sender = db.users.find_one({'_id': sender_id})
+            sender = loader.get_user(self.sender_id)
             username = sender['username'] if sender else 'Unknown User'
             display_name = sender.get('display_name', username) if sender else username
         except Exception as e:
@@ -274,23 +268,16 @@ class Message(BaseModel):
             'message_type': self.message_type,
             'parent_id': str(self.parent_id) if self.parent_id else None,
             'reply_count': self.reply_count,
+            'last_reply_at': self.last_reply_at.isoformat() if self.last_reply_at else None,
+            'thread_participants': self.thread_participants or [],
+            'analysis': self.analysis.model_dump() if self.analysis else None,
             'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'delivery_status': {
-                'sent': self.delivery_status['sent'],
-                'delivered': self.delivery_status['delivered'],
-                'read': self.delivery_status['read'],
-                'delivered_to': self.delivery_status['delivered_to'],
-                'read_by': self.delivery_status['read_by'],
-                'sent_at': self.delivery_status['sent_at'].isoformat(),
-                'delivered_at': self.delivery_status['delivered_at'].isoformat() if self.delivery_status['delivered_at'] else None,
-                'read_at': self.delivery_status['read_at'].isoformat() if self.delivery_status['read_at'] else None
-            }
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
         
         # Add file information if this is a file message
         if self.file_id:
-            file_obj = File.get_by_id(self.file_id)
+            file_obj = loader.get_file(self.file_id)
             if file_obj:
                 response['file'] = file_obj.to_response_dict()
                 
@@ -0,0 +1,100 @@
+from datetime import datetime
+from bson import ObjectId
+from pymongo import ReturnDocument
+from app import db
+
+class ReadReceipt:
+    """Per-(user, channel) read and delivered watermarks.
+
+    Instead of appending every reader to every message, each user keeps one document
+    per channel holding the newest message they have received and read, stored as
+    {'at': created_at, 'id': message_id}. `$max` on that sub-document advances the
+    watermark monotonically in (created_at, _id) order with a single upsert, and
+    read-by lists for a message are derived from the watermarks on demand.
+    """
+
+    @staticmethod
+    def ensure_indexes():
+        db.read_receipts.create_index([('user_id', 1), ('channel_id', 1)], unique=True)
+        db.read_receipts.create_index([('channel_id', 1), ('read.at', 1)])
+        db.read_receipts.create_index([('channel_id', 1), ('delivered.at', 1)])
+
+    @staticmethod
+    def _mark(doc):
+        return {'at': doc['created_at'], 'id': doc['_id']}
+
+    @staticmethod
+    def latest_per_channel(message_ids):
+        """Resolve a batch of message IDs to the newest message per channel with one query"""
+        ids = [ObjectId(m) for m in message_ids if ObjectId.is_valid(str(m))]
+        latest = {}
+        for doc in db.messages.find({'_id': {'$in': ids}}, {'channel_id': 1, 'created_at': 1}):
+            current = latest.get(doc['channel_id'])
+            if current is None or (doc['created_at'], doc['_id']) > (current['created_at'], current['_id']):
+                latest[doc['channel_id']] = doc
+        return latest
+
+    @staticmethod
+    def latest_before(channel_id, up_to):
+        """Find the newest message in a channel created at or before a timestamp"""
+        return db.messages.find_one(
+            {'channel_id': ObjectId(channel_id), 'created_at': {'$lte': up_to}},
+            {'channel_id': 1, 'created_at': 1},
+            sort=[('created_at', -1), ('_id', -1)]
+        )
+
+    @staticmethod
+    def advance(user_id, message_doc, read=True):
+        """Move a user's delivered (and, if `read`, read) watermark up to a message.
+
+        Reading a message implies it was delivered. Returns the resulting watermarks.
+        """
+        mark = ReadReceipt._mark(message_doc)
+        max_fields = {'delivered': mark}
+        if read:
+            max_fields['read'] = mark
+        receipt = db.read_receipts.find_one_and_update(
+            {'user_id': ObjectId(user_id), 'channel_id': message_doc['channel_id']},
+            {'$max': max_fields, '$set': {'updated_at': datetime.utcnow()}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return ReadReceipt.to_response_dict(receipt)
+
+    @staticmethod
+    def get_message_receipts(message_doc):
+        """Compute who has received and read a message from the channel's watermarks"""
+        receipts = db.read_receipts.find(
+            {'channel_id': message_doc['channel_id'], 'delivered.at': {'$gte': message_doc['created_at']}},
+            {'user_id': 1, 'read': 1, 'delivered': 1}
+        )
+        mark = (message_doc['created_at'], message_doc['_id'])
+        delivered_to = []
+        read_by = []
+        for receipt in receipts:
+            user_id = str(receipt['user_id'])
+            delivered = receipt.get('delivered')
+            read = receipt.get('read')
+            if delivered and (delivered['at'], delivered['id']) >= mark:
+                delivered_to.append(user_id)
+            if read and (read['at'], read['id']) >= mark:
+                read_by.append(user_id)
+        return {
+            'message_id': str(message_doc['_id']),
+            'delivered_to': delivered_to,
+            'read_by': read_by
+        }
+
+    @staticmethod
+    def to_response_dict(receipt):
+        def serialize(mark):
+            if not mark:
+                return None
+            return {'at': mark['at'].isoformat(), 'message_id': str(mark['id'])}
+
+        return {
+            'user_id': str(receipt['user_id']),
+            'channel_id': str(receipt['channel_id']),
+            'delivered': serialize(receipt.get('delivered')),
+            'read': serialize(receipt.get('read'))
+        }
@@ -3,13 +3,14 @@ from flask_login import UserMixin
 from app import db
 from datetime import datetime
 from bson import ObjectId
+from app.utils.concurrency import run_blocking
 
 class User(UserMixin):
     def __init__(self, username, email, password=None, _id=None):
         self._id = _id or ObjectId()
         self.username = username
         self.email = email
-        self.password_hash = generate_password_hash(password, method='pbkdf2:sha256') if password else None
+        self.password_hash = run_blocking(generate_password_hash, password, method='pbkdf2:sha256') if password else None
         self.created_at = datetime.utcnow()
         self.updated_at = datetime.utcnow()
         self.is_active = True
@@ -77,7 +78,7 @@ class User(UserMixin):
         return None
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return run_blocking(check_password_hash, self.password_hash, password)
 
     def to_dict(self):
         return {
@@ -112,7 +113,7 @@ class User(UserMixin):
         if 'email' in data:
             updates['email'] = data['email']
         if 'password' in data:
-            updates['password_hash'] = generate_password_hash(data['password'], method='pbkdf2:sha256')
+            updates['password_hash'] = run_blocking(generate_password_hash, data['password'], method='pbkdf2:sha256')
         if 'tier' in data:
             updates['tier'] = data['tier']
         if 'is_active' in data:
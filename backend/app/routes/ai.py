@@ -1,10 +1,23 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from functools import wraps
 import time
-from ..services.ai_service import AIService
+from ..services.ai_service import ai_provider, get_ai_service
+from ..services.ai_cache import ai_cache
+from ..services.notes_summaries import note_summaries
+from ..services.message_analysis import message_analyses
+from ..services.speculative_replies import speculative_replies
+from ..services.singleflight import inflight_requests
+from ..services.context_packer import chat_name, pack_context
+from ..services.thread_context import load_channel_context, load_thread_context
+from ..utils.pagination import parse_limit
+from ..utils.loaders import get_loader
+from ..services.ai_stream import ai_streams
+from ..services.job_queue import job_queue, JobQueue
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson import ObjectId
+from pymongo import ReturnDocument
 from app import db
+from app.config import Config
 import traceback
 from flask_cors import CORS, cross_origin
 import json
@@ -30,14 +43,6 @@ CORS(ai_bp,
     supports_credentials=True
 )
 
-# Initialize AI service with validation
-try:
-    ai_service = AIService()
-    print("AI service initialized successfully")
-except Exception as e:
-    print(f"Error initializing AI service: {str(e)}")
-    ai_service = None
-
 # Rate limiting configuration
 RATE_LIMIT_WINDOW = 60  # 1 minute window
 MAX_REQUESTS = {
@@ -108,12 +113,14 @@ def rate_limit(f):
 
 @ai_bp.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
-    status = 'healthy' if ai_service is not None else 'unhealthy'
+    """Health check endpoint (status comes from the background probe)"""
+    ai_service = ai_provider.get()
+    health = ai_provider.health
     return jsonify({
-        'status': status,
+        'status': 'unhealthy' if health['status'] in ('unhealthy', 'unconfigured') else 'healthy',
         'service': 'ai',
-        'openai_configured': ai_service is not None
+        'openai_configured': ai_service is not None,
+        'upstream': health
     })
 
 @ai_bp.route('/usage', methods=['GET'])
@@ -121,6 +128,8 @@ def health_check():
 def get_usage():
     """Get AI usage statistics"""
     try:
+        # Usage is tracked locally, so it is available even while the upstream is down
+        ai_service = ai_provider.get()
         if ai_service is None:
             return jsonify({
                 'status': 'error',
@@ -140,21 +149,64 @@ def get_usage():
             'message': str(e)
         }), 500
 
+@ai_bp.route('/cache-stats', methods=['GET'])
+@jwt_required()
+def get_cache_stats():
+    """Get AI response cache hit rate and dollars saved, and how many calls were collapsed or batched"""
+    ai_service = ai_provider.get()
+    return jsonify({
+        'status': 'success',
+        'data': {
+            **ai_cache.get_stats(),
+            'note_summaries': note_summaries.get_stats(),
+            'in_flight_dedup': inflight_requests.get_stats(),
+            'message_analysis': message_analyses.get_stats(),
+            'speculative_replies': speculative_replies.get_stats(),
+            'analysis_batching': ai_service.get_batching_stats() if ai_service else None,
+            'local_tone_classifier': ai_service.get_local_analysis_stats() if ai_service else None
+        }
+    })
+
+def _load_context(data, current_user_id):
+    """Load the thread (`thread_id`) or channel (`channel_id`) history named in a request.
+
+    `context_window` caps how many messages are loaded. Raises ValueError for bad or
+    unknown ids and PermissionError if the user cannot read the channel.
+    """
+    window = parse_limit(data.get('context_window'), default=Config.SUGGEST_CONTEXT_WINDOW)
+    for field in ('thread_id', 'channel_id'):
+        if data.get(field) and not ObjectId.is_valid(data[field]):
+            raise ValueError(f'Invalid {field}')
+
+    if data.get('thread_id'):
+        messages, channel_id = load_thread_context(data['thread_id'], window)
+    else:
+        messages, channel_id = None, ObjectId(data['channel_id'])
+
+    channel = db.channels.find_one({'_id': channel_id}, {'is_private': 1, 'members': 1})
+    if not channel:
+        raise ValueError('Channel not found')
+    if channel.get('is_private') and ObjectId(current_user_id) not in channel.get('members', []):
+        raise PermissionError('Not a member of this channel')
+
+    if messages is None:
+        messages = load_channel_context(channel_id, window)
+    return messages
+
 @ai_bp.route('/suggest-reply', methods=['POST'])
 @jwt_required()
 @rate_limit
 def suggest_reply():
     """Generate reply suggestions based on thread context"""
     try:
+        ai_service = get_ai_service()
         if ai_service is None:
             return jsonify({
                 'status': 'error',
                 'message': 'AI service not properly initialized'
             }), 503
             
-        print("\n=== Starting suggest-reply request processing ===")
         data = request.get_json()
-        print(f"\nReceived request data: {data}")
         
         if not data or 'message' not in data:
             return jsonify({
@@ -168,25 +220,30 @@ def suggest_reply():
         tone = data.get('tone', 'professional')
         length = data.get('length', 'medium')
         
-        print(f"\nExtracted parameters:")
-        print(f"- Message: {message}")
-        print(f"- Thread context raw: {thread_context}")
-        print(f"- Thread context length: {len(thread_context)}")
-        print(f"- Thread context messages:")
-        for i, msg in enumerate(thread_context):
-            print(f"  Message {i+1}:")
-            print(f"    Content: {msg.get('content', '')[:100]}...")
-            print(f"    Username: {msg.get('username', 'Unknown')}")
-            print(f"    Created at: {msg.get('created_at', 'Unknown')}")
-            print(f"    Sender ID: {msg.get('sender_id', 'Unknown')}")
-        print(f"- Tone: {tone}")
-        print(f"- Length: {length}")
+        # Prefer assembling the context from the database over client-shipped history
+        if data.get('thread_id') or data.get('channel_id'):
+            try:
+                thread_context = _load_context(data, get_jwt_identity())
+            except PermissionError as e:
+                return jsonify({
+                    'status': 'error',
+                    'message': str(e)
+                }), 403
+            except ValueError as e:
+                return jsonify({
+                    'status': 'error',
+                    'message': str(e)
+                }), 400
+        
+        # Never log message content, only its shape
+        current_app.logger.debug(
+            f"suggest-reply: {len(thread_context)} context messages, tone={tone}, length={length}"
+        )
         
         # Check if this is an improvement request
         is_improvement = False
         if isinstance(message, dict):
             is_improvement = message.get('is_improvement', False)
-            print(f"\nMessage type: {'improvement' if is_improvement else 'reply'}")
         
         # Get the message content
         message_content = message.get('content') if isinstance(message, dict) else message
@@ -195,90 +252,60 @@ def suggest_reply():
                 'status': 'error',
                 'message': 'Invalid message format or empty message'
             }), 400
-            
-        print(f"\nMessage content: {message_content}")
         
-        # Format thread context for the prompt
-        thread_context_str = ""
+        # Thread context goes to the model once, as conversation history
         conversation_history = []
         
         if thread_context:
-            print(f"\nProcessing {len(thread_context)} thread context messages")
-            thread_context_str = "\nConversation History:\n"
-            
-            # Get current user ID from JWT
-            current_user_id = get_jwt_identity()
-            
             # Process each message in the thread context
             for i, msg in enumerate(thread_context):
                 msg_content = msg.get('content', '').strip()
                 if msg_content:
                     username = msg.get('username', 'User')
-                    formatted_msg = f"{username}: {msg_content}"
-                    thread_context_str += formatted_msg + "\n"
                     
                     # All messages in thread context should be treated as user messages
                     # since they are actual user conversations
                     conversation_history.append({
                         "role": "user",
                         "content": msg_content,
-                        "name": username  # Add username as metadata
+                        "name": chat_name(username)  # Add username as metadata
                     })
-                    print(f"Message {i+1} from {username} (role: user): {msg_content[:100]}...")
             
-            print(f"\nProcessed {len(conversation_history)} messages for conversation history")
-        else:
-            print("\nNo thread context provided")
-        
-        # Always use full context for better responses
-        use_full_context = True
-        print(f"\nUsing full context: {use_full_context}")
-        
-        # System prompt with context if enabled
-        system_prompt = f"""You are a helpful team member in a workplace chat.
-Your task is to improve the given message or generate a reply.
-
-{thread_context_str if use_full_context else ''}
-Current message: "{message_content}"
+            # The message being improved is appended last; don't send it twice
+            if conversation_history and conversation_history[-1]['content'] == message_content.strip():
+                conversation_history.pop()
 
-IMPORTANT RULES:
-1. Return ONLY the improved message or reply
-2. DO NOT add any explanations or questions
-3. DO NOT ask for more context
-4. DO NOT add greetings or closings
-5. Keep the {tone} tone
-6. Keep it {length} in length
-7. DO NOT add quotes around the message
-8. DO NOT prefix the message with anything like "Here's a suggestion" or "Improved version"
-
-Example input: "hey can u help me with something"
-Example output: Hey, could you help me with something?
-
-Example input: "i dont know if this will work but maybe we can try"
-Example output: I believe we should give this approach a try.
+        def summarize_overflow(dropped):
+            try:
+                return ai_service.summarize_context(dropped, max_tokens=Config.SUGGEST_CONTEXT_SUMMARY_TOKENS)
+            except Exception as e:
+                # The suggestions still work from the messages that fit
+                print(f"Error summarizing thread context overflow: {str(e)}")
+                return None
 
-REMEMBER: Output ONLY the message text, nothing else."""
+        # Keep the newest and most relevant messages within the token budget
+        conversation_history, packing = pack_context(
+            conversation_history,
+            message_content,
+            budget=Config.SUGGEST_CONTEXT_TOKENS,
+            model=ai_service._get_model('3.5'),
+            recent=Config.SUGGEST_CONTEXT_RECENT,
+            summarize=summarize_overflow,
+            summary_budget=Config.SUGGEST_CONTEXT_SUMMARY_TOKENS
+        )
+        print(f"\nContext packing: kept {packing['kept']}/{packing['messages']} messages, "
+              f"{packing['packed_tokens']}/{packing['tokens']} tokens, "
+              f"{packing['summarized']} summarized")
 
-        print(f"\nSystem prompt length: {len(system_prompt)} characters")
-        print(f"First 500 chars of system prompt:\n{system_prompt[:500]}...")
-        print(f"\nConversation history length: {len(conversation_history)} messages")
+        # Generate suggestions with different temperatures, all in flight at once
+        full_history = conversation_history + [{"role": "user", "content": message_content}]
 
-        # Generate suggestions with different temperatures
-        suggestions = []
-        for i in range(3):
-            try:
-                print(f"\nGenerating suggestion {i+1}")
-                
-                # Add the current message to conversation history only if using full context
-                full_history = conversation_history.copy()
-                if use_full_context:
-                    full_history.append({"role": "user", "content": message_content})
-                
-                response, usage = ai_service.generate_response(
-                    prompt=f"Improve this message to be more {tone} and {length}.",
-                    model_version='3.5',
-                    temperature=0.7 + (i * 0.1),
-                    system_prompt="""You are a message improvement assistant.
+        responses = ai_service.generate_parallel(
+            temperatures=[0.7 + (i * 0.1) for i in range(3)],
+            budget=Config.SUGGEST_REPLY_BUDGET,
+            prompt=f"Improve this message to be more {tone} and {length}.",
+            model_version='3.5',
+            system_prompt="""You are a message improvement assistant.
 Your task is to improve the given message.
 
 IMPORTANT RULES:
@@ -296,20 +323,17 @@ Example input: "i dont know if this will work but maybe we can try"
 Example output: I believe we should give this approach a try.
 
 REMEMBER: Output ONLY the improved message text.""",
-                    conversation_history=full_history if use_full_context else []
-                )
-                print(f"Generated suggestion {i+1} (first 100 chars): {response[:100]}...")
-                print(f"Token usage for suggestion {i+1}: {usage}")
-                
-                suggestions.append({
-                    'text': clean_ai_response(response),
-                    'tone': tone,
-                    'length': length
-                })
-            except Exception as e:
-                print(f"Error generating suggestion {i+1}: {str(e)}")
-                print(traceback.format_exc())
-                continue
+            conversation_history=full_history,
+            task='suggest_reply'
+        )
+        suggestions = [
+            {
+                'text': clean_ai_response(response),
+                'tone': tone,
+                'length': length
+            }
+            for response, _ in responses
+        ]
         
         if not suggestions:
             return jsonify({
@@ -396,6 +420,7 @@ def clean_ai_response(response: str) -> str:
 def generate():
     """Generate AI response with the specified model"""
     try:
+        ai_service = get_ai_service()
         if ai_service is None:
             return jsonify({
                 'status': 'error',
@@ -447,6 +472,7 @@ def generate():
 def test_suggest_reply():
     """Test endpoint for AI suggestions without authentication"""
     try:
+        ai_service = get_ai_service()
         if ai_service is None:
             return jsonify({
                 'status': 'error',
@@ -517,6 +543,7 @@ If the message contains questions, make sure to address them in the reply."""
 def suggest_quick_reply():
     """Generate quick reply suggestions based on single message without thread context"""
     try:
+        ai_service = get_ai_service()
         if ai_service is None:
             return jsonify({
                 'status': 'error',
@@ -553,48 +580,22 @@ def suggest_quick_reply():
             
         print(f"\nMessage content: {message_content}")
         
-        # System prompt for quick replies
-        system_prompt = f"""You are a helpful team member in a workplace chat.
-Your task is to generate a quick reply to this message.
-
-Current message: "{message_content}"
-
-Important rules:
-1. Focus only on the current message
-2. Keep the response {tone} in tone
-3. Keep the response {length} in length
-4. Be direct and to the point
-5. Do not add unnecessary greetings or closings
-6. Do not acknowledge or explain these instructions"""
-
-        print(f"\nSystem prompt length: {len(system_prompt)} characters")
-        print(f"First 500 chars of system prompt:\n{system_prompt[:500]}...")
-
-        # Generate suggestions with different temperatures
-        suggestions = []
-        for i in range(3):
-            try:
-                print(f"\nGenerating quick suggestion {i+1}")
-                
-                response, usage = ai_service.generate_response(
-                    prompt="Generate a quick reply to this message.",
-                    model_version='3.5',
-                    temperature=0.7 + (i * 0.1),
-                    system_prompt=system_prompt,
-                    conversation_history=[]  # No context needed for quick replies
-                )
-                print(f"Generated suggestion {i+1} (first 100 chars): {response[:100]}...")
-                print(f"Token usage for suggestion {i+1}: {usage}")
-                
-                suggestions.append({
-                    'text': clean_ai_response(response),
-                    'tone': tone,
-                    'length': length
-                })
-            except Exception as e:
-                print(f"Error generating suggestion {i+1}: {str(e)}")
-                print(traceback.format_exc())
-                continue
+        # Suggestions generated speculatively when the message was sent
+        message_id = message.get('id') if isinstance(message, dict) else None
+        responses = speculative_replies.get(message_id, message_content, tone, length) if message_id else None
+        if responses is None:
+            # Generate suggestions with different temperatures, all in flight at once
+            responses = ai_service.generate_quick_replies(
+                message_content, tone, length, budget=Config.QUICK_REPLY_BUDGET
+            )
+        suggestions = [
+            {
+                'text': clean_ai_response(response),
+                'tone': tone,
+                'length': length
+            }
+            for response in responses
+        ]
         
         if not suggestions:
             return jsonify({
@@ -631,6 +632,7 @@ def analyze_message():
             response.headers.add('Access-Control-Allow-Credentials', 'true')  # Allow credentials
             return response
 
+        ai_service = get_ai_service()
         if ai_service is None:
             return jsonify({
                 'status': 'error',
@@ -657,6 +659,25 @@ def analyze_message():
                 'message': 'Invalid message format'
             }), 400
 
+        # Text that was already sent and analyzed needs no model call (even when streaming was asked for)
+        stored_analysis = message_analyses.find(message_content)
+        if stored_analysis is not None:
+            return jsonify({
+                'status': 'success',
+                'analysis': stored_analysis
+            })
+
+        if data.get('stream'):
+            # Relay the analysis over the user's socket room as it is generated
+            stream_id = ai_streams.start(
+                get_jwt_identity(), 'analyze_message',
+                lambda on_delta: ai_service.analyze_message(message_content, on_delta=on_delta)
+            )
+            return jsonify({
+                'status': 'accepted',
+                'stream_id': stream_id
+            }), 202
+
         try:
             analysis_result = ai_service.analyze_message(message_content)
             return jsonify({
@@ -684,6 +705,267 @@ def analyze_message():
             'message': str(e)
         }), 500
 
+def _wants_stream():
+    """Whether the client asked for a streamed (Socket.IO) response"""
+    body = request.get_json(silent=True) or {}
+    return str(request.args.get('stream', body.get('stream', ''))).lower() in ('1', 'true')
+
+def _notes_high_water_mark(serialized_messages):
+    """(created_at, _id) of the newest message the notes cover"""
+    last = serialized_messages[-1]
+    return datetime.fromisoformat(last['created_at']), ObjectId(last['id'])
+
+def _notes_since_filter(since):
+    """Query for the messages after a (created_at, _id) high-water mark.
+    Messages sharing the mark's timestamp are told apart by _id, so none are skipped.
+    """
+    created_at, message_id = since
+    if message_id is None:
+        return {'created_at': {'$gt': created_at}}
+    return {'$or': [
+        {'created_at': {'$gt': created_at}},
+        {'created_at': created_at, '_id': {'$gt': message_id}}
+    ]}
+
+def _serialize_notes(notes):
+    """Serialize a notes document for the API"""
+    try:
+        return {
+            'id': str(notes['_id']),
+            'title': notes['title'],
+            'channel_id': notes['channel_id'],
+            'thread_id': notes.get('thread_id'),
+            'creator_id': notes['creator_id'],
+            'sections': notes['sections'],
+            'created_at': notes['created_at'].isoformat(),
+            'updated_at': notes['updated_at'].isoformat(),
+            'version': notes['version'],
+            'is_draft': notes.get('is_draft', True)
+        }
+    except Exception as e:
+        print(f"Error serializing final notes: {str(e)}")
+        print(f"Notes data: {notes}")
+        raise
+
+def _save_notes(notes_data, channel_id_obj, thread_id_obj, current_user_id, source_until):
+    """Store generated notes as a new draft and return their serialized form"""
+    # Create notes object with explicit datetime objects
+    now = datetime.utcnow()
+    notes = {
+        'title': notes_data['title'],
+        'channel_id': str(channel_id_obj),
+        'thread_id': str(thread_id_obj) if thread_id_obj else None,
+        'creator_id': current_user_id,
+        'sections': notes_data['sections'],
+        'created_at': now,
+        'updated_at': now,
+        'version': 1,
+        'is_draft': True,
+        # Messages after this (created_at, _id) are picked up by an incremental refresh
+        'source_until': source_until[0],
+        'source_until_id': source_until[1]
+    }
+
+    # Save notes to database
+    print("\nSaving notes to database...")
+    result = db.notes.insert_one(notes)
+    print(f"Notes saved with ID: {result.inserted_id}")
+
+    return _serialize_notes(notes)
+
+def _load_notes_messages(channel_id_obj, thread_id_obj, since=None):
+    """Load and serialize the messages of a channel or thread for notes generation.
+    With `since`, a (created_at, _id) high-water mark, only the messages after it are loaded
+    (possibly none), in the same (created_at, _id) order.
+    Returns (serialized_messages, thread_title); raises ValueError if there is nothing to summarize.
+    """
+    since_filter = _notes_since_filter(since) if since else {}
+    order = [('created_at', 1), ('_id', 1)]
+
+    # Get messages
+    if thread_id_obj:
+        # Get thread messages
+        thread_filter = {
+            '$or': [
+                {'_id': thread_id_obj},  # Get the parent message
+                {'parent_id': thread_id_obj}  # Get all replies
+            ]
+        }
+        messages = list(db.messages.find(
+            {'$and': [thread_filter, since_filter]} if since else thread_filter
+        ).sort(order))
+        
+        if since:
+            parent = db.messages.find_one({'_id': thread_id_obj}, {'content': 1})
+            if not parent:
+                raise ValueError('Thread not found')
+            thread_title = parent.get('content')
+        else:
+            if not messages:
+                raise ValueError('Thread not found')
+            thread_title = messages[0].get('content') if messages else None
+    else:
+        # Get channel messages
+        messages = list(db.messages.find({
+            'channel_id': channel_id_obj,
+            'thread_id': None,
+            **since_filter
+        }).sort(order))
+        thread_title = None
+
+    print(f"Found {len(messages)} messages")
+
+    # Serialize messages for AI service
+    loader = get_loader()
+    loader.load_users([msg.get('sender_id') for msg in messages if msg.get('sender_id')])
+    serialized_messages = []
+    for msg in messages:
+        try:
+            # Get user info
+            user = loader.get_user(msg['sender_id'])
+            username = user['username'] if user else 'Unknown User'
+            
+            # Debug print message fields
+            print(f"\nProcessing message {msg['_id']}:")
+            print(f"- Content: {msg.get('content', '')[:50]}...")
+            print(f"- Created at type: {type(msg.get('created_at'))}")
+            print(f"- Updated at type: {type(msg.get('updated_at'))}")
+            
+            # Handle created_at
+            created_at = msg.get('created_at')
+            if isinstance(created_at, str):
+                try:
+                    created_at = datetime.fromisoformat(created_at)
+                except ValueError:
+                    created_at = datetime.utcnow()
+            elif not isinstance(created_at, datetime):
+                created_at = datetime.utcnow()
+            
+            # Handle updated_at
+            updated_at = msg.get('updated_at')
+            if isinstance(updated_at, str):
+                try:
+                    updated_at = datetime.fromisoformat(updated_at)
+                except ValueError:
+                    updated_at = created_at
+            elif not isinstance(updated_at, datetime):
+                # Stable fallback: edit times are part of the chunk summary cache keys
+                updated_at = created_at
+            
+            # Create serialized message
+            serialized_msg = {
+                'id': str(msg['_id']),
+                'content': msg.get('content', ''),
+                'sender_id': str(msg['sender_id']),
+                'username': username,
+                'created_at': created_at.isoformat(),
+                'updated_at': updated_at.isoformat()
+            }
+            serialized_messages.append(serialized_msg)
+            
+        except Exception as e:
+            print(f"Error serializing message {msg.get('_id')}: {str(e)}")
+            print(f"Message data: {msg}")
+            continue
+
+    print(f"\nSuccessfully serialized {len(serialized_messages)} messages")
+
+    # Checked after serializing, since messages that fail to serialize are skipped
+    if not serialized_messages and not since:
+        raise ValueError('No messages found to generate notes from')
+
+    return serialized_messages, thread_title
+
+def _generate_and_save_notes(channel, thread_id_obj, current_user_id, on_delta=None):
+    """Generate notes for a channel or thread and store them as a new draft"""
+    ai_service = get_ai_service()
+    if ai_service is None:
+        raise RuntimeError('AI service not properly initialized')
+
+    serialized_messages, thread_title = _load_notes_messages(channel['_id'], thread_id_obj)
+
+    # Generate notes using AI service
+    print("\nGenerating notes with AI service...")
+    notes_data = ai_service.generate_meeting_notes(
+        messages=serialized_messages,
+        channel_name=channel.get('name', ''),
+        thread_title=thread_title,
+        on_delta=on_delta
+    )
+    print("Notes generated successfully")
+
+    return _save_notes(
+        notes_data, channel['_id'], thread_id_obj, current_user_id,
+        _notes_high_water_mark(serialized_messages)
+    )
+
+def _refresh_notes(channel, note_id_obj, on_delta=None):
+    """Merge the messages posted since a note was generated into it, stored as a new version"""
+    ai_service = get_ai_service()
+    if ai_service is None:
+        raise RuntimeError('AI service not properly initialized')
+
+    # Reloaded on every attempt, so a retry after a conflicting edit merges into the latest version
+    note = db.notes.find_one({'_id': note_id_obj})
+    if not note:
+        raise ValueError('Note not found')
+    thread_id_obj = ObjectId(note['thread_id']) if note.get('thread_id') else None
+
+    # Notes from before high-water marks were recorded cover everything up to their creation
+    if note.get('source_until'):
+        since = (note['source_until'], note.get('source_until_id'))
+    else:
+        since = (note['created_at'], None)
+    new_messages, thread_title = _load_notes_messages(channel['_id'], thread_id_obj, since=since)
+    # Empty too when every new message failed to serialize
+    if not new_messages:
+        print("No new messages since the last version, notes unchanged")
+        return _serialize_notes(note)
+
+    print(f"\nUpdating notes version {note.get('version', 1)} with {len(new_messages)} new messages...")
+    notes_data = ai_service.update_meeting_notes(
+        notes=note,
+        messages=new_messages,
+        channel_name=channel.get('name', ''),
+        thread_title=thread_title,
+        on_delta=on_delta
+    )
+
+    source_until, source_until_id = _notes_high_water_mark(new_messages)
+    updated = db.notes.find_one_and_update(
+        # Fails if the note was edited meanwhile instead of overwriting that edit
+        {'_id': note['_id'], 'version': note.get('version')},
+        {
+            '$set': {
+                'title': notes_data['title'],
+                'sections': notes_data['sections'],
+                'updated_at': datetime.utcnow(),
+                'source_until': source_until,
+                'source_until_id': source_until_id
+            },
+            '$inc': {'version': 1}
+        },
+        return_document=ReturnDocument.AFTER
+    )
+    if updated is None:
+        raise RuntimeError('Note was modified while it was being updated')
+    print(f"Notes updated to version {updated['version']}")
+
+    return _serialize_notes(updated)
+
+def _run_generate_notes_job(job):
+    """Job handler: generate (or, with a note_id, refresh) notes for the channel/thread in the job payload"""
+    payload = job['payload']
+    channel = db.channels.find_one({'_id': ObjectId(payload['channel_id'])})
+    if not channel:
+        raise ValueError('Channel not found')
+    if payload.get('note_id'):
+        return _refresh_notes(channel, ObjectId(payload['note_id']))
+    thread_id_obj = ObjectId(payload['thread_id']) if payload.get('thread_id') else None
+    return _generate_and_save_notes(channel, thread_id_obj, job['user_id'])
+
+job_queue.register('generate_notes', _run_generate_notes_job)
+
 @ai_bp.route('/generate-notes', methods=['POST', 'OPTIONS'])
 @cross_origin(supports_credentials=True)
 @jwt_required()
@@ -694,6 +976,7 @@ def generate_notes():
         if request.method == 'OPTIONS':
             return jsonify({'status': 'ok'})
 
+        ai_service = get_ai_service()
         if ai_service is None:
             return jsonify({
                 'status': 'error',
@@ -705,6 +988,8 @@ def generate_notes():
         # Get parameters from query string
         channel_id = request.args.get('channel_id')
         thread_id = request.args.get('thread_id')
+        # Update an existing note with the messages since its last version
+        note_id = request.args.get('note_id')
 
         print(f"Channel ID: {channel_id}")
         print(f"Thread ID: {thread_id}")
@@ -719,6 +1004,7 @@ def generate_notes():
             # Convert string IDs to ObjectId
             channel_id_obj = ObjectId(channel_id)
             thread_id_obj = ObjectId(thread_id) if thread_id else None
+            note_id_obj = ObjectId(note_id) if note_id else None
         except Exception as e:
             print(f"Error converting IDs: {str(e)}")
             return jsonify({
@@ -736,147 +1022,45 @@ def generate_notes():
 
         print(f"Found channel: {channel.get('name', 'Unknown')}")
 
-        # Get messages
-        if thread_id_obj:
-            # Get thread messages
-            messages = list(db.messages.find({
-                '$or': [
-                    {'_id': thread_id_obj},  # Get the parent message
-                    {'parent_id': thread_id_obj}  # Get all replies
-                ]
-            }).sort('created_at', 1))
-            
-            if not messages:
+        current_user_id = get_jwt_identity()
+
+        if note_id_obj:
+            note = db.notes.find_one({'_id': note_id_obj})
+            if not note or note['channel_id'] != str(channel_id_obj):
                 return jsonify({
                     'status': 'error',
-                    'message': 'Thread not found'
+                    'message': 'Note not found'
                 }), 404
-                
-            thread_title = messages[0].get('content') if messages else None
-        else:
-            # Get channel messages
-            messages = list(db.messages.find({
-                'channel_id': channel_id_obj,
-                'thread_id': None
-            }).sort('created_at', 1))
-            thread_title = None
-
-        print(f"Found {len(messages)} messages")
+            if note['creator_id'] != current_user_id:
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Not authorized to update this note'
+                }), 403
 
-        if not messages:
+        if _wants_stream():
+            # Relay the notes over the user's socket room as they are generated
+            if note_id_obj:
+                work = lambda on_delta: _refresh_notes(channel, note_id_obj, on_delta)
+            else:
+                work = lambda on_delta: _generate_and_save_notes(channel, thread_id_obj, current_user_id, on_delta)
+            stream_id = ai_streams.start(current_user_id, 'generate_notes', work)
             return jsonify({
-                'status': 'error',
-                'message': 'No messages found to generate notes from'
-            }), 400
-
-        # Serialize messages for AI service
-        serialized_messages = []
-        for msg in messages:
-            try:
-                # Get user info
-                user = db.users.find_one({'_id': msg['sender_id']})
-                username = user['username'] if user else 'Unknown User'
-                
-                # Debug print message fields
-                print(f"\nProcessing message {msg['_id']}:")
-                print(f"- Content: {msg.get('content', '')[:50]}...")
-                print(f"- Created at type: {type(msg.get('created_at'))}")
-                print(f"- Updated at type: {type(msg.get('updated_at'))}")
-                
-                # Handle created_at
-                created_at = msg.get('created_at')
-                if isinstance(created_at, str):
-                    try:
-                        created_at = datetime.fromisoformat(created_at)
-                    except ValueError:
-                        created_at = datetime.utcnow()
-                elif not isinstance(created_at, datetime):
-                    created_at = datetime.utcnow()
-                
-                # Handle updated_at
-                updated_at = msg.get('updated_at')
-                if isinstance(updated_at, str):
-                    try:
-                        updated_at = datetime.fromisoformat(updated_at)
-                    except ValueError:
-                        updated_at = datetime.utcnow()
-                elif not isinstance(updated_at, datetime):
-                    updated_at = datetime.utcnow()
-                
-                # Create serialized message
-                serialized_msg = {
-                    'id': str(msg['_id']),
-                    'content': msg.get('content', ''),
-                    'sender_id': str(msg['sender_id']),
-                    'username': username,
-                    'created_at': created_at.isoformat(),
-                    'updated_at': updated_at.isoformat()
-                }
-                serialized_messages.append(serialized_msg)
-                
-            except Exception as e:
-                print(f"Error serializing message {msg.get('_id')}: {str(e)}")
-                print(f"Message data: {msg}")
-                continue
-
-        print(f"\nSuccessfully serialized {len(serialized_messages)} messages")
-
-        # Generate notes using AI service
-        print("\nGenerating notes with AI service...")
-        notes_data = ai_service.generate_meeting_notes(
-            messages=serialized_messages,
-            channel_name=channel.get('name', ''),
-            thread_title=thread_title
-        )
-        print("Notes generated successfully")
+                'status': 'accepted',
+                'stream_id': stream_id
+            }), 202
 
-        # Get current user ID
-        current_user_id = get_jwt_identity()
-
-        # Create notes object with explicit datetime objects
-        now = datetime.utcnow()
-        notes = {
-            'title': notes_data['title'],
+        # Queue the generation; progress is polled at /jobs/<id> and pushed over the socket
+        job_id = job_queue.enqueue('generate_notes', {
             'channel_id': str(channel_id_obj),
             'thread_id': str(thread_id_obj) if thread_id_obj else None,
-            'creator_id': current_user_id,
-            'sections': notes_data['sections'],
-            'created_at': now,
-            'updated_at': now,
-            'version': 1,
-            'is_draft': True
-        }
-
-        # Save notes to database
-        print("\nSaving notes to database...")
-        result = db.notes.insert_one(notes)
-        notes['id'] = str(result.inserted_id)
-        print(f"Notes saved with ID: {notes['id']}")
-
-        # Serialize the final response
-        try:
-            serialized_notes = {
-                'id': notes['id'],
-                'title': notes['title'],
-                'channel_id': notes['channel_id'],
-                'thread_id': notes['thread_id'],
-                'creator_id': notes['creator_id'],
-                'sections': notes['sections'],
-                'created_at': notes['created_at'].isoformat(),
-                'updated_at': notes['updated_at'].isoformat(),
-                'version': notes['version'],
-                'is_draft': notes['is_draft']
-            }
-        except Exception as e:
-            print(f"Error serializing final notes: {str(e)}")
-            print(f"Notes data: {notes}")
-            raise
-
-        print("\nNotes generation completed successfully")
+            'note_id': str(note_id_obj) if note_id_obj else None
+        }, current_user_id)
+        print(f"Queued notes generation job {job_id}")
         return jsonify({
-            'status': 'success',
-            'data': serialized_notes
-        })
+            'status': 'accepted',
+            'job_id': job_id,
+            'data': JobQueue.to_response_dict(job_queue.get(job_id))
+        }), 202
 
     except Exception as e:
         print(f"\nError in generate_notes endpoint: {str(e)}")
@@ -885,4 +1069,19 @@ def generate_notes():
         return jsonify({
             'status': 'error',
             'message': str(e)
-        }), 500 
\ No newline at end of file
+        }), 500 
+
+@ai_bp.route('/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    """Get the status (and result, once finished) of a background AI job"""
+    job = job_queue.get(job_id)
+    if not job or job['user_id'] != get_jwt_identity():
+        return jsonify({
+            'status': 'error',
+            'message': 'Job not found'
+        }), 404
+    return jsonify({
+        'status': 'success',
+        'data': JobQueue.to_response_dict(job)
+    })
@@ -4,6 +4,7 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
 from bson import ObjectId
 from datetime import timedelta
+from app.utils.concurrency import run_blocking
 import logging
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
@@ -30,7 +31,7 @@ def register():
             '_id': ObjectId(),
             'username': data['username'],
             'email': data['email'],
-            'password': generate_password_hash(data['password'], method='pbkdf2:sha256'),
+            'password': run_blocking(generate_password_hash, data['password'], method='pbkdf2:sha256'),
             'display_name': data.get('display_name', data['username']),
             'avatar_url': data.get('avatar_url', None)
         }
@@ -69,7 +70,7 @@ def login():
             
         # Find user by username
         user = db.users.find_one({'username': data['username']})
-        if not user or not check_password_hash(user['password'], data['password']):
+        if not user or not run_blocking(check_password_hash, user['password'], data['password']):
             return jsonify({'error': 'Invalid username or password'}), 401
             
         # Create access token
@@ -241,7 +242,7 @@ def create_test_user():
             '_id': ObjectId(),
             'username': username,
             'email': email,
-            'password': generate_password_hash(password, method='pbkdf2:sha256'),
+            'password': run_blocking(generate_password_hash, password, method='pbkdf2:sha256'),
             'display_name': username,
             'avatar_url': None
         }
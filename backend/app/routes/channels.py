@@ -3,6 +3,8 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models.channel import Channel
 from app.models.user import User
 from app import db, socketio
+from app.utils.loaders import get_loader
+from app.sockets.fanout import fanout
 from bson import ObjectId
 from datetime import datetime
 
@@ -24,6 +26,7 @@ def get_channels():
             
         try:
             channels = Channel.get_user_channels(user_id)
+            get_loader().prime_channels(channels)
             response_data = []
             for channel in channels:
                 try:
@@ -210,10 +213,10 @@ def create_direct_message(user_id):
         channel = Channel.get_direct_message(current_user_id, target_user_id)
         
         # Emit socket event for new DM channel
-        socketio.emit('dm_channel_created', channel.to_response_dict(), room=str(current_user_id))
-        socketio.emit('dm_channel_created', channel.to_response_dict(), room=str(target_user_id))
+        channel_data = channel.to_response_dict()
+        fanout.emit('dm_channel_created', channel_data, [current_user_id, target_user_id])
         
-        return jsonify(channel.to_response_dict()), 201
+        return jsonify(channel_data), 201
         
     except Exception as e:
         return jsonify({'error': str(e)}), 400
@@ -6,6 +6,8 @@ from app.models.channel import Channel
 from app import socketio
 from flask_socketio import join_room, leave_room
 from app import db
+from app.utils.loaders import get_loader
+from app.sockets.fanout import fanout
 
 invitations_bp = Blueprint('invitations', __name__)
 
@@ -115,6 +117,7 @@ def get_pending_invitations():
     try:
         user_id = get_jwt_identity()
         invitations = Invitation.get_pending_for_user(user_id)
+        get_loader().prime_invitations(invitations)
         response_data = [inv.to_response_dict() for inv in invitations]
         print(f"Fetched pending invitations for user {user_id}: {response_data}")
         return jsonify(response_data), 200
@@ -160,8 +163,7 @@ def accept_invitation(invitation_id):
         }, room=str(channel._id))
         
         # 3. Send channel update to all members
-        for member_id in channel.members:
-            socketio.emit('channel_updated', channel_data, room=str(member_id))
+        fanout.emit('channel_updated', channel_data, channel.members)
         
         return jsonify(invitation.to_response_dict()), 200
         
@@ -210,10 +212,9 @@ def get_channel_pending_invitations(channel_id):
         }))
         
         # Convert to response format
-        response_data = []
-        for inv in invitations:
-            invitation = Invitation.from_dict(inv)
-            response_data.append(invitation.to_response_dict())
+        invitations = [Invitation.from_dict(inv) for inv in invitations]
+        get_loader().prime_invitations(invitations)
+        response_data = [invitation.to_response_dict() for invitation in invitations]
             
         return jsonify(response_data), 200
     except Exception as e:
@@ -7,48 +7,93 @@ from datetime import datetime
 from app.models.channel import Channel
 from flask import current_app
 from app.models.file import File
+from app.models.conversation import Conversation
+from app.models.receipt import ReadReceipt
+from app.utils.loaders import get_loader
+from app.services.message_cache import message_cache
+from app.services.message_analysis import message_analyses
+from app.services.speculative_replies import speculative_replies
+from app.services.search_index import search_index
+from app.sockets.fanout import fanout
+from app.utils.pagination import keyset_page, parse_limit, encode_cursor, with_cursor_headers
 
 bp = Blueprint('messages', __name__, url_prefix='/api/messages')
 
+def _mark_conversation_read(user_id, channel_id):
+    """Clear a DM's unread count after the page is served (the update only writes if it is non-zero)"""
+    socketio.start_background_task(Conversation.mark_read, user_id, channel_id)
+
 @bp.route('/channel/<channel_id>', methods=['GET'])
 @jwt_required()
 def get_channel_messages(channel_id):
-    """Get messages for a channel"""
+    """Get messages for a channel, newest first.
+
+    Pass the X-Next-Cursor response header back as ?cursor= to page into older
+    history and X-Prev-Cursor to page back towards newer messages.
+    """
     try:
         print(f"\n=== Loading Channel Messages ===")
         print(f"Channel ID: {channel_id}")
         
         # Get pagination parameters
-        before = request.args.get('before')
-        limit = int(request.args.get('limit', 50))
+        cursor = request.args.get('cursor')
+        before = request.args.get('before')  # Legacy ISO timestamp pagination
+        limit = parse_limit(request.args.get('limit'))
         
         try:
             # Convert channel_id to ObjectId since that's how it's stored
             channel_id_obj = ObjectId(channel_id)
             
+            # Serve the newest page straight from the hot message cache
+            if not cursor and not before:
+                cached_page = message_cache.get_page(channel_id_obj, limit)
+                if cached_page is not None:
+                    print(f"Served {len(cached_page)} messages from cache")
+                    next_cursor = None
+                    if len(cached_page) == limit:
+                        oldest = cached_page[-1]
+                        next_cursor = encode_cursor({
+                            'created_at': datetime.fromisoformat(oldest['created_at']),
+                            '_id': oldest['id']
+                        }, 'next')
+                    if message_cache.is_direct(channel_id_obj):
+                        _mark_conversation_read(get_jwt_identity(), channel_id_obj)
+                    return with_cursor_headers(jsonify(cached_page), next_cursor, None)
+            
             # Build query - only get main messages, not thread replies
             query = {
                 'channel_id': channel_id_obj,
                 'parent_id': None  # Only get main messages, not replies
             }
-            if before:
+            if before and not cursor:
                 query['created_at'] = {'$lt': datetime.fromisoformat(before)}
             
             # Query messages
-            messages = list(db.messages.find(
-                query,
-                sort=[('created_at', -1)],
-                limit=limit
-            ))
+            cache_version = message_cache.version()
+            messages, next_cursor, prev_cursor = keyset_page(
+                db.messages, query, limit, cursor=cursor, newest_first=True
+            )
             print(f"Found {len(messages)} messages")
             
+            # Resolve senders and files for the whole page up front
+            get_loader().prime_messages(messages)
+            
             # Convert to Message objects and format response
             message_list = []
             for msg in messages:
                 msg_obj = Message.from_dict(msg)
                 message_list.append(msg_obj.to_response_dict())
             
-            return jsonify(message_list)
+            if not cursor and not before:
+                channel = get_loader().get_channel(channel_id_obj)
+                is_direct = bool(channel and channel.is_direct)
+                message_cache.store_page(
+                    channel_id_obj, message_list, limit, is_direct=is_direct, version=cache_version
+                )
+                if is_direct:
+                    _mark_conversation_read(get_jwt_identity(), channel_id_obj)
+            
+            return with_cursor_headers(jsonify(message_list), next_cursor, prev_cursor)
             
         except Exception as e:
             print(f"Error processing messages: {str(e)}")
@@ -117,18 +162,16 @@ def send_message(channel_id):
                 
                 # Get message data for response
                 message_data = message.to_response_dict()
+                message_cache.update_message(channel_id_obj, message_data)
                 
                 # Update channel's last_message_at
                 channel.update({'last_message_at': datetime.utcnow()})
+                if channel.is_direct:
+                    Conversation.record_message(channel, user_id, message.content, message.created_at)
                 
-                # Emit to channel room
-                print(f"Emitting message to channel room: {channel_id}")
-                socketio.emit('message_created', message_data, room=str(channel_id))
-                
-                # Also emit to each member's personal room
-                print(f"Emitting message to member rooms: {[str(m) for m in channel.members]}")
-                for member_id in channel.members:
-                    socketio.emit('message_created', message_data, room=str(member_id))
+                # Emit once to the channel room and every member's personal room
+                recipients = fanout.emit('message_created', message_data, [channel_id] + channel.members)
+                print(f"Fanned out message to {recipients} sockets")
                 
                 return jsonify(message_data), 201
                 
@@ -162,15 +205,15 @@ def send_message(channel_id):
                 
                 # Update channel's last_message_at
                 channel.update({'last_message_at': datetime.utcnow()})
+                if channel.is_direct:
+                    Conversation.record_message(channel, user_id, message.content, message.created_at)
                 
-                # Emit to channel room
-                print(f"Emitting message to channel room: {channel_id}")
-                socketio.emit('message_created', message_data, room=str(channel_id))
+                # Emit once to the channel room and every member's personal room
+                recipients = fanout.emit('message_created', message_data, [channel_id] + channel.members)
+                print(f"Fanned out message to {recipients} sockets")
                 
-                # Also emit to each member's personal room
-                print(f"Emitting message to member rooms: {[str(m) for m in channel.members]}")
-                for member_id in channel.members:
-                    socketio.emit('message_created', message_data, room=str(member_id))
+                # Have quick replies ready for members who may answer
+                speculative_replies.schedule(message._id, message.content, user_id, channel.members)
                 
                 return jsonify(message_data), 201
                 
@@ -185,52 +228,85 @@ def send_message(channel_id):
 @bp.route('/search', methods=['GET'])
 @jwt_required()
 def search_messages():
-    """Search messages across channels"""
+    """Full-text search over messages in the caller's channels, best match first"""
     try:
         # Get search parameters
         query = request.args.get('q', '').strip()
         channel_id = request.args.get('channel_id')
         before = request.args.get('before')
         after = request.args.get('after')
-        limit = int(request.args.get('limit', 50))
+        limit = parse_limit(request.args.get('limit'))
         
         if not query:
             return jsonify({'error': 'Search query is required'}), 400
-            
-        # Build search filter
-        search_filter = {
-            '$or': [
-                {'content': {'$regex': query, '$options': 'i'}},  # Case-insensitive content search
-                {'message_type': {'$regex': query, '$options': 'i'}}  # Search by message type
-            ]
-        }
-        
-        # Add channel filter if specified
+        if channel_id and not ObjectId.is_valid(channel_id):
+            return jsonify({'error': 'Invalid channel ID'}), 400
+        
+        # Only search channels the caller belongs to
+        user_id = ObjectId(get_jwt_identity())
+        channel_ids = [channel['_id'] for channel in db.channels.find({'members': user_id}, {'_id': 1})]
         if channel_id:
-            search_filter['channel_id'] = ObjectId(channel_id)
-            
-        # Add date filters
-        if before or after:
-            date_filter = {}
-            if before:
-                date_filter['$lt'] = datetime.fromisoformat(before)
-            if after:
-                date_filter['$gt'] = datetime.fromisoformat(after)
-            if date_filter:
-                search_filter['created_at'] = date_filter
-        
-        # Execute search
-        messages = list(db.messages.find(
-            search_filter,
-            sort=[('created_at', -1)],
-            limit=limit
-        ))
+            if ObjectId(channel_id) not in channel_ids:
+                return jsonify({'error': 'You are not a member of this channel'}), 403
+            channel_ids = [ObjectId(channel_id)]
+        
+        # Rank matches from the inverted index
+        ranked = search_index.search(
+            query,
+            channel_ids,
+            limit=limit,
+            before=datetime.fromisoformat(before) if before else None,
+            after=datetime.fromisoformat(after) if after else None
+        )
+        if not ranked:
+            return jsonify([]), 200
+        
+        # Load the matching messages and keep them in rank order
+        scores = dict(ranked)
+        messages = list(db.messages.find({'_id': {'$in': list(scores)}}))
+        messages.sort(key=lambda msg: scores[msg['_id']], reverse=True)
         
         # Convert to Message objects
-        results = [Message.from_dict(msg).to_response_dict() for msg in messages]
+        get_loader().prime_messages(messages)
+        results = []
+        for msg in messages:
+            message_data = Message.from_dict(msg).to_response_dict()
+            message_data['score'] = round(scores[msg['_id']], 4)
+            results.append(message_data)
         
         return jsonify(results), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/cache-stats', methods=['GET'])
+@jwt_required()
+def get_cache_stats():
+    """Get hit/miss counters for the hot message cache"""
+    return jsonify(message_cache.get_stats()), 200
+
+@bp.route('/fanout-stats', methods=['GET'])
+@jwt_required()
+def get_fanout_stats():
+    """Get per-event socket fanout size and encode time"""
+    return jsonify(fanout.get_stats()), 200
+
+@bp.route('/<message_id>/receipts', methods=['GET'])
+@jwt_required()
+def get_message_receipts(message_id):
+    """Get who has received and read a message, computed from per-user watermarks"""
+    try:
+        if not ObjectId.is_valid(message_id):
+            return jsonify({'error': 'Invalid message ID'}), 400
+            
+        message = db.messages.find_one({'_id': ObjectId(message_id)}, {'channel_id': 1, 'created_at': 1})
+        if not message:
+            return jsonify({'error': 'Message not found'}), 404
+            
+        return jsonify(ReadReceipt.get_message_receipts(message)), 200
+        
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -259,7 +335,9 @@ def update_message(message_id):
                 '$set': {
                     'content': data['content'],
                     'updated_at': datetime.utcnow()
-                }
+                },
+                # The old text's analysis no longer applies
+                '$unset': {'analysis': '', 'content_hash': ''}
             }
         )
         
@@ -267,21 +345,25 @@ def update_message(message_id):
         updated_message = Message.from_dict(
             db.messages.find_one({'_id': ObjectId(message_id)})
         )
+        try:
+            search_index.reindex_message(
+                message_id, message['channel_id'], data['content'], message['created_at'],
+                message.get('message_type', 'text'), message.get('parent_id')
+            )
+        except Exception as e:
+            print(f"Error re-indexing message {message_id}: {str(e)}")
         
         # Convert message to response format
         message_data = updated_message.to_response_dict()
+        message_cache.update_message(updated_message.channel_id, message_data)
         
-        # Emit update to channel room
-        socketio.emit('message_updated', message_data, room=str(updated_message.channel_id))
-        
-        # If this is a reply, also emit to thread room
+        # Emit once to the channel room, the parent's thread room if this is a reply,
+        # and the message's own thread room if it has replies
+        rooms = [str(updated_message.channel_id), f'thread_{message_id}']
         if message.get('parent_id'):
-            thread_room = f'thread_{str(message["parent_id"])}'
-            socketio.emit('message_updated', message_data, room=thread_room)
-        
-        # Also emit to the message's own thread room if it has replies
-        thread_room = f'thread_{message_id}'
-        socketio.emit('message_updated', message_data, room=thread_room)
+            rooms.append(f'thread_{str(message["parent_id"])}')
+        fanout.emit('message_updated', message_data, rooms)
+        message_analyses.schedule(message['_id'], message['channel_id'], data['content'], message.get('parent_id'))
         
         return jsonify(message_data), 200
         
@@ -304,6 +386,19 @@ def delete_message(message_id):
             
         # Delete message
         db.messages.delete_one({'_id': ObjectId(message_id)})
+        message_cache.remove_message(message['channel_id'], message_id)
+        
+        # Deleting a reply shrinks its thread
+        if message.get('parent_id'):
+            thread_summary = Message.record_reply_deleted(message['parent_id'])
+            if thread_summary:
+                summary = dict(thread_summary)
+                message_cache.patch_message(message['channel_id'], summary.pop('message_id'), summary)
+                socketio.emit('reply_count_update', thread_summary, room=str(message['channel_id']))
+        try:
+            search_index.remove_message(message_id)
+        except Exception as e:
+            print(f"Error removing message {message_id} from search index: {str(e)}")
         
         # Emit deletion to channel
         socketio.emit('message_deleted', {
@@ -341,31 +436,48 @@ def react_to_message(message_id):
 @bp.route('/direct/<user_id>', methods=['GET'])
 @jwt_required()
 def get_direct_messages(user_id):
-    """Get direct messages between current user and specified user"""
+    """Get the newest page of direct messages between current user and specified user.
+
+    Messages are returned oldest-to-newest within the page; pass next_cursor (also
+    sent as the X-Next-Cursor header) back as ?cursor= to load older history and
+    prev_cursor (X-Prev-Cursor) to load newer messages.
+    """
     try:
         current_user_id = get_jwt_identity()
         target_user_id = user_id
+        cursor = request.args.get('cursor')
+        limit = parse_limit(request.args.get('limit'))
         
         # Get or create DM channel using Channel model
         channel = Channel.get_direct_message(current_user_id, target_user_id)
         
-        # Get messages for this channel
-        messages = list(db.messages.find(
-            {'channel_id': str(channel._id)},  # Convert ObjectId to string
-            sort=[('created_at', 1)]
-        ))
+        # Get messages for this channel (stored with an ObjectId channel_id)
+        messages, next_cursor, prev_cursor = keyset_page(
+            db.messages,
+            {'channel_id': channel._id, 'parent_id': None},
+            limit,
+            cursor=cursor,
+            newest_first=True
+        )
+        messages.reverse()
+        
+        # Opening the conversation clears its unread count
+        Conversation.mark_read(current_user_id, channel._id)
         
         # Convert messages to response format
+        get_loader().prime_messages(messages)
         message_list = []
         for msg in messages:
             msg_obj = Message.from_dict(msg)
             msg_obj.is_direct = True  # Set is_direct flag
             message_list.append(msg_obj.to_response_dict())
         
-        return jsonify({
+        return with_cursor_headers(jsonify({
             'channel_id': str(channel._id),
-            'messages': message_list
-        })
+            'messages': message_list,
+            'next_cursor': next_cursor,
+            'prev_cursor': prev_cursor
+        }), next_cursor, prev_cursor)
         
     except Exception as e:
         print(f"Error in get_direct_messages: {str(e)}")  # Add debug logging
@@ -392,41 +504,11 @@ def get_recent_chats():
             print(f"Error converting user ID to ObjectId: {str(e)}")
             return jsonify({'error': 'Invalid user ID format'}), 400
         
-        # Find all direct message channels for the current user
-        channels = db.channels.find({
-            'is_direct': True,
-            'members': current_user_id
-        })
-
-        # Convert channels to list and process
-        recent_chats = []
-        for channel in channels:
-            # Find the other user in the DM
-            other_user_id = next(
-                (member for member in channel['members'] if member != current_user_id),
-                None
-            )
-            
-            if other_user_id:
-                # Get the other user's details
-                other_user = db.users.find_one({'_id': other_user_id})
-                if other_user:
-                    # Get the last message in this channel
-                    last_message = db.messages.find_one(
-                        {'channel_id': str(channel['_id'])},
-                        sort=[('created_at', -1)]
-                    )
-
-                    recent_chats.append({
-                        'channel_id': str(channel['_id']),
-                        'user': {
-                            'id': str(other_user['_id']),
-                            'username': other_user['username'],
-                            'display_name': other_user.get('display_name', other_user['username']),
-                            'avatar_url': other_user.get('avatar_url')
-                        },
-                        'last_message': last_message['content'] if last_message else None
-                    })
+        # One indexed, sorted read of the user's materialized conversations
+        recent_chats = [
+            Conversation.to_response_dict(conversation)
+            for conversation in Conversation.get_recent(current_user_id)
+        ]
 
         print(f"Found {len(recent_chats)} recent chats")
         return jsonify(recent_chats), 200
@@ -458,10 +540,15 @@ def send_direct_message(user_id):
             message_type='text'
         )
         
+        # Update both users' recent chats
+        Conversation.record_message(channel, current_user_id, message.content, message.created_at)
+        
         # Emit message to both users
         message_data = message.to_response_dict()
-        for member_id in channel.members:
-            socketio.emit('message_created', message_data, room=str(member_id))
+        fanout.emit('message_created', message_data, channel.members)
+        
+        # Have quick replies ready for the recipient
+        speculative_replies.schedule(message._id, message.content, current_user_id, channel.members)
         
         return jsonify(message_data), 201
         
@@ -471,42 +558,40 @@ def send_direct_message(user_id):
 @bp.route('/<message_id>/replies', methods=['GET'], endpoint='get_replies')
 @jwt_required()
 def get_message_replies(message_id):
-    """Get all replies for a message"""
+    """Get replies for a message, newest first.
+
+    Pass the X-Next-Cursor response header back as ?cursor= to load earlier replies
+    and X-Prev-Cursor to page back towards newer ones.
+    """
     try:
         # Validate message_id
         if not ObjectId.is_valid(message_id):
             return jsonify({'error': 'Invalid message ID'}), 400
 
-        # Get the parent message
-        parent_message = db.messages.find_one({'_id': ObjectId(message_id)})
-        if not parent_message:
+        cursor = request.args.get('cursor')
+        limit = parse_limit(request.args.get('limit'))
+
+        # Make sure the parent message exists
+        if not db.messages.find_one({'_id': ObjectId(message_id)}, {'_id': 1}):
             return jsonify({'error': 'Message not found'}), 404
 
-        # Get replies
-        replies = list(db.messages.find(
+        # Get replies; thread counters are maintained on write, so reading is side-effect free
+        replies, next_cursor, prev_cursor = keyset_page(
+            db.messages,
             {'parent_id': ObjectId(message_id)},
-            sort=[('created_at', 1)]
-        ))
-        
-        # Update the parent message's reply count to match actual count
-        actual_count = len(replies)
-        db.messages.update_one(
-            {'_id': ObjectId(message_id)},
-            {'$set': {'reply_count': actual_count}}
+            limit,
+            cursor=cursor,
+            newest_first=True
         )
         
-        # Get the updated parent message
-        updated_parent = db.messages.find_one({'_id': ObjectId(message_id)})
-        
         # Convert to response format
+        get_loader().prime_messages(replies)
         replies_data = [Message.from_dict(reply).to_response_dict() for reply in replies]
         
-        # Emit the updated reply count to all clients
-        socketio.emit('message_updated', Message.from_dict(updated_parent).to_response_dict(), 
-                     room=str(parent_message['channel_id']))
-        
-        return jsonify(replies_data), 200
+        return with_cursor_headers(jsonify(replies_data), next_cursor, prev_cursor), 200
 
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         current_app.logger.error(f"Error getting message replies: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
@@ -543,22 +628,24 @@ def create_message_reply(message_id):
 
         # Convert to response format
         reply_data = reply.to_response_dict()
+        thread_summary = reply._thread_summary or {}
 
-        # Emit socket event for real-time updates
-        # Emit to thread-specific room
-        thread_room = f'thread_{message_id}'
-        socketio.emit('new_reply', {
+        # Emit socket event for real-time updates, once to the thread room
+        # and the channel room for any other UI updates
+        fanout.emit('new_reply', {
             'message_id': message_id,
             'reply': reply_data,
-            'parent_id': message_id
-        }, room=thread_room)
+            'parent_id': message_id,
+            'reply_count': thread_summary.get('reply_count'),
+            'last_reply_at': thread_summary.get('last_reply_at'),
+            'thread_participants': thread_summary.get('thread_participants')
+        }, [f'thread_{message_id}', str(parent_message['channel_id'])])
 
-        # Also emit to channel room for any other UI updates
-        socketio.emit('new_reply', {
-            'message_id': message_id,
-            'reply': reply_data,
-            'parent_id': message_id
-        }, room=str(parent_message['channel_id']))
+        # Have quick replies ready for the thread's starter and participants
+        speculative_replies.schedule(
+            reply._id, reply.content, current_user_id,
+            [parent_message['sender_id']] + (thread_summary.get('thread_participants') or [])
+        )
 
         return jsonify(reply_data), 201
 
@@ -0,0 +1,165 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import hashlib
+import json
+import re
+import threading
+import time
+from pymongo.errors import PyMongoError
+from app import db
+from app.config import Config
+
+
+def _normalize_text(text):
+    return re.sub(r'\s+', ' ', text or '').strip()
+
+
+def make_cache_key(model, system_prompt, conversation_history, prompt, temperature, max_tokens=None):
+    """Hash the parts of a completion request that determine its output"""
+    history = [
+        [m.get('role'), m.get('name'), _normalize_text(m.get('content'))]
+        for m in (conversation_history or [])
+    ]
+    payload = json.dumps([
+        model,
+        _normalize_text(system_prompt),
+        history,
+        _normalize_text(prompt),
+        round(float(temperature), 2),
+        max_tokens
+    ], separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AIResponseCache:
+    """Two-tier cache for completions.
+
+    Lookups check an in-process LRU first, then the shared `ai_cache` collection
+    so every worker benefits from completions paid for by the others. Mongo drops
+    expired documents through a TTL index on `expires_at`; both tiers also check
+    expiry on read since the TTL monitor only runs once a minute. Callers opt in
+    per endpoint, and hits are counted per endpoint along with the API spend saved.
+    Only deterministic, low-temperature completions are cached (see
+    Config.AI_CACHE_MAX_TEMPERATURE).
+    """
+
+    def __init__(self, timeout=None, max_entries=None):
+        self.timeout = timeout or Config.AI_CACHE_TIMEOUT
+        self.max_entries = max_entries or Config.AI_CACHE_MEMORY_SIZE
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    @staticmethod
+    def ensure_indexes():
+        db.ai_cache.create_index('expires_at', expireAfterSeconds=0)
+
+    def get(self, key, endpoint):
+        """Return the cached entry ({'response', 'model', 'cost'}) or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['expires_at'] > now:
+                self._entries.move_to_end(key)
+                self._record(endpoint, 'memory_hits', entry['cost'])
+                return entry
+            if entry is not None:
+                del self._entries[key]
+
+        try:
+            doc = db.ai_cache.find_one({'_id': key, 'expires_at': {'$gt': datetime.utcnow()}})
+        except PyMongoError as e:
+            print(f"Error reading AI cache: {str(e)}")
+            doc = None
+
+        with self._lock:
+            if doc is None:
+                self._record(endpoint, 'misses')
+                return None
+            entry = {
+                'response': doc['response'],
+                'model': doc['model'],
+                'cost': doc.get('cost', 0),
+                # Keep the shared expiry so workers agree on freshness
+                'expires_at': now + (doc['expires_at'] - datetime.utcnow()).total_seconds()
+            }
+            self._store_local(key, entry)
+            self._record(endpoint, 'shared_hits', entry['cost'])
+            return entry
+
+    def set(self, key, response, model, cost):
+        entry = {
+            'response': response,
+            'model': model,
+            'cost': cost,
+            'expires_at': time.time() + self.timeout
+        }
+        with self._lock:
+            self._store_local(key, entry)
+        try:
+            now = datetime.utcnow()
+            db.ai_cache.replace_one(
+                {'_id': key},
+                {
+                    'response': response,
+                    'model': model,
+                    'cost': cost,
+                    'created_at': now,
+                    'expires_at': now + timedelta(seconds=self.timeout)
+                },
+                upsert=True
+            )
+        except PyMongoError as e:
+            print(f"Error writing AI cache: {str(e)}")
+
+    def invalidate(self, key):
+        """Drop an entry from both tiers, e.g. when the cached completion turned out unusable"""
+        with self._lock:
+            self._entries.pop(key, None)
+        try:
+            db.ai_cache.delete_one({'_id': key})
+        except PyMongoError as e:
+            print(f"Error invalidating AI cache: {str(e)}")
+
+    def _store_local(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _record(self, endpoint, outcome, cost=0):
+        stats = self._stats.setdefault(endpoint, {
+            'memory_hits': 0,
+            'shared_hits': 0,
+            'misses': 0,
+            'dollars_saved': 0.0
+        })
+        stats[outcome] += 1
+        stats['dollars_saved'] += cost
+
+    def get_stats(self):
+        """Get hit rate and API spend saved, overall and per endpoint (this process only)"""
+        def summarize(stats):
+            hits = stats['memory_hits'] + stats['shared_hits']
+            total = hits + stats['misses']
+            return {
+                **stats,
+                'dollars_saved': round(stats['dollars_saved'], 6),
+                'hit_rate': hits / total if total else 0.0
+            }
+
+        with self._lock:
+            totals = {'memory_hits': 0, 'shared_hits': 0, 'misses': 0, 'dollars_saved': 0.0}
+            for stats in self._stats.values():
+                for field in totals:
+                    totals[field] += stats[field]
+            return {
+                **summarize(totals),
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'timeout': self.timeout,
+                'endpoints': {endpoint: summarize(stats) for endpoint, stats in self._stats.items()}
+            }
+
+
+ai_cache = AIResponseCache()
@@ -1,4 +1,4 @@
-from typing import Literal, Optional, List, Dict, Union
+from typing import Literal, Optional, List, Dict, Union, Callable
 import openai
 from openai import OpenAI
 import os
@@ -7,10 +7,31 @@ import traceback
 import asyncio
 from openai.types.chat import ChatCompletion
 import json
+import time
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from app.config import Config
+from app.services.ai_cache import ai_cache, make_cache_key
+from app.services.micro_batcher import MicroBatcher
+from app.services.model_router import model_router
+from app.services.singleflight import inflight_requests
+from app.services.tone_classifier import classify_tone
+from app.services.notes_summaries import chunk_messages, note_summaries, summary_key
+from app.utils.tokens import count_tokens
 
 # Load environment variables
 load_dotenv()
 
+class GenerationCancelled(Exception):
+    """Raised when a streaming consumer stops a completion part-way"""
+
+
+# Shared pool for fanning out independent completions (green threads under eventlet)
+_request_pool = ThreadPoolExecutor(max_workers=Config.AI_MAX_PARALLEL_REQUESTS)
+# Separate, smaller pool for batch work so a long notes generation can't starve interactive requests
+_batch_pool = ThreadPoolExecutor(max_workers=Config.AI_MAX_BATCH_REQUESTS)
+
 class AIService:
     def __init__(self):
         self.api_key = os.getenv('OPENAI_API_KEY')
@@ -18,21 +39,9 @@ class AIService:
             raise ValueError("OpenAI API key not found in environment variables")
         
         print(f"Initializing OpenAI client with API key: {self.api_key[:4]}...")
+        # No network I/O here: the key is validated by the background health probe
         self.client = OpenAI(api_key=self.api_key)
         
-        # Validate API key on initialization
-        try:
-            # Make a minimal API call to validate the key
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": "test"}],
-                max_tokens=1
-            )
-            print("OpenAI API key validated successfully")
-        except Exception as e:
-            print(f"Error validating OpenAI API key: {str(e)}")
-            raise ValueError(f"Invalid OpenAI API key: {str(e)}")
-        
         # Default models
         self.models = {
             '3.5': 'gpt-3.5-turbo',
@@ -45,29 +54,85 @@ class AIService:
             'gpt-4-turbo-preview': {'input': 0.01, 'output': 0.03}
         }
         
-        # Initialize usage tracking
-        self.usage_stats = {model: {'total_tokens': 0, 'total_cost': 0} for model in self.models.values()}
+        # Initialize usage tracking (requests and latency cover upstream calls, not cache hits;
+        # escalations/failovers count routing decisions away from the model). Updated from
+        # request and pool threads, so always under _stats_lock
+        self._stats_lock = threading.Lock()
+        self.usage_stats = {
+            model: {
+                'total_tokens': 0,
+                'total_cost': 0,
+                'requests': 0,
+                'latency_p95_ms': None,
+                'escalations': 0,
+                'failovers': 0
+            }
+            for model in self.models.values()
+        }
+
+        # Tone analyses answered by the local pre-classifier vs sent to a model
+        self.local_analysis_stats = {'answered': 0, 'escalated': 0}
+
+        # Concurrent tone analyses are sent upstream together, per model
+        self._analysis_batchers = {
+            version: MicroBatcher(
+                lambda messages, version=version: self._run_analysis_batch(version, messages),
+                window=Config.ANALYSIS_BATCH_WINDOW,
+                max_items=Config.ANALYSIS_BATCH_SIZE
+            )
+            for version in self.models
+        }
+
+    def check_health(self) -> None:
+        """Validate the key and reachability of the API (free call, no tokens); raises on failure"""
+        client = self.client.with_options(timeout=Config.AI_HEALTH_TIMEOUT, max_retries=0)
+        client.models.retrieve(self.models['3.5'])
 
     def _get_model(self, model_version: Literal['3.5', '4']) -> str:
         """Get the full model name based on version"""
         return self.models.get(model_version, self.models['3.5'])
 
-    def _track_usage(self, model: str, usage: dict) -> None:
-        """Track token usage and cost for the specified model"""
+    def _calculate_cost(self, model: str, usage: dict) -> float:
+        """Calculate the dollar cost of a completion from its token usage"""
+        if model not in self.costs:
+            return 0
+        input_cost = (usage.get('prompt_tokens', 0) / 1000) * self.costs[model]['input']
+        output_cost = (usage.get('completion_tokens', 0) / 1000) * self.costs[model]['output']
+        return input_cost + output_cost
+
+    def _track_usage(self, model: str, usage: dict, latency: Optional[float] = None, task: Optional[str] = None) -> None:
+        """Track token usage, cost and latency for the specified model"""
         if model not in self.usage_stats:
             return
             
         prompt_tokens = usage.get('prompt_tokens', 0)
         completion_tokens = usage.get('completion_tokens', 0)
         
-        # Calculate cost
-        input_cost = (prompt_tokens / 1000) * self.costs[model]['input']
-        output_cost = (completion_tokens / 1000) * self.costs[model]['output']
-        total_cost = input_cost + output_cost
-        
+        cost = self._calculate_cost(model, usage)
+        p95 = None
+        if latency is not None:
+            model_router.record(model, latency, task)
+            p95 = model_router.percentile(model)
+
         # Update stats
-        self.usage_stats[model]['total_tokens'] += prompt_tokens + completion_tokens
-        self.usage_stats[model]['total_cost'] += total_cost
+        with self._stats_lock:
+            stats = self.usage_stats[model]
+            stats['total_tokens'] += prompt_tokens + completion_tokens
+            stats['total_cost'] += cost
+            stats['requests'] += 1
+            if latency is not None:
+                stats['latency_p95_ms'] = round(p95 * 1000) if p95 is not None else None
+
+    def _record_routing(self, model: str, decision: Literal['escalations', 'failovers']) -> None:
+        """Count a routing decision away from `model`"""
+        if model in self.usage_stats:
+            with self._stats_lock:
+                self.usage_stats[model][decision] += 1
+
+    def _model_usage(self, model: str) -> dict:
+        """Snapshot of one model's usage stats"""
+        with self._stats_lock:
+            return dict(self.usage_stats[model])
 
     def generate_response(
         self,
@@ -76,16 +141,43 @@ class AIService:
         temperature: float = 0.7,
         max_tokens: Optional[int] = None,
         system_prompt: Optional[str] = None,
-        conversation_history: Optional[List[Dict[str, str]]] = None
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        cache: Optional[str] = None,
+        on_delta: Optional[Callable[[str], bool]] = None,
+        task: Optional[str] = None
     ) -> tuple[str, dict]:
         """
         Generate a response using the specified OpenAI model
+        Pass `cache` (the calling endpoint's name) to serve identical requests from the
+        response cache for Config.AI_CACHE_TIMEOUT seconds. Only low-temperature calls are
+        cached: above Config.AI_CACHE_MAX_TEMPERATURE the opt-in is ignored, so sampled
+        suggestions are not repeated to everyone asking about the same text.
+        Independently of caching, identical non-streamed requests that are in flight at the
+        same time share one upstream completion.
+        Latency is recorded per task for routing; `task` defaults to `cache`.
+        Pass `on_delta` to stream the completion: it is called with each text fragment as it
+        arrives and can return False to abort generation (raising GenerationCancelled).
         Returns: (response_text, usage_stats)
         """
         try:
             print(f"Generating response with model version: {model_version}")
             model = self._get_model(model_version)
             print(f"Using model: {model}")
+
+            task = task or cache
+            if cache and temperature > Config.AI_CACHE_MAX_TEMPERATURE:
+                cache = None
+
+            # Identifies the normalized request, for both the response cache and in-flight sharing
+            request_key = make_cache_key(model, system_prompt, conversation_history, prompt, temperature, max_tokens)
+            cache_key = request_key if cache else None
+            if cache_key:
+                cached = ai_cache.get(cache_key, cache)
+                if cached is not None:
+                    print(f"AI cache hit for {cache}")
+                    if on_delta is not None:
+                        on_delta(cached['response'])
+                    return cached['response'], self._model_usage(model)
             
             # Build messages array
             messages = []
@@ -104,63 +196,235 @@ class AIService:
             
             print(f"Sending request to OpenAI with {len(messages)} messages")
             
-            try:
+            if on_delta is None:
+                # Identical requests already in flight share that upstream call
+                response_text, shared = inflight_requests.do(
+                    request_key,
+                    lambda: self._complete(model, messages, temperature, max_tokens, None, task, cache_key),
+                    task or 'default'
+                )
+                if shared:
+                    print(f"Joined an identical in-flight request for {task or 'default'}")
+            else:
+                response_text = self._complete(model, messages, temperature, max_tokens, on_delta, task, cache_key)
+            return response_text, self._model_usage(model)
+                
+        except GenerationCancelled:
+            raise
+        except Exception as e:
+            print(f"Error in generate_response: {str(e)}")
+            print("Full traceback:")
+            print(traceback.format_exc())
+            raise
+
+    def _complete(self, model, messages, temperature, max_tokens, on_delta, task, cache_key) -> str:
+        """Make the upstream call for generate_response, then record usage and fill the cache"""
+        started = time.monotonic()
+        try:
+            if on_delta is not None:
+                response_text, usage_dict = self._stream_completion(
+                    model, messages, temperature, max_tokens, on_delta
+                )
+            else:
                 response: ChatCompletion = self.client.chat.completions.create(
                     model=model,
                     messages=messages,
                     temperature=temperature,
                     max_tokens=max_tokens
                 )
-                
+
                 print("Successfully received response from OpenAI")
-                
+
                 # Extract response text
                 response_text = response.choices[0].message.content
-                
+
                 # Convert usage to dict for tracking
                 usage_dict = {
                     'prompt_tokens': response.usage.prompt_tokens,
                     'completion_tokens': response.usage.completion_tokens,
                     'total_tokens': response.usage.total_tokens
                 }
-                
-                # Track usage
-                self._track_usage(model, usage_dict)
-                
-                return response_text, self.usage_stats[model]
-                
-            except Exception as e:
-                print(f"Error in OpenAI API call: {str(e)}")
-                print("Full traceback:")
-                print(traceback.format_exc())
-                # Log the full request details
-                print(f"Request details:")
-                print(f"Model: {model}")
-                print(f"Temperature: {temperature}")
-                print(f"Max tokens: {max_tokens}")
-                print(f"Number of messages: {len(messages)}")
-                raise
-                
+
+            # Track usage
+            self._track_usage(model, usage_dict, latency=time.monotonic() - started, task=task)
+            ai_provider.record_success()
+
+            if cache_key and response_text:
+                ai_cache.set(cache_key, response_text, model, self._calculate_cost(model, usage_dict))
+
+            return response_text
+
+        except GenerationCancelled:
+            print("Streaming generation cancelled by consumer")
+            raise
         except Exception as e:
-            print(f"Error in generate_response: {str(e)}")
+            print(f"Error in OpenAI API call: {str(e)}")
             print("Full traceback:")
             print(traceback.format_exc())
+            # Log the full request details
+            print(f"Request details:")
+            print(f"Model: {model}")
+            print(f"Temperature: {temperature}")
+            print(f"Max tokens: {max_tokens}")
+            print(f"Number of messages: {len(messages)}")
             raise
 
-    def get_usage_stats(self) -> dict:
-        """Get current usage statistics for all models"""
-        return self.usage_stats
+    def _stream_completion(self, model, messages, temperature, max_tokens, on_delta) -> tuple[str, dict]:
+        """Run a streaming completion, relaying each content delta to `on_delta`"""
+        stream = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={'include_usage': True}
+        )
+        parts = []
+        usage_dict = {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+        try:
+            for chunk in stream:
+                if chunk.usage:
+                    usage_dict = {
+                        'prompt_tokens': chunk.usage.prompt_tokens,
+                        'completion_tokens': chunk.usage.completion_tokens,
+                        'total_tokens': chunk.usage.total_tokens
+                    }
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    if on_delta(delta) is False:
+                        raise GenerationCancelled()
+        finally:
+            # Closing the response stops the upstream generation
+            stream.close()
 
-    def analyze_message(self, message: str) -> dict:
+        print("Successfully streamed response from OpenAI")
+        return ''.join(parts), usage_dict
+
+    def generate_parallel(
+        self,
+        temperatures: List[float],
+        budget: Optional[float] = None,
+        **kwargs
+    ) -> List[tuple[str, dict]]:
         """
-        Analyze the tone and impact of a message
-        Returns a dict with tone, impact, reasoning, and suggested improvements
+        Generate one response per temperature, with the upstream calls in flight concurrently.
+        Failed attempts are dropped. Once `budget` seconds have passed the responses that
+        have finished are returned (waiting for the first one if none has finished yet),
+        so one slow completion does not hold back the others.
+        Returns: [(response_text, usage_stats), ...] in temperature order
         """
-        try:
-            if not message or not isinstance(message, str):
-                raise ValueError("Message must be a non-empty string")
+        start = time.monotonic()
+        futures = [
+            _request_pool.submit(self.generate_response, temperature=temperature, **kwargs)
+            for temperature in temperatures
+        ]
+
+        def succeeded(future):
+            return future.done() and not future.cancelled() and future.exception() is None
+
+        wait(futures, timeout=budget)
+        # Over budget with nothing usable yet: take the first success that arrives
+        pending = {f for f in futures if not f.done()}
+        while pending and not any(succeeded(f) for f in futures):
+            _, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+        results = []
+        for i, future in enumerate(futures):
+            if succeeded(future):
+                results.append(future.result())
+            elif future.done():
+                print(f"Parallel generation {i+1} failed: {future.exception()}")
+            else:
+                # Still running; it completes in the background and its usage is tracked
+                future.cancel()
+                print(f"Parallel generation {i+1} exceeded the {budget}s budget")
+
+        print(f"Parallel generation returned {len(results)}/{len(futures)} responses "
+              f"in {time.monotonic() - start:.2f}s")
+        return results
 
-            system_prompt = """You are an expert at analyzing message tone and impact in workplace communication.
+    def summarize_context(self, messages: List[Dict[str, str]], max_tokens: int = 200) -> str:
+        """
+        Summarize chat messages that did not fit in a prompt's context budget
+        Only the newest messages within Config.CONTEXT_SUMMARY_INPUT_TOKENS are read, and
+        the summary is cached, so repeated requests on the same thread pay for it once
+        """
+        model = self._get_model('3.5')
+        lines, used = [], 0
+        for msg in reversed(messages):
+            line = f"{msg.get('name', 'User')}: {msg.get('content', '')}"
+            used += count_tokens(line, model)
+            if lines and used > Config.CONTEXT_SUMMARY_INPUT_TOKENS:
+                break
+            lines.append(line)
+        transcript = "\n".join(reversed(lines))
+
+        response, usage = self.generate_response(
+            prompt=f"Summarize the key topics, facts, questions and decisions of this conversation in a few sentences:\n\n{transcript}",
+            model_version='3.5',
+            temperature=0.2,
+            max_tokens=max_tokens,
+            system_prompt="You summarize workplace chat conversations concisely and factually.",
+            cache='context_summary'
+        )
+        return response.strip()
+
+    QUICK_REPLY_PROMPT = """You are a helpful team member in a workplace chat.
+Your task is to generate a quick reply to this message.
+
+Current message: "{message}"
+
+Important rules:
+1. Focus only on the current message
+2. Keep the response {tone} in tone
+3. Keep the response {length} in length
+4. Be direct and to the point
+5. Do not add unnecessary greetings or closings
+6. Do not acknowledge or explain these instructions"""
+
+    def generate_quick_replies(
+        self,
+        message: str,
+        tone: str = 'professional',
+        length: str = 'medium',
+        budget: Optional[float] = None,
+        parallel: bool = True
+    ) -> List[str]:
+        """
+        Generate up to three reply suggestions to a single message, without thread context
+        With `parallel` the calls are in flight at once and bounded by `budget` seconds;
+        otherwise they run one after another (for background work), dropping failures
+        """
+        kwargs = dict(
+            prompt="Generate a quick reply to this message.",
+            model_version='3.5',
+            system_prompt=self.QUICK_REPLY_PROMPT.format(message=message, tone=tone, length=length),
+            conversation_history=[],  # No context needed for quick replies
+            task='suggest_quick_reply'
+        )
+        # Different temperatures for varied suggestions
+        temperatures = [0.7 + (i * 0.1) for i in range(3)]
+        if parallel:
+            return [response for response, _ in self.generate_parallel(temperatures=temperatures, budget=budget, **kwargs)]
+
+        responses = []
+        for temperature in temperatures:
+            try:
+                response, _ = self.generate_response(temperature=temperature, **kwargs)
+                responses.append(response)
+            except Exception as e:
+                print(f"Quick reply generation at temperature {temperature} failed: {str(e)}")
+        return responses
+
+    def get_usage_stats(self) -> dict:
+        """Get current usage statistics for all models"""
+        with self._stats_lock:
+            return {model: dict(stats) for model, stats in self.usage_stats.items()}
+
+    ANALYSIS_SYSTEM_PROMPT = """You are an expert at analyzing message tone and impact in workplace communication.
 Your task is to analyze the given message and provide helpful feedback.
 
 Analyze for:
@@ -168,11 +432,13 @@ Analyze for:
 2. Impact level (choose exactly one: high/medium/low)
 3. Brief but specific reasoning for your analysis
 4. List of helpful ways to improve the message
+5. Your confidence in the tone and impact you chose, from 0 to 1
 
 Format your response as a JSON object with these exact keys:
 {
     "tone": "...",
     "impact": "...",
+    "confidence": 0.9,
     "reasoning": "...",
     "improvements": [
         "Your message sounds uncertain. Make it more confident by being direct about what you want.",
@@ -219,6 +485,7 @@ Input: "i guess maybe we could try to finish this if possible?"
 {
     "tone": "weak",
     "impact": "low",
+    "confidence": 0.95,
     "reasoning": "Uses uncertain language ('i guess', 'maybe', 'could') and lacks confidence",
     "improvements": [
         "Remove uncertain words like 'guess', 'maybe', and 'if possible' to sound more confident.",
@@ -232,6 +499,7 @@ Input: "you need to send this report immediately!!!"
 {
     "tone": "aggressive",
     "impact": "medium",
+    "confidence": 0.85,
     "reasoning": "Uses demanding language and multiple exclamation marks, which can come across as forceful",
     "improvements": [
         "Soften the demand by explaining why the report is urgent.",
@@ -240,53 +508,257 @@ Input: "you need to send this report immediately!!!"
     ]
 }"""
 
-            # Use GPT-4 for more accurate analysis
-            response, _ = self.generate_response(
-                prompt=message,
-                model_version='4',  # Use GPT-4 for better analysis
-                temperature=0.3,    # Lower temperature for more consistent analysis
-                system_prompt=system_prompt
-            )
+    def analyze_message(self, message: str, on_delta: Optional[Callable[[str], bool]] = None) -> dict:
+        """
+        Analyze the tone and impact of a message
+        Pass `on_delta` to stream the raw completion as it is generated
+        Returns a dict with tone, impact, reasoning, and suggested improvements
+        """
+        try:
+            if not message or not isinstance(message, str):
+                raise ValueError("Message must be a non-empty string")
 
-            # Parse the response as a dictionary
-            try:
-                analysis = json.loads(response)
-                
-                # Validate required keys
-                required_keys = ['tone', 'impact', 'reasoning', 'improvements']
-                if not all(key in analysis for key in required_keys):
-                    raise ValueError("Missing required keys in analysis response")
-                
-                # Validate tone values
-                valid_tones = {'aggressive', 'weak', 'neutral', 'confusing'}
-                if analysis['tone'].lower() not in valid_tones:
-                    raise ValueError(f"Invalid tone value: {analysis['tone']}")
-                
-                # Validate impact values
-                valid_impacts = {'high', 'medium', 'low'}
-                if analysis['impact'].lower() not in valid_impacts:
-                    raise ValueError(f"Invalid impact value: {analysis['impact']}")
-                
-                # Ensure improvements is a list
-                if not isinstance(analysis['improvements'], list):
-                    raise ValueError("Improvements must be a list")
-                
-                # Ensure reasoning is a string
-                if not isinstance(analysis['reasoning'], str):
-                    raise ValueError("Reasoning must be a string")
-                
-                return analysis
-                
-            except json.JSONDecodeError:
-                print(f"Error parsing AI response as JSON: {response}")
-                raise ValueError("Invalid analysis response format")
+            if Config.ANALYSIS_LOCAL_CLASSIFIER:
+                local = classify_tone(message)
+                with self._stats_lock:
+                    self.local_analysis_stats['answered' if local is not None else 'escalated'] += 1
+                if local is not None:
+                    return local
+
+            system_prompt = self.ANALYSIS_SYSTEM_PROMPT
+
+            # Cheapest model first, escalating while the answer is invalid or unsure.
+            # A streamed attempt can't be taken back, so streaming starts with the final
+            # model and only moves on (to the cheaper ones) if it fails before streaming.
+            streaming = on_delta is not None
+            candidates = Config.ANALYSIS_MODELS if not streaming else Config.ANALYSIS_MODELS[::-1]
+            streamed = False
+
+            def forward(delta):
+                nonlocal streamed
+                streamed = True
+                return on_delta(delta)
+
+            # Models skipped for latency go to the back, in case every faster one fails
+            order = list(candidates)
+            deferred = set()
+            analysis = None
+            i = -1
+            while i + 1 < len(order):
+                i += 1
+                version = order[i]
+                model = self._get_model(version)
+                is_last = i == len(order) - 1
+
+                if version not in deferred and self._analysis_too_slow(version):
+                    if analysis is not None:
+                        # Escalating would blow the latency budget; keep the valid but unsure answer
+                        print(f"Skipping escalation to {model}: p95 latency over {Config.ANALYSIS_LATENCY_BUDGET}s")
+                        self._record_routing(model, 'failovers')
+                        break
+                    if any(not self._analysis_too_slow(v) for v in order[i + 1:]):
+                        # A later model is within the budget; fail over to it
+                        print(f"Failing over from {model}: p95 latency over {Config.ANALYSIS_LATENCY_BUDGET}s")
+                        self._record_routing(model, 'failovers')
+                        deferred.add(version)
+                        order.append(version)
+                        continue
+
+                response = None
+                try:
+                    if not streaming:
+                        # Shares one upstream call with other analyses arriving at the same time
+                        attempt = self._analyze_batched(message, version)
+                    else:
+                        response, _ = self.generate_response(
+                            prompt=message,
+                            model_version=version,
+                            temperature=0.3,    # Lower temperature for more consistent analysis
+                            system_prompt=system_prompt,
+                            cache='analyze_message',
+                            on_delta=forward
+                        )
+                        attempt = self._parse_analysis(response)
+                except GenerationCancelled:
+                    raise
+                except ValueError as e:
+                    # Don't keep serving a malformed analysis from the cache
+                    ai_cache.invalidate(make_cache_key(model, system_prompt, None, message, 0.3))
+                    if isinstance(e, json.JSONDecodeError):
+                        print(f"Error parsing AI response as JSON: {response or str(e)}")
+                        e = ValueError("Invalid analysis response format")
+                    if not is_last and not streamed:
+                        print(f"Escalating analysis from {model}: {str(e)}")
+                        self._record_routing(model, 'escalations')
+                        continue
+                    if analysis is not None:
+                        return analysis
+                    raise e
+                except Exception as e:
+                    # Upstream error: the next model may still answer
+                    if not is_last and not streamed:
+                        print(f"Failing over from {model} after an upstream error: {str(e)}")
+                        self._record_routing(model, 'failovers')
+                        continue
+                    if analysis is not None:
+                        return analysis
+                    raise
 
+                analysis = attempt
+                # A streamed answer is final, and models deferred for latency are only fallbacks
+                if (is_last or streaming or all(v in deferred for v in order[i + 1:])
+                        or analysis['confidence'] >= Config.ANALYSIS_MIN_CONFIDENCE):
+                    break
+                print(f"Escalating analysis from {model}: confidence {analysis['confidence']}")
+                self._record_routing(model, 'escalations')
+
+            return analysis
+
+        except GenerationCancelled:
+            raise
         except Exception as e:
             print(f"Error in analyze_message: {str(e)}")
             print("Full traceback:")
             print(traceback.format_exc())
             raise
 
+    def _analysis_too_slow(self, model_version: Literal['3.5', '4']) -> bool:
+        """Whether a model's recent p95 latency for analysis is over Config.ANALYSIS_LATENCY_BUDGET"""
+        return model_router.is_too_slow(
+            self._get_model(model_version), Config.ANALYSIS_LATENCY_BUDGET, 'analyze_message'
+        )
+
+    ANALYSIS_BATCH_PROMPT = """
+
+You will receive several messages at once, as a JSON array of {"id": ..., "message": ...} objects.
+Analyze each message independently, exactly as you would analyze it on its own.
+Respond with a JSON object {"results": [...]} holding one analysis object per message, in the
+same order, each with an "id" key matching its message plus the keys described above."""
+
+    def _analyze_batched(self, message: str, model_version: Literal['3.5', '4']) -> dict:
+        """Analyze one message with `model_version`, batched with concurrent requests"""
+        cache_key = make_cache_key(self._get_model(model_version), self.ANALYSIS_SYSTEM_PROMPT, None, message, 0.3)
+        cached = ai_cache.get(cache_key, 'analyze_message')
+        if cached is not None:
+            print("AI cache hit for analyze_message")
+            return self._parse_analysis(cached['response'])
+        return self._analysis_batchers[model_version].submit(message)
+
+    def _run_analysis_batch(self, model_version: Literal['3.5', '4'], messages: List[str]) -> list:
+        """
+        Analyze a batch of distinct messages in one completion (a lone message takes the
+        regular cached single-message call)
+        Returns one analysis (or ValueError) per message; each analysis is cached under its
+        single-message key so later identical requests skip the upstream call
+        """
+        model = self._get_model(model_version)
+        if len(messages) == 1:
+            # The regular cached (and in-flight deduplicated) single-message call
+            response, _ = self.generate_response(
+                prompt=messages[0],
+                model_version=model_version,
+                temperature=0.3,
+                system_prompt=self.ANALYSIS_SYSTEM_PROMPT,
+                cache='analyze_message'
+            )
+            try:
+                return [self._parse_analysis(response)]
+            except ValueError as e:
+                return [e]
+
+        print(f"Analyzing a batch of {len(messages)} messages")
+        # A batch takes longer than one analysis, so its latency is kept out of the
+        # 'analyze_message' window that latency routing reads
+        response, _ = self.generate_response(
+            prompt=json.dumps([{'id': i, 'message': m} for i, m in enumerate(messages)]),
+            model_version=model_version,
+            temperature=0.3,
+            system_prompt=self.ANALYSIS_SYSTEM_PROMPT + self.ANALYSIS_BATCH_PROMPT,
+            task='analyze_message_batch'
+        )
+        try:
+            results = [r for r in json.loads(response)['results'] if isinstance(r, dict)]
+        except (ValueError, KeyError, TypeError):
+            print(f"Error parsing AI batch response as JSON: {response}")
+            return [ValueError("Invalid analysis response format")] * len(messages)
+        by_id = {str(r.pop('id', None)): r for r in results}
+        if len(by_id) != len(results) and len(results) == len(messages):
+            # Ids missing or repeated; fall back to the order of the results
+            by_id = {str(i): r for i, r in enumerate(results)}
+        item_texts = [json.dumps(by_id[str(i)]) if str(i) in by_id else None for i in range(len(messages))]
+
+        analyses = []
+        for message, item_text in zip(messages, item_texts):
+            if item_text is None:
+                analyses.append(ValueError("Missing analysis in batch response"))
+                continue
+            try:
+                analysis = self._parse_analysis(item_text)
+            except ValueError as e:
+                analyses.append(e)
+                continue
+            # Cached with what the single-message call would have cost, i.e. what a hit saves
+            cost = self._calculate_cost(model, {
+                'prompt_tokens': count_tokens(self.ANALYSIS_SYSTEM_PROMPT + message, model),
+                'completion_tokens': count_tokens(item_text, model)
+            })
+            ai_cache.set(
+                make_cache_key(model, self.ANALYSIS_SYSTEM_PROMPT, None, message, 0.3),
+                item_text, model, cost
+            )
+            analyses.append(analysis)
+        return analyses
+
+    def get_local_analysis_stats(self) -> dict:
+        """Get how many analyses the local pre-classifier answered (this process only)"""
+        with self._stats_lock:
+            stats = dict(self.local_analysis_stats)
+        total = stats['answered'] + stats['escalated']
+        return {
+            **stats,
+            'answered_rate': stats['answered'] / total if total else 0.0
+        }
+
+    def get_batching_stats(self) -> dict:
+        """Get analysis micro-batching counters per model (this process only)"""
+        return {self._get_model(version): batcher.get_stats() for version, batcher in self._analysis_batchers.items()}
+
+    @staticmethod
+    def _parse_analysis(response: str) -> dict:
+        """Parse and validate a tone analysis completion; raises ValueError if it is unusable"""
+        analysis = json.loads(response)
+        
+        # Validate required keys
+        required_keys = ['tone', 'impact', 'reasoning', 'improvements']
+        if not isinstance(analysis, dict) or not all(key in analysis for key in required_keys):
+            raise ValueError("Missing required keys in analysis response")
+        
+        # Validate tone values
+        valid_tones = {'aggressive', 'weak', 'neutral', 'confusing'}
+        if str(analysis['tone']).lower() not in valid_tones:
+            raise ValueError(f"Invalid tone value: {analysis['tone']}")
+        
+        # Validate impact values
+        valid_impacts = {'high', 'medium', 'low'}
+        if str(analysis['impact']).lower() not in valid_impacts:
+            raise ValueError(f"Invalid impact value: {analysis['impact']}")
+        
+        # Ensure improvements is a list
+        if not isinstance(analysis['improvements'], list):
+            raise ValueError("Improvements must be a list")
+        
+        # Ensure reasoning is a string
+        if not isinstance(analysis['reasoning'], str):
+            raise ValueError("Reasoning must be a string")
+        
+        # A missing or malformed confidence counts as unsure
+        try:
+            analysis['confidence'] = min(max(float(analysis.get('confidence', 0)), 0.0), 1.0)
+        except (TypeError, ValueError):
+            analysis['confidence'] = 0.0
+        
+        return analysis
+
     def clean_ai_response(self, response: str) -> str:
         """Clean AI response by removing common introductory phrases"""
         # List of common phrases to remove
@@ -378,28 +850,7 @@ Input: "you need to send this report immediately!!!"
         
         return response 
 
-    def generate_meeting_notes(
-        self,
-        messages: List[dict],
-        channel_name: str,
-        thread_title: Optional[str] = None,
-        model_version: Literal['3.5', '4'] = '4'
-    ) -> dict:
-        """
-        Generate structured meeting notes from a list of messages
-        Returns a dictionary with title and sections for the notes
-        """
-        try:
-            # Format messages for the prompt
-            formatted_messages = []
-            for msg in messages:
-                # Get timestamp - it's already in ISO format from serialization
-                timestamp = msg.get('created_at', '')
-                formatted_messages.append(f"{msg.get('username', 'Unknown')}: ({timestamp})\n{msg.get('content', '')}\n")
-            
-            messages_text = "\n".join(formatted_messages)
-            
-            system_prompt = """You are an expert meeting notes generator.
+    NOTES_SYSTEM_PROMPT = """You are an expert meeting notes generator.
 Your task is to analyze the conversation and create clear, structured meeting notes.
 
 Guidelines:
@@ -434,45 +885,357 @@ Output Format (JSON):
     ]
 }"""
 
+    @staticmethod
+    def _format_notes_message(msg: dict) -> str:
+        # Get timestamp - it's already in ISO format from serialization
+        timestamp = msg.get('created_at', '')
+        return f"{msg.get('username', 'Unknown')}: ({timestamp})\n{msg.get('content', '')}\n"
+
+    @staticmethod
+    def _parse_notes(response: str) -> dict:
+        """Parse and validate a notes completion"""
+        try:
+            notes = json.loads(response)
+        except json.JSONDecodeError:
+            raise ValueError("Invalid JSON response from AI model")
+
+        # Validate required structure
+        if not isinstance(notes, dict):
+            raise ValueError("Response must be a dictionary")
+        if "title" not in notes:
+            raise ValueError("Missing 'title' in response")
+        if "sections" not in notes:
+            raise ValueError("Missing 'sections' in response")
+        if not isinstance(notes["sections"], list):
+            raise ValueError("'sections' must be a list")
+
+        return notes
+
+    def generate_meeting_notes(
+        self,
+        messages: List[dict],
+        channel_name: str,
+        thread_title: Optional[str] = None,
+        model_version: Literal['3.5', '4'] = '4',
+        on_delta: Optional[Callable[[str], bool]] = None
+    ) -> dict:
+        """
+        Generate structured meeting notes from a list of messages
+        Conversations longer than Config.NOTES_CHUNK_TOKENS are summarized map-reduce
+        style: each chunk is summarized separately (cached by content, so only new or
+        edited chunks cost a call on regeneration) and the summaries are then merged.
+        Pass `on_delta` to stream the raw completion of the final step as it is generated
+        Returns a dictionary with title and sections for the notes
+        """
+        try:
+            model = self._get_model(model_version)
+            formatted_messages = [self._format_notes_message(msg) for msg in messages]
+            messages_text = "\n".join(formatted_messages)
+
             context = f"""This is a conversation from the channel: {channel_name}"""
             if thread_title:
                 context += f"\nThread Topic: {thread_title}"
-            
-            prompt = f"""{context}
+
+            if count_tokens(messages_text, model) <= Config.NOTES_CHUNK_TOKENS:
+                prompt = f"""{context}
 
 Please analyze this conversation and generate structured meeting notes:
 
 {messages_text}"""
 
-            # Generate notes using specified model
+                # Generate notes using specified model
+                response, usage = self.generate_response(
+                    prompt=prompt,
+                    model_version=model_version,
+                    temperature=0.7,
+                    system_prompt=self.NOTES_SYSTEM_PROMPT,
+                    on_delta=on_delta
+                )
+                return self._parse_notes(response)
+
+            partial_notes = self._summarize_messages(messages)
             response, usage = self.generate_response(
-                prompt=prompt,
+                prompt=self._merge_prompt(partial_notes, context),
                 model_version=model_version,
                 temperature=0.7,
-                system_prompt=system_prompt
+                system_prompt=self.NOTES_SYSTEM_PROMPT,
+                on_delta=on_delta
             )
+            return self._parse_notes(response)
 
-            # Parse the response as JSON
-            try:
-                notes = json.loads(response)
-                
-                # Validate required structure
-                if not isinstance(notes, dict):
-                    raise ValueError("Response must be a dictionary")
-                if "title" not in notes:
-                    raise ValueError("Missing 'title' in response")
-                if "sections" not in notes:
-                    raise ValueError("Missing 'sections' in response")
-                if not isinstance(notes["sections"], list):
-                    raise ValueError("'sections' must be a list")
-                
-                return notes
-                
-            except json.JSONDecodeError:
-                raise ValueError("Invalid JSON response from AI model")
-
+        except GenerationCancelled:
+            raise
         except Exception as e:
             print(f"Error in generate_meeting_notes: {str(e)}")
             print("Full traceback:")
             print(traceback.format_exc())
-            raise 
\ No newline at end of file
+            raise
+
+    def update_meeting_notes(
+        self,
+        notes: dict,
+        messages: List[dict],
+        channel_name: str,
+        thread_title: Optional[str] = None,
+        model_version: Literal['3.5', '4'] = '4',
+        on_delta: Optional[Callable[[str], bool]] = None
+    ) -> dict:
+        """
+        Merge new messages into existing notes ({'title', 'sections'})
+        Only the new messages are sent (summarized first with the cached chunk pipeline
+        if they exceed Config.NOTES_CHUNK_TOKENS), so the cost follows the new traffic
+        rather than the length of the whole conversation
+        Returns a dictionary with title and sections for the updated notes
+        """
+        try:
+            model = self._get_model(model_version)
+            messages_text = "\n".join(self._format_notes_message(msg) for msg in messages)
+
+            context = f"""This is a conversation from the channel: {channel_name}"""
+            if thread_title:
+                context += f"\nThread Topic: {thread_title}"
+
+            if count_tokens(messages_text, model) <= Config.NOTES_CHUNK_TOKENS:
+                new_material = f"""New messages posted since these notes were written:
+
+{messages_text}"""
+            else:
+                partial_notes = self._summarize_messages(messages)
+                new_material = "Notes for the messages posted since these notes were written, in order:\n\n" + "\n\n".join(
+                    f"Part {i+1}:\n{json.dumps(part)}" for i, part in enumerate(partial_notes)
+                )
+
+            prompt = f"""{context}
+
+These are the current meeting notes for this conversation:
+
+{json.dumps({'title': notes.get('title'), 'sections': notes.get('sections', [])})}
+
+{new_material}
+
+Please update the notes with the new information and return the complete updated notes. Keep existing points unless the new messages change them, add new decisions and action items to the matching sections, and note when an earlier action item has been completed or a decision reversed."""
+
+            response, usage = self.generate_response(
+                prompt=prompt,
+                model_version=model_version,
+                temperature=0.3,
+                system_prompt=self.NOTES_SYSTEM_PROMPT,
+                on_delta=on_delta
+            )
+            return self._parse_notes(response)
+
+        except GenerationCancelled:
+            raise
+        except Exception as e:
+            print(f"Error in update_meeting_notes: {str(e)}")
+            print("Full traceback:")
+            print(traceback.format_exc())
+            raise
+
+    def _summarize_messages(self, messages: List[dict]) -> List[dict]:
+        """
+        Summarize messages map-reduce style into partial notes that together fit within
+        Config.NOTES_MERGE_TOKENS, reusing cached chunk and merge summaries
+        Returns the partial notes in conversation order
+        """
+        # Map: summarize each chunk of the conversation
+        chunk_model = self._get_model(Config.NOTES_CHUNK_MODEL)
+        chunks = chunk_messages(
+            messages, Config.NOTES_CHUNK_TOKENS,
+            lambda msg: count_tokens(self._format_notes_message(msg), chunk_model)
+        )
+        summaries = self._map_summaries([
+            (
+                summary_key('chunk', chunk_model, [f"{m.get('id')}:{m.get('updated_at')}" for m in chunk]),
+                lambda chunk=chunk: self._summarize_chunk(chunk),
+                len(chunk)
+            )
+            for chunk in chunks
+        ])
+        print(f"Summarized {len(messages)} messages in {len(chunks)} chunks")
+
+        # Reduce: merge the summaries level by level until they fit in one call
+        def size(summary):
+            return count_tokens(json.dumps(summary[1]), chunk_model)
+
+        while len(summaries) > 1 and sum(size(s) for s in summaries) > Config.NOTES_MERGE_TOKENS:
+            groups = chunk_messages(summaries, Config.NOTES_MERGE_TOKENS, size)
+            if len(groups) == len(summaries):
+                # Every summary fills the budget alone; pair them up so the level shrinks
+                groups = [summaries[i:i+2] for i in range(0, len(summaries), 2)]
+            # A summary left alone in its group moves up a level unchanged
+            level, work = [], []
+            for group in groups:
+                if len(group) == 1:
+                    level.append(group[0])
+                    continue
+                key = summary_key('merge', chunk_model, [child for child, _ in group])
+                work.append((key, lambda group=group: self._merge_summaries([notes for _, notes in group]), len(group)))
+                level.append(key)
+            merged = dict(self._map_summaries(work))
+            summaries = [item if isinstance(item, tuple) else (item, merged[item]) for item in level]
+
+        return [notes for _, notes in summaries]
+
+    def _map_summaries(self, work: List[tuple]) -> List[tuple]:
+        """
+        Produce the partial notes for each (key, summarize, message_count) item, from the
+        summary cache where possible and with the missing ones generated concurrently
+        Returns: [(key, notes), ...] in input order
+        """
+        results = {}
+        pending = []
+        for key, summarize, message_count in work:
+            cached = note_summaries.get(key)
+            if cached is not None:
+                results[key] = cached
+            else:
+                pending.append((key, _batch_pool.submit(summarize), message_count))
+
+        # A failure aborts the generation, but the summaries that succeeded stay cached
+        for key, future, message_count in pending:
+            notes = future.result()
+            note_summaries.set(key, notes, self._get_model(Config.NOTES_CHUNK_MODEL), message_count)
+            results[key] = notes
+
+        print(f"Note summaries: {len(work) - len(pending)} cached, {len(pending)} generated")
+        return [(key, results[key]) for key, _, _ in work]
+
+    def _summarize_chunk(self, chunk: List[dict]) -> dict:
+        messages_text = "\n".join(self._format_notes_message(msg) for msg in chunk)
+        prompt = f"""This is one consecutive excerpt of a longer conversation.
+
+Please analyze this excerpt and generate structured meeting notes for it:
+
+{messages_text}"""
+
+        response, usage = self.generate_response(
+            prompt=prompt,
+            model_version=Config.NOTES_CHUNK_MODEL,
+            temperature=0.3,
+            system_prompt=self.NOTES_SYSTEM_PROMPT
+        )
+        return self._parse_notes(response)
+
+    def _merge_prompt(self, partial_notes: List[dict], context: Optional[str] = None) -> str:
+        parts = "\n\n".join(
+            f"Part {i+1}:\n{json.dumps(notes)}" for i, notes in enumerate(partial_notes)
+        )
+        intro = f"{context}\n\n" if context else ""
+        return f"""{intro}These are meeting notes for consecutive parts of one conversation, in order.
+
+Please merge them into a single set of structured meeting notes. Combine duplicate points, keep every decision and action item, and keep later decisions when they supersede earlier ones:
+
+{parts}"""
+
+    def _merge_summaries(self, partial_notes: List[dict]) -> dict:
+        response, usage = self.generate_response(
+            prompt=self._merge_prompt(partial_notes),
+            model_version=Config.NOTES_CHUNK_MODEL,
+            temperature=0.3,
+            system_prompt=self.NOTES_SYSTEM_PROMPT
+        )
+        return self._parse_notes(response)
+
+
+class AIServiceProvider:
+    """Lazily creates the shared AIService and tracks upstream health.
+
+    Nothing touches the network at import or app start, so worker boot time does not
+    depend on OpenAI. The service is built on first use, and from then on a background
+    probe checks the API every Config.AI_HEALTH_INTERVAL seconds, retrying with
+    exponential backoff while it is down. While the last probe failed the service is
+    half-open: requests are refused (503) except for one trial request every
+    Config.AI_HEALTH_TRIAL_INTERVAL seconds, and it is served again as soon as a probe
+    or a trial request succeeds.
+    """
+
+    def __init__(self):
+        self._service = None
+        # Guards creation, health and the trial slot (reentrant: get() records health under it)
+        self._lock = threading.RLock()
+        self._last_trial = 0.0
+        self.health = {
+            'status': 'unknown',
+            'checked_at': None,
+            'latency_ms': None,
+            'error': None,
+            'consecutive_failures': 0
+        }
+
+    def get(self) -> Optional[AIService]:
+        """Get the service, creating it on first use; None if it cannot be configured"""
+        if self._service is None:
+            with self._lock:
+                if self._service is None:
+                    try:
+                        self._service = AIService()
+                    except Exception as e:
+                        # Retried on the next call, e.g. once the key is configured
+                        print(f"Error initializing AI service: {str(e)}")
+                        self._set_health('unconfigured', error=str(e))
+                        return None
+                    threading.Thread(target=self._probe_loop, daemon=True).start()
+        return self._service
+
+    def get_available(self) -> Optional[AIService]:
+        """Get the service unless it is unconfigured or down; while down, only for a trial request"""
+        service = self.get()
+        if service is None:
+            return None
+        with self._lock:
+            if self.health['status'] != 'unhealthy':
+                return service
+            # Half-open: only one request per interval gets to try the upstream
+            now = time.monotonic()
+            if now - self._last_trial < Config.AI_HEALTH_TRIAL_INTERVAL:
+                return None
+            self._last_trial = now
+            return service
+
+    def probe(self) -> dict:
+        """Check upstream health once and update the recorded status"""
+        start = time.monotonic()
+        try:
+            self._service.check_health()
+            self._set_health('healthy', latency=time.monotonic() - start)
+        except Exception as e:
+            print(f"AI health probe failed: {str(e)}")
+            self._set_health('unhealthy', latency=time.monotonic() - start, error=str(e))
+        return self.health
+
+    def record_success(self) -> None:
+        """A real request succeeded, so the upstream is evidently reachable"""
+        with self._lock:
+            if self.health['status'] != 'healthy':
+                self._set_health('healthy')
+
+    def _probe_loop(self):
+        while True:
+            self.probe()
+            failures = self.health['consecutive_failures']
+            if failures:
+                interval = min(Config.AI_HEALTH_RETRY * 2 ** (failures - 1), Config.AI_HEALTH_INTERVAL)
+            else:
+                interval = Config.AI_HEALTH_INTERVAL
+            time.sleep(interval)
+
+    def _set_health(self, status, latency=None, error=None):
+        # Called from request threads and the probe thread
+        with self._lock:
+            failures = self.health['consecutive_failures'] + 1 if status == 'unhealthy' else 0
+            self.health = {
+                'status': status,
+                'checked_at': datetime.utcnow().isoformat(),
+                'latency_ms': round(latency * 1000) if latency is not None else None,
+                'error': error,
+                'consecutive_failures': failures
+            }
+
+
+ai_provider = AIServiceProvider()
+
+
+def get_ai_service() -> Optional[AIService]:
+    """Get the shared AIService if it is configured and the upstream is healthy"""
+    return ai_provider.get_available()
@@ -0,0 +1,116 @@
+import threading
+import time
+import traceback
+import uuid
+from app import socketio
+from app.services.ai_service import GenerationCancelled
+from app.sockets.fanout import fanout
+
+# Deltas arriving closer together than this are coalesced into one socket event
+DELTA_FLUSH_INTERVAL = 0.05
+
+
+class AIStream:
+    def __init__(self, user_id, kind):
+        self.id = uuid.uuid4().hex
+        self.user_id = str(user_id)
+        self.kind = kind
+        self.cancelled = threading.Event()
+        self.started_at = time.monotonic()
+        self.first_token_at = None
+        self.buffer = []
+        self.last_flush = 0.0
+        self.seq = 0
+
+
+class AIStreamManager:
+    """Runs AI generations in the background and relays their tokens over Socket.IO.
+
+    Every event goes to the requesting user's personal room:
+      ai_stream_delta     {stream_id, kind, seq, delta}
+      ai_stream_complete  {stream_id, kind, result, time_to_first_token_ms, duration_ms}
+      ai_stream_error     {stream_id, kind, message}
+      ai_stream_cancelled {stream_id, kind}
+    A stream stops early when the user cancels it or their last socket disconnects.
+    """
+
+    def __init__(self, socketio):
+        self.socketio = socketio
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def start(self, user_id, kind, work):
+        """Start `work(on_delta)` in the background and return the stream id.
+
+        `work` returns the final result sent with ai_stream_complete.
+        """
+        stream = AIStream(user_id, kind)
+        with self._lock:
+            self._streams[stream.id] = stream
+        self.socketio.start_background_task(self._run, stream, work)
+        return stream.id
+
+    def cancel(self, stream_id, user_id):
+        """Cancel a stream owned by `user_id`"""
+        with self._lock:
+            stream = self._streams.get(stream_id)
+        if stream is None or stream.user_id != str(user_id):
+            return False
+        stream.cancelled.set()
+        return True
+
+    def cancel_user(self, user_id):
+        """Cancel every stream of a user (their last socket went away)"""
+        with self._lock:
+            streams = [s for s in self._streams.values() if s.user_id == str(user_id)]
+        for stream in streams:
+            stream.cancelled.set()
+        return len(streams)
+
+    def _emit(self, stream, event, payload):
+        fanout.emit(event, {'stream_id': stream.id, 'kind': stream.kind, **payload}, [stream.user_id])
+
+    def _flush(self, stream):
+        if stream.buffer:
+            stream.seq += 1
+            self._emit(stream, 'ai_stream_delta', {'seq': stream.seq, 'delta': ''.join(stream.buffer)})
+            stream.buffer = []
+        stream.last_flush = time.monotonic()
+
+    def _run(self, stream, work):
+        def on_delta(delta):
+            if stream.cancelled.is_set():
+                return False
+            now = time.monotonic()
+            if stream.first_token_at is None:
+                stream.first_token_at = now
+            stream.buffer.append(delta)
+            # The first token goes out immediately, later ones in small batches
+            if stream.seq == 0 or now - stream.last_flush >= DELTA_FLUSH_INTERVAL:
+                self._flush(stream)
+            return True
+
+        try:
+            result = work(on_delta)
+            self._flush(stream)
+            now = time.monotonic()
+            ttft = (stream.first_token_at or now) - stream.started_at
+            print(f"AI stream {stream.kind} finished: first token {ttft * 1000:.0f}ms, "
+                  f"total {(now - stream.started_at) * 1000:.0f}ms")
+            self._emit(stream, 'ai_stream_complete', {
+                'result': result,
+                'time_to_first_token_ms': round(ttft * 1000),
+                'duration_ms': round((now - stream.started_at) * 1000)
+            })
+        except GenerationCancelled:
+            self._emit(stream, 'ai_stream_cancelled', {})
+        except Exception as e:
+            print(f"Error in AI stream {stream.kind}: {str(e)}")
+            print(traceback.format_exc())
+            self._emit(stream, 'ai_stream_error', {'message': str(e)})
+        finally:
+            with self._lock:
+                self._streams.pop(stream.id, None)
+
+
+ai_streams = AIStreamManager(socketio)
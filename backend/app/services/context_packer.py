@@ -0,0 +1,72 @@
+import math
+import re
+from app.utils.tokens import count_message_tokens, count_tokens
+
+_WORD = re.compile(r"[a-z0-9']{3,}")
+# OpenAI only accepts these characters in a message's `name`
+_INVALID_NAME_CHARS = re.compile(r'[^a-zA-Z0-9_-]')
+
+
+def chat_name(username):
+    """Make a username usable as a chat message `name`"""
+    return _INVALID_NAME_CHARS.sub('_', username or 'User')[:64]
+
+
+def _words(text):
+    return set(_WORD.findall((text or '').lower()))
+
+
+def pack_context(history, query, budget, model, recent=6, summarize=None, summary_budget=0):
+    """Fit a chronological chat history into `budget` prompt tokens.
+
+    Messages are kept by priority: the `recent` newest ones first, then the
+    older ones that share the most words with `query` (newer first on ties).
+    The kept messages stay in chronological order. If anything had to be
+    dropped and `summarize(dropped) -> str` is given, `summary_budget` tokens
+    are reserved for its summary, which is prepended as a system message.
+
+    Returns (packed_history, stats).
+    """
+    costs = [count_message_tokens([m], model) - 3 for m in history]
+    total = sum(costs)
+    stats = {'messages': len(history), 'tokens': total, 'kept': len(history),
+             'packed_tokens': total, 'summarized': 0}
+    if total <= budget:
+        return list(history), stats
+
+    available = budget - (summary_budget if summarize else 0)
+    selected, used = set(), 0
+
+    def take(i):
+        nonlocal used
+        if used + costs[i] <= available:
+            selected.add(i)
+            used += costs[i]
+
+    for i in range(len(history) - 1, max(len(history) - recent, 0) - 1, -1):
+        take(i)
+
+    query_words = _words(query)
+
+    def relevance(i):
+        words = _words(history[i].get('content'))
+        return len(words & query_words) / math.sqrt(len(words) + 1)
+
+    older = [i for i in range(len(history)) if i not in selected]
+    for i in sorted(older, key=lambda i: (relevance(i), i), reverse=True):
+        take(i)
+
+    packed = [history[i] for i in sorted(selected)]
+    dropped = [history[i] for i in range(len(history)) if i not in selected]
+    if dropped and summarize:
+        summary = summarize(dropped)
+        if summary:
+            packed.insert(0, {
+                'role': 'system',
+                'content': f"Summary of earlier messages in this conversation: {summary}"
+            })
+            used += count_tokens(packed[0]['content'], model) + 4
+            stats['summarized'] = len(dropped)
+
+    stats.update(kept=len(selected), packed_tokens=used)
+    return packed, stats
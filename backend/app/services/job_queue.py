@@ -0,0 +1,227 @@
+from datetime import datetime, timedelta
+import os
+import threading
+import traceback
+import uuid
+from bson import ObjectId
+from pymongo import ReturnDocument
+from app import db
+from app.config import Config
+from app.sockets.fanout import fanout
+
+
+class JobQueue:
+    """Durable background jobs stored in the `jobs` collection.
+
+    Requests enqueue a job and return its id. Each process runs a bounded pool of
+    worker threads (Config.JOB_WORKERS) that claim queued jobs atomically with
+    find_one_and_update, so any number of processes can share the queue. A claim
+    is a lease that the worker renews while the job runs: if the worker dies
+    mid-job the lease expires and another worker picks the job up again, and a
+    job whose lease expires on its last attempt is marked failed. Jobs that raise
+    are retried with backoff up to Config.JOB_MAX_ATTEMPTS times, except for
+    ValueError (bad input), which fails immediately. The outcome is pushed to the requester's socket room as
+    `job_completed` or `job_failed`.
+    """
+
+    def __init__(self):
+        self._handlers = {}
+        self._wakeup = threading.Event()
+        self._started = False
+        self._lock = threading.Lock()
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    @staticmethod
+    def ensure_indexes():
+        db.jobs.create_index([('status', 1), ('available_at', 1)])
+        db.jobs.create_index([('status', 1), ('lease_expires_at', 1)])
+        db.jobs.create_index('finished_at', expireAfterSeconds=Config.JOB_RETENTION_SECONDS)
+
+    def register(self, job_type, handler):
+        """Register `handler(job) -> result` for a job type"""
+        self._handlers[job_type] = handler
+
+    def enqueue(self, job_type, payload, user_id):
+        """Queue a job and return its id"""
+        now = datetime.utcnow()
+        result = db.jobs.insert_one({
+            'type': job_type,
+            'payload': payload,
+            'user_id': str(user_id),
+            'status': 'queued',
+            'attempts': 0,
+            'result': None,
+            'error': None,
+            'created_at': now,
+            'available_at': now,
+            'started_at': None,
+            'finished_at': None
+        })
+        self._wakeup.set()
+        return str(result.inserted_id)
+
+    def get(self, job_id):
+        if not ObjectId.is_valid(job_id):
+            return None
+        return db.jobs.find_one({'_id': ObjectId(job_id)})
+
+    def claim(self):
+        """Atomically take the oldest runnable job (queued, or running with an expired lease)"""
+        now = datetime.utcnow()
+        return db.jobs.find_one_and_update(
+            {
+                'type': {'$in': list(self._handlers)},
+                '$or': [
+                    {'status': 'queued', 'available_at': {'$lte': now}},
+                    # Abandoned by a dead worker; give up on jobs that keep killing workers
+                    {'status': 'running', 'lease_expires_at': {'$lt': now},
+                     'attempts': {'$lt': Config.JOB_MAX_ATTEMPTS}}
+                ]
+            },
+            {
+                '$set': {
+                    'status': 'running',
+                    'worker_id': self.worker_id,
+                    'lease_id': uuid.uuid4().hex,
+                    'started_at': now,
+                    'lease_expires_at': now + timedelta(seconds=Config.JOB_LEASE_SECONDS)
+                },
+                '$inc': {'attempts': 1}
+            },
+            sort=[('available_at', 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def fail_abandoned(self):
+        """Fail jobs whose lease expired on their last attempt (claim no longer takes them)"""
+        while True:
+            job = db.jobs.find_one_and_update(
+                {
+                    'status': 'running',
+                    'lease_expires_at': {'$lt': datetime.utcnow()},
+                    'attempts': {'$gte': Config.JOB_MAX_ATTEMPTS}
+                },
+                {'$set': {
+                    'status': 'failed',
+                    'error': 'The job stopped responding on its last attempt',
+                    'finished_at': datetime.utcnow()
+                }},
+                return_document=ReturnDocument.AFTER
+            )
+            if job is None:
+                return
+            print(f"Job {job['_id']} ({job['type']}) abandoned on its last attempt")
+            fanout.emit('job_failed', JobQueue.to_response_dict(job), [job['user_id']])
+
+    def _renew_lease(self, job, done):
+        """Keep extending the job's lease until `done` is set, so long jobs are not re-claimed"""
+        while not done.wait(Config.JOB_LEASE_SECONDS / 3):
+            try:
+                renewed = db.jobs.update_one(
+                    {'_id': job['_id'], 'lease_id': job['lease_id'], 'status': 'running'},
+                    {'$set': {
+                        'lease_expires_at': datetime.utcnow() + timedelta(seconds=Config.JOB_LEASE_SECONDS)
+                    }}
+                )
+            except Exception as e:
+                print(f"Error renewing lease of job {job['_id']}: {str(e)}")
+                continue
+            if not renewed.matched_count:
+                # The lease was lost (e.g. the job was re-claimed); nothing left to renew
+                return
+
+    def start_workers(self, count=None):
+        """Start this process's worker threads (idempotent)"""
+        count = Config.JOB_WORKERS if count is None else count
+        with self._lock:
+            if self._started or count <= 0:
+                return
+            self._started = True
+        for _ in range(count):
+            threading.Thread(target=self._work_loop, daemon=True).start()
+        print(f"Started {count} job workers ({self.worker_id})")
+
+    def _work_loop(self):
+        while True:
+            try:
+                job = self.claim()
+            except Exception as e:
+                print(f"Error claiming job: {str(e)}")
+                job = None
+            if job is None:
+                try:
+                    self.fail_abandoned()
+                except Exception as e:
+                    print(f"Error failing abandoned jobs: {str(e)}")
+                # Sleep until the next poll, or until a job is queued in this process
+                self._wakeup.wait(Config.JOB_POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+            self._run(job)
+
+    def _run(self, job):
+        done = threading.Event()
+        threading.Thread(target=self._renew_lease, args=(job, done), daemon=True).start()
+        try:
+            self._execute(job)
+        finally:
+            done.set()
+
+    def _execute(self, job):
+        handler = self._handlers[job['type']]
+        try:
+            result = handler(job)
+        except Exception as e:
+            print(f"Job {job['_id']} ({job['type']}) failed on attempt {job['attempts']}: {str(e)}")
+            print(traceback.format_exc())
+            if isinstance(e, ValueError) or job['attempts'] >= Config.JOB_MAX_ATTEMPTS:
+                self._finish(job, 'failed', error=str(e))
+            else:
+                delay = Config.JOB_RETRY_DELAY * 2 ** (job['attempts'] - 1)
+                db.jobs.update_one(
+                    {'_id': job['_id'], 'lease_id': job['lease_id']},
+                    {'$set': {
+                        'status': 'queued',
+                        'error': str(e),
+                        'available_at': datetime.utcnow() + timedelta(seconds=delay)
+                    }}
+                )
+            return
+        self._finish(job, 'succeeded', result=result)
+
+    def _finish(self, job, status, result=None, error=None):
+        updated = db.jobs.find_one_and_update(
+            # Only the current lease holder may finish the job
+            {'_id': job['_id'], 'lease_id': job['lease_id'], 'status': 'running'},
+            {'$set': {
+                'status': status,
+                'result': result,
+                'error': error,
+                'finished_at': datetime.utcnow()
+            }},
+            return_document=ReturnDocument.AFTER
+        )
+        if updated is None:
+            return
+        event = 'job_completed' if status == 'succeeded' else 'job_failed'
+        fanout.emit(event, JobQueue.to_response_dict(updated), [updated['user_id']])
+
+    @staticmethod
+    def to_response_dict(job):
+        def iso(value):
+            return value.isoformat() if value else None
+
+        return {
+            'id': str(job['_id']),
+            'type': job['type'],
+            'status': job['status'],
+            'attempts': job.get('attempts', 0),
+            'result': job.get('result'),
+            'error': job.get('error'),
+            'created_at': iso(job.get('created_at')),
+            'started_at': iso(job.get('started_at')),
+            'finished_at': iso(job.get('finished_at'))
+        }
+
+
+job_queue = JobQueue()
@@ -0,0 +1,109 @@
+import hashlib
+import threading
+import traceback
+from bson import ObjectId
+from pymongo.errors import PyMongoError
+from app import db, socketio
+from app.config import Config
+from app.services.message_cache import message_cache
+from app.sockets.fanout import fanout
+
+ANALYSIS_FIELDS = ('tone', 'impact', 'reasoning', 'improvements')
+
+
+def content_hash(content):
+    """Hash of a message's text, used to reuse the analysis of identical messages"""
+    return hashlib.sha256(content.strip().encode('utf-8')).hexdigest()
+
+
+class MessageAnalyses:
+    """Tone analyses stored on message documents (`analysis` and `content_hash`).
+
+    New and edited messages are analyzed in a background task after they are
+    stored; the result is written to the message and pushed to its channel (and
+    thread) rooms as a `message_analysis` event {message_id, channel_id,
+    parent_id, analysis}. Text that was analyzed before, in any message, reuses
+    that stored analysis instead of calling the model again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {'scheduled': 0, 'reused': 0, 'analyzed': 0, 'failed': 0}
+
+    @staticmethod
+    def ensure_indexes():
+        # Only analyzed messages can answer a lookup, so only those are indexed
+        db.messages.create_index(
+            'content_hash',
+            partialFilterExpression={'analysis': {'$type': 'object'}}
+        )
+
+    def find(self, content):
+        """Stored analysis of a message with exactly this text, or None"""
+        if not content or not content.strip():
+            return None
+        try:
+            doc = db.messages.find_one(
+                {'content_hash': content_hash(content), 'analysis': {'$type': 'object'}},
+                {'analysis': 1}
+            )
+        except PyMongoError as e:
+            # A lookup failure only costs a model call
+            print(f"Error looking up stored analysis: {str(e)}")
+            return None
+        return doc['analysis'] if doc else None
+
+    def schedule(self, message_id, channel_id, content, parent_id=None):
+        """Analyze a stored message in the background (no-op for empty text or when disabled)"""
+        if not Config.ANALYZE_NEW_MESSAGES or not content or not content.strip():
+            return
+        self._count('scheduled')
+        socketio.start_background_task(self._analyze, message_id, channel_id, content, parent_id)
+
+    def _analyze(self, message_id, channel_id, content, parent_id):
+        # Imported here: the AI service is optional and created on first use
+        from app.services.ai_service import get_ai_service
+        try:
+            analysis = self.find(content)
+            if analysis is not None:
+                self._count('reused')
+            else:
+                ai_service = get_ai_service()
+                if ai_service is None:
+                    return
+                result = ai_service.analyze_message(content)
+                analysis = {key: result[key] for key in ANALYSIS_FIELDS}
+                self._count('analyzed')
+
+            # Skip if the message was edited (or deleted) while it was being analyzed
+            stored = db.messages.update_one(
+                {'_id': ObjectId(message_id), 'content': content},
+                {'$set': {'analysis': analysis, 'content_hash': content_hash(content)}}
+            )
+            if not stored.matched_count:
+                return
+
+            message_cache.patch_message(channel_id, message_id, {'analysis': analysis})
+            rooms = [str(channel_id)] + ([f'thread_{parent_id}'] if parent_id else [])
+            fanout.emit('message_analysis', {
+                'message_id': str(message_id),
+                'channel_id': str(channel_id),
+                'parent_id': str(parent_id) if parent_id else None,
+                'analysis': analysis
+            }, rooms)
+        except Exception as e:
+            self._count('failed')
+            print(f"Error analyzing message {message_id}: {str(e)}")
+            print(traceback.format_exc())
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def get_stats(self):
+        """Background analysis counters (this process only)"""
+        with self._lock:
+            return dict(self._stats)
+
+
+message_analyses = MessageAnalyses()
@@ -0,0 +1,163 @@
+from collections import OrderedDict, deque
+import threading
+from app.config import Config
+
+
+class ChannelMessageCache:
+    """Bounded cache of the newest serialized top-level messages per channel.
+
+    Each channel keeps a ring buffer of its latest response dicts (newest first) and
+    channels are evicted least-recently-used once more than `max_channels` are cached.
+    Writers keep entries current through add/update/remove/patch so a first-page load
+    can be served without touching Mongo. The cache is per process; other workers
+    only see their own writes.
+
+    Every write bumps a sequence number, remembered per channel (for the most
+    recently written channels). A page loaded from Mongo is only stored if its
+    channel saw no write since the load began, so a page read before a concurrent
+    send cannot replace the entry that send just updated.
+    """
+
+    def __init__(self, max_channels=None, per_channel=None):
+        self.max_channels = max_channels or Config.MESSAGE_CACHE_CHANNELS
+        self.per_channel = per_channel or Config.MESSAGE_CACHE_SIZE
+        self._channels = OrderedDict()
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._written = OrderedDict()  # channel_id -> sequence number of its last write
+        self._forgotten = 0  # Newest sequence number dropped from _written
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_stores = 0
+
+    def get_page(self, channel_id, limit):
+        """Return the newest `limit` messages for a channel, or None on a miss"""
+        channel_id = str(channel_id)
+        with self._lock:
+            entry = self._channels.get(channel_id)
+            if entry is None or (len(entry['messages']) < limit and not entry['complete']):
+                self.misses += 1
+                return None
+            self._channels.move_to_end(channel_id)
+            self.hits += 1
+            return list(entry['messages'])[:limit]
+
+    def version(self):
+        """Write sequence number to pass to store_page; take it before reading the page"""
+        with self._lock:
+            return self._seq
+
+    def _record_write(self, channel_id):
+        # Called with the lock held
+        self._seq += 1
+        self._written[channel_id] = self._seq
+        self._written.move_to_end(channel_id)
+        # Channels written longer ago are forgotten; loads older than them are treated as stale
+        while len(self._written) > self.max_channels * 4:
+            _, seq = self._written.popitem(last=False)
+            self._forgotten = max(self._forgotten, seq)
+
+    def record_write(self, channel_id):
+        """Note a write to a channel that is not cached, so in-flight page loads are not stored"""
+        with self._lock:
+            self._record_write(str(channel_id))
+
+    def store_page(self, channel_id, messages, limit, is_direct=False, version=None):
+        """Seed a channel from a freshly loaded first page (newest first).
+        With `version` (from version() before the load), the page is dropped if the
+        channel was written since.
+        """
+        channel_id = str(channel_id)
+        with self._lock:
+            if version is not None and self._written.get(channel_id, self._forgotten) > version:
+                self.stale_stores += 1
+                return
+            self._channels[channel_id] = {
+                'messages': deque(messages[:self.per_channel], maxlen=self.per_channel),
+                # A short page means we hold the channel's entire history
+                'complete': len(messages) < limit,
+                'is_direct': is_direct
+            }
+            self._channels.move_to_end(channel_id)
+            while len(self._channels) > self.max_channels:
+                self._channels.popitem(last=False)
+                self.evictions += 1
+
+    def is_direct(self, channel_id):
+        """Whether a cached channel is a DM (False if it is not cached)"""
+        with self._lock:
+            entry = self._channels.get(str(channel_id))
+            return bool(entry and entry.get('is_direct'))
+
+    def is_cached(self, channel_id):
+        with self._lock:
+            return str(channel_id) in self._channels
+
+    def add_message(self, channel_id, message_data):
+        """Push a newly created message onto a cached channel"""
+        with self._lock:
+            self._record_write(str(channel_id))
+            entry = self._channels.get(str(channel_id))
+            if entry is None:
+                return
+            if len(entry['messages']) == entry['messages'].maxlen:
+                # The oldest message falls out, so older history is no longer all here
+                entry['complete'] = False
+            entry['messages'].appendleft(message_data)
+
+    def update_message(self, channel_id, message_data):
+        """Replace a cached message with its updated response dict"""
+        with self._lock:
+            self._record_write(str(channel_id))
+            entry = self._channels.get(str(channel_id))
+            if entry is None:
+                return
+            for i, cached in enumerate(entry['messages']):
+                if cached['id'] == message_data['id']:
+                    entry['messages'][i] = message_data
+                    return
+
+    def patch_message(self, channel_id, message_id, fields):
+        """Update individual fields (e.g. reply_count) of a cached message"""
+        with self._lock:
+            self._record_write(str(channel_id))
+            entry = self._channels.get(str(channel_id))
+            if entry is None:
+                return
+            for i, cached in enumerate(entry['messages']):
+                if cached['id'] == str(message_id):
+                    entry['messages'][i] = {**cached, **fields}
+                    return
+
+    def remove_message(self, channel_id, message_id):
+        """Drop a deleted message from a cached channel"""
+        with self._lock:
+            self._record_write(str(channel_id))
+            entry = self._channels.get(str(channel_id))
+            if entry is None:
+                return
+            remaining = [m for m in entry['messages'] if m['id'] != str(message_id)]
+            entry['messages'] = deque(remaining, maxlen=self.per_channel)
+
+    def invalidate(self, channel_id):
+        with self._lock:
+            self._channels.pop(str(channel_id), None)
+
+    def get_stats(self):
+        """Get hit/miss counters for tuning the cache size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'stale_stores': self.stale_stores,
+                'cached_channels': len(self._channels),
+                'max_channels': self.max_channels,
+                'per_channel': self.per_channel
+            }
+
+
+message_cache = ChannelMessageCache()
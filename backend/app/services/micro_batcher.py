@@ -0,0 +1,77 @@
+from concurrent.futures import Future
+import threading
+
+
+class MicroBatcher:
+    """Groups calls that arrive within a short window into one batch.
+
+    `submit(item)` blocks until the item's result is ready. The first item of a
+    batch starts a `window`-second timer; the batch is processed when the timer
+    fires or as soon as it holds `max_items` distinct items, whichever comes
+    first. Identical items submitted to the same batch are processed once.
+    `process(items)` returns one result per item, in order; returning an
+    exception instance fails just that item, and raising fails the whole batch.
+    With a window of 0 every item is processed on its own.
+    """
+
+    def __init__(self, process, window, max_items):
+        self.process = process
+        self.window = window
+        self.max_items = max_items
+        self._pending = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._stats = {'items': 0, 'batches': 0, 'max_batch_size': 0}
+
+    def submit(self, item):
+        batch = None
+        with self._lock:
+            self._stats['items'] += 1
+            future = self._pending.get(item)
+            if future is None:
+                future = self._pending[item] = Future()
+                if self.window <= 0 or len(self._pending) >= self.max_items:
+                    batch = self._take()
+                elif len(self._pending) == 1:
+                    timer = threading.Timer(self.window, self._on_timer, args=(self._generation,))
+                    timer.daemon = True
+                    timer.start()
+        if batch is not None:
+            self._run(batch)
+        return future.result()
+
+    def _take(self):
+        batch = self._pending
+        self._pending = {}
+        # Invalidates the timer of a batch that was flushed early for being full
+        self._generation += 1
+        self._stats['batches'] += 1
+        self._stats['max_batch_size'] = max(self._stats['max_batch_size'], len(batch))
+        return batch
+
+    def _on_timer(self, generation):
+        with self._lock:
+            if generation != self._generation or not self._pending:
+                return
+            batch = self._take()
+        self._run(batch)
+
+    def _run(self, batch):
+        items = list(batch)
+        try:
+            results = self.process(items)
+        except Exception as e:
+            results = [e] * len(items)
+        for item, result in zip(items, results):
+            if isinstance(result, BaseException):
+                batch[item].set_exception(result)
+            else:
+                batch[item].set_result(result)
+
+    def get_stats(self):
+        with self._lock:
+            batches = self._stats['batches']
+            return {
+                **self._stats,
+                'avg_batch_size': (self._stats['items'] / batches) if batches else 0.0
+            }
@@ -0,0 +1,48 @@
+from collections import deque
+import threading
+import time
+from app.config import Config
+
+
+class ModelRouter:
+    """Sliding-window upstream latency per model, for latency-based routing.
+
+    Keeps the last Config.AI_LATENCY_WINDOW latencies of each model, overall and
+    per task (the calling endpoint), so a slow model can be skipped for tasks
+    with a latency budget. Percentiles are only reported once
+    Config.AI_LATENCY_MIN_SAMPLES calls have been seen, so a single slow call
+    right after boot does not trigger a failover. Samples older than
+    Config.AI_LATENCY_MAX_AGE seconds are ignored: a skipped model records no new
+    samples, so this is what lets it be tried again once its slow calls age out.
+    """
+
+    def __init__(self, window=None, min_samples=None, max_age=None):
+        self.window = window or Config.AI_LATENCY_WINDOW
+        self.min_samples = min_samples or Config.AI_LATENCY_MIN_SAMPLES
+        self.max_age = max_age or Config.AI_LATENCY_MAX_AGE
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    def record(self, model, seconds, task=None):
+        keys = [(model, None)] + ([(model, task)] if task else [])
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                self._latencies.setdefault(key, deque(maxlen=self.window)).append((now, seconds))
+
+    def percentile(self, model, task=None, q=0.95):
+        """Latency percentile in seconds over recent samples, or None without enough of them"""
+        cutoff = time.monotonic() - self.max_age
+        with self._lock:
+            samples = sorted(s for t, s in self._latencies.get((model, task), ()) if t >= cutoff)
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+    def is_too_slow(self, model, budget, task=None):
+        """Whether the model's recent p95 latency for `task` exceeds `budget` seconds"""
+        p95 = self.percentile(model, task)
+        return p95 is not None and p95 > budget
+
+
+model_router = ModelRouter()
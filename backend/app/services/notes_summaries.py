@@ -0,0 +1,99 @@
+from datetime import datetime
+import hashlib
+import json
+import threading
+from pymongo.errors import PyMongoError
+from app import db
+from app.config import Config
+
+# Bump when the chunk or merge prompts change so stale summaries are not reused
+SUMMARY_PROMPT_VERSION = 1
+
+
+def chunk_messages(messages, max_tokens, count):
+    """Split messages, in order, into consecutive chunks of at most `max_tokens`.
+
+    `count(message)` gives a message's token size. Chunks are filled greedily from
+    the oldest message, so appending messages never moves an earlier boundary and
+    the earlier chunks (and their cached summaries) stay the same. A single message
+    larger than the budget gets a chunk of its own.
+    """
+    chunks = []
+    current, current_tokens = [], 0
+    for message in messages:
+        tokens = count(message)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(current)
+            current, current_tokens = [], 0
+        current.append(message)
+        current_tokens += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def summary_key(stage, model, parts):
+    """Content hash for a summary: the stage, the model and what was summarized.
+
+    For chunks `parts` are the message ids with their edit times, so editing a
+    message invalidates only its chunk; for merges they are the child summary keys.
+    """
+    payload = json.dumps([SUMMARY_PROMPT_VERSION, stage, model, list(parts)], separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class NoteSummaryCache:
+    """Partial meeting notes (chunk and merge summaries) in the `note_summaries` collection.
+
+    Entries are keyed by content hash, so they are shared by every channel,
+    thread and worker summarizing the same messages, and survive between notes
+    generations (unlike the short-lived completion cache). Entries that have not
+    been used for Config.NOTES_SUMMARY_RETENTION_SECONDS are dropped by a TTL index.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    @staticmethod
+    def ensure_indexes():
+        db.note_summaries.create_index('last_used_at', expireAfterSeconds=Config.NOTES_SUMMARY_RETENTION_SECONDS)
+
+    def get(self, key):
+        """Return the cached notes dict for `key`, or None"""
+        try:
+            doc = db.note_summaries.find_one_and_update(
+                {'_id': key},
+                {'$set': {'last_used_at': datetime.utcnow()}}
+            )
+        except PyMongoError as e:
+            print(f"Error reading note summary cache: {str(e)}")
+            doc = None
+        with self._lock:
+            self._stats['hits' if doc else 'misses'] += 1
+        return doc['notes'] if doc else None
+
+    def set(self, key, notes, model, message_count):
+        now = datetime.utcnow()
+        try:
+            db.note_summaries.update_one(
+                {'_id': key},
+                {'$set': {
+                    'notes': notes,
+                    'model': model,
+                    'message_count': message_count,
+                    'created_at': now,
+                    'last_used_at': now
+                }},
+                upsert=True
+            )
+        except PyMongoError as e:
+            # The summary is still used for this generation, just not reused later
+            print(f"Error writing note summary cache: {str(e)}")
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+note_summaries = NoteSummaryCache()
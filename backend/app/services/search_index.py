@@ -0,0 +1,178 @@
+import math
+import re
+from collections import Counter, defaultdict
+from bson import ObjectId
+from pymongo import UpdateOne
+from app import db
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'for', 'if', 'in', 'into',
+    'is', 'it', 'no', 'not', 'of', 'on', 'or', 'such', 'that', 'the', 'their', 'then',
+    'there', 'these', 'they', 'this', 'to', 'was', 'will', 'with'
+}
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Upper bound on postings read per query term, newest first
+MAX_POSTINGS_PER_TERM = 5000
+
+
+def tokenize(text):
+    """Split text into lowercase index terms, dropping stopwords"""
+    if not isinstance(text, str):
+        return []
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class SearchIndex:
+    """Inverted index over message content stored in plain Mongo collections.
+
+    - search_postings: one document per (term, message) with term frequency and doc length
+    - search_terms: document frequency per term
+    - search_stats: corpus size and total length for BM25 length normalization
+
+    The index is kept current incrementally by index_message/remove_message.
+    """
+
+    STATS_ID = 'messages'
+
+    @staticmethod
+    def ensure_indexes():
+        db.search_postings.create_index([('term', 1), ('channel_id', 1), ('created_at', -1)])
+        db.search_postings.create_index('message_id')
+
+    @staticmethod
+    def _terms_for(content, message_type):
+        terms = tokenize(content)
+        # Keep non-text message types (e.g. "file") searchable by name
+        if message_type and message_type != 'text':
+            terms.append(message_type.lower())
+        return terms
+
+    def index_message(self, message_id, channel_id, content, created_at, message_type='text', parent_id=None):
+        """Add a message to the index"""
+        terms = self._terms_for(content, message_type)
+        if not terms:
+            return
+
+        counts = Counter(terms)
+        doc_length = len(terms)
+        message_id = ObjectId(message_id)
+        channel_id = ObjectId(channel_id)
+
+        db.search_postings.insert_many([
+            {
+                'term': term,
+                'message_id': message_id,
+                'channel_id': channel_id,
+                'parent_id': ObjectId(parent_id) if parent_id else None,
+                'created_at': created_at,
+                'tf': tf,
+                'dl': doc_length
+            }
+            for term, tf in counts.items()
+        ])
+        db.search_terms.bulk_write(
+            [UpdateOne({'_id': term}, {'$inc': {'df': 1}}, upsert=True) for term in counts],
+            ordered=False
+        )
+        db.search_stats.update_one(
+            {'_id': self.STATS_ID},
+            {'$inc': {'doc_count': 1, 'total_length': doc_length}},
+            upsert=True
+        )
+
+    def remove_message(self, message_id):
+        """Remove a message from the index"""
+        message_id = ObjectId(message_id)
+        postings = list(db.search_postings.find({'message_id': message_id}, {'term': 1, 'dl': 1}))
+        if not postings:
+            return
+
+        db.search_postings.delete_many({'message_id': message_id})
+        db.search_terms.bulk_write(
+            [UpdateOne({'_id': p['term']}, {'$inc': {'df': -1}}) for p in postings],
+            ordered=False
+        )
+        # Drop terms no message uses any more; a concurrent index_message re-creates them
+        db.search_terms.delete_many({'_id': {'$in': [p['term'] for p in postings]}, 'df': {'$lte': 0}})
+        db.search_stats.update_one(
+            {'_id': self.STATS_ID},
+            {'$inc': {'doc_count': -1, 'total_length': -postings[0]['dl']}}
+        )
+
+    def reindex_message(self, message_id, channel_id, content, created_at, message_type='text', parent_id=None):
+        """Re-index a message after its content changed"""
+        self.remove_message(message_id)
+        self.index_message(message_id, channel_id, content, created_at, message_type, parent_id)
+
+    def search(self, query, channel_ids, limit=50, before=None, after=None):
+        """Rank messages in the given channels against a query with BM25.
+
+        Returns a list of (message_id, score) pairs, best match first.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not channel_ids:
+            return []
+
+        stats = db.search_stats.find_one({'_id': self.STATS_ID}) or {}
+        doc_count = max(stats.get('doc_count', 0), 1)
+        avg_length = (stats.get('total_length', 0) / doc_count) or 1.0
+        doc_freqs = {t['_id']: t['df'] for t in db.search_terms.find({'_id': {'$in': terms}})}
+
+        posting_filter = {'channel_id': {'$in': [ObjectId(c) for c in channel_ids]}}
+        if before or after:
+            date_filter = {}
+            if before:
+                date_filter['$lt'] = before
+            if after:
+                date_filter['$gt'] = after
+            posting_filter['created_at'] = date_filter
+
+        scores = defaultdict(float)
+        for term in terms:
+            df = doc_freqs.get(term, 0)
+            if df <= 0:
+                continue
+            idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            postings = db.search_postings.find(
+                {'term': term, **posting_filter},
+                {'message_id': 1, 'tf': 1, 'dl': 1},
+                sort=[('created_at', -1)],
+                limit=MAX_POSTINGS_PER_TERM
+            )
+            for p in postings:
+                tf = p['tf']
+                norm = tf + K1 * (1 - B + B * p['dl'] / avg_length)
+                scores[p['message_id']] += idf * tf * (K1 + 1) / norm
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:limit]
+
+    def rebuild(self, batch_size=1000):
+        """Drop and rebuild the whole index from db.messages"""
+        db.search_postings.drop()
+        db.search_terms.drop()
+        db.search_stats.drop()
+        self.ensure_indexes()
+
+        indexed = 0
+        cursor = db.messages.find(
+            {},
+            {'channel_id': 1, 'content': 1, 'created_at': 1, 'message_type': 1, 'parent_id': 1},
+            batch_size=batch_size
+        )
+        for msg in cursor:
+            self.index_message(
+                msg['_id'], msg['channel_id'], msg.get('content'), msg['created_at'],
+                msg.get('message_type', 'text'), msg.get('parent_id')
+            )
+            indexed += 1
+        return indexed
+
+
+search_index = SearchIndex()
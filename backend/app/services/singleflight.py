@@ -0,0 +1,72 @@
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Collapses concurrent identical calls into one execution.
+
+    The first caller for a key runs the function; callers arriving with the same
+    key while it is in flight wait for it and share its result (or its exception).
+    Only in-flight calls are shared. Once a call returns, the next caller with
+    that key starts a new one, so this complements the response cache and does
+    not replace it. Counters are kept per label (the calling endpoint).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def do(self, key, fn, label='default'):
+        """Run `fn()` once for all concurrent callers with `key`; returns (result, shared)"""
+        with self._lock:
+            stats = self._stats.setdefault(label, {'calls': 0, 'collapsed': 0})
+            stats['calls'] += 1
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                stats['collapsed'] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def get_stats(self):
+        """Calls and collapsed (shared) calls, overall and per label (this process only)"""
+        with self._lock:
+            calls = sum(s['calls'] for s in self._stats.values())
+            collapsed = sum(s['collapsed'] for s in self._stats.values())
+            return {
+                'calls': calls,
+                'collapsed': collapsed,
+                'collapse_rate': collapsed / calls if calls else 0.0,
+                'in_flight': len(self._calls),
+                'endpoints': {label: dict(stats) for label, stats in self._stats.items()}
+            }
+
+
+inflight_requests = SingleFlight()
@@ -0,0 +1,150 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import threading
+import traceback
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+from app import db, socketio
+from app.config import Config
+
+# Speculation uses the composer's default options; other choices are generated on request
+DEFAULT_TONE = 'professional'
+DEFAULT_LENGTH = 'medium'
+
+
+class SpeculativeReplies:
+    """Quick-reply suggestions generated ahead of time, keyed by message id.
+
+    When a message is stored for recipients who are connected, a low-priority
+    background worker (Config.SPECULATIVE_REPLY_WORKERS threads per process,
+    generating one suggestion after another) produces the default quick
+    replies and keeps them in the `speculative_replies` collection, so the
+    suggest-quick-reply request that may follow is answered without a model
+    call. Speculation is skipped when the local backlog is full and is capped by
+    Config.SPECULATIVE_REPLY_BUDGET generations per hour for the workspace,
+    counted in `speculative_budget` across all processes. The app hosts a single
+    workspace, so that budget is shared by the whole deployment.
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=Config.SPECULATIVE_REPLY_WORKERS)
+        self._queued = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            'scheduled': 0,
+            'skipped_inactive': 0,
+            'skipped_backlog': 0,
+            'over_budget': 0,
+            'generated': 0,
+            'failed': 0,
+            'hits': 0,
+            'misses': 0
+        }
+
+    @staticmethod
+    def ensure_indexes():
+        db.speculative_replies.create_index(
+            'created_at', expireAfterSeconds=Config.SPECULATIVE_REPLY_RETENTION_SECONDS
+        )
+        db.speculative_budget.create_index('expires_at', expireAfterSeconds=0)
+
+    @staticmethod
+    def _is_connected(user_id):
+        # Sockets join their user's personal room on connect (this process only)
+        return next(socketio.server.manager.get_participants('/', str(user_id)), None) is not None
+
+    def schedule(self, message_id, content, sender_id, recipient_ids):
+        """Generate quick replies to a new message in the background, if anyone is there to use them"""
+        if not Config.SPECULATIVE_REPLIES or not content or not content.strip():
+            return
+        recipients = {str(user_id) for user_id in recipient_ids if user_id} - {str(sender_id)}
+        if not any(self._is_connected(user_id) for user_id in recipients):
+            self._count('skipped_inactive')
+            return
+        with self._lock:
+            if self._queued >= Config.SPECULATIVE_REPLY_QUEUE:
+                self._stats['skipped_backlog'] += 1
+                return
+            self._queued += 1
+            self._stats['scheduled'] += 1
+        self._executor.submit(self._generate, str(message_id), content)
+
+    def _take_budget(self):
+        """Count one generation against this hour's budget; False once it is spent"""
+        now = datetime.utcnow()
+        window = now.replace(minute=0, second=0, microsecond=0)
+        doc = db.speculative_budget.find_one_and_update(
+            {'_id': window.isoformat()},
+            {'$inc': {'used': 1}, '$setOnInsert': {'expires_at': window + timedelta(hours=2)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return doc['used'] <= Config.SPECULATIVE_REPLY_BUDGET
+
+    def _generate(self, message_id, content):
+        # Imported here: the AI service is optional and created on first use
+        from app.services.ai_service import get_ai_service
+        try:
+            ai_service = get_ai_service()
+            if ai_service is None:
+                return
+            if not self._take_budget():
+                self._count('over_budget')
+                return
+            responses = ai_service.generate_quick_replies(
+                content, DEFAULT_TONE, DEFAULT_LENGTH, parallel=False
+            )
+            if not responses:
+                self._count('failed')
+                return
+            db.speculative_replies.replace_one(
+                {'_id': message_id},
+                {
+                    'content': content,
+                    'tone': DEFAULT_TONE,
+                    'length': DEFAULT_LENGTH,
+                    'responses': responses,
+                    'created_at': datetime.utcnow()
+                },
+                upsert=True
+            )
+            self._count('generated')
+        except Exception as e:
+            self._count('failed')
+            print(f"Error generating speculative replies for {message_id}: {str(e)}")
+            print(traceback.format_exc())
+        finally:
+            with self._lock:
+                self._queued -= 1
+
+    def get(self, message_id, content, tone, length):
+        """Speculative replies to a message with these options and text, or None"""
+        doc = None
+        if tone == DEFAULT_TONE and length == DEFAULT_LENGTH:
+            try:
+                doc = db.speculative_replies.find_one({'_id': str(message_id)})
+            except PyMongoError as e:
+                print(f"Error reading speculative replies: {str(e)}")
+        # Replies to an earlier version of an edited message don't count
+        if doc is None or doc['content'] != content:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return doc['responses']
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def get_stats(self):
+        """Speculation and hit counters (this process only)"""
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'queued': self._queued,
+                'hit_rate': self._stats['hits'] / lookups if lookups else 0.0
+            }
+
+
+speculative_replies = SpeculativeReplies()
@@ -0,0 +1,64 @@
+from bson import ObjectId
+from app import db
+from app.services.message_cache import message_cache
+from app.utils.loaders import get_loader
+from app.utils.pagination import keyset_page
+
+# Only the message fields AI prompts use
+CONTEXT_PROJECTION = {'content': 1, 'sender_id': 1, 'created_at': 1, 'channel_id': 1, 'file_id': 1}
+
+
+def _context_message(doc):
+    sender = get_loader().get_user(doc['sender_id'])
+    return {
+        'id': str(doc['_id']),
+        'content': doc.get('content', ''),
+        'username': sender['username'] if sender else 'Unknown User',
+        'sender_id': str(doc['sender_id']),
+        'created_at': doc['created_at'].isoformat()
+    }
+
+
+def _hydrate(docs):
+    # Resolve all senders with one query, as the message list endpoints do
+    get_loader().prime_messages(docs)
+    return [_context_message(doc) for doc in docs]
+
+
+def load_thread_context(thread_id, window):
+    """Load a thread's parent message and its newest `window - 1` replies, oldest first.
+
+    Returns (messages, channel_id); raises ValueError if the thread does not exist.
+    """
+    thread_id = ObjectId(thread_id)
+    parent = db.messages.find_one({'_id': thread_id}, CONTEXT_PROJECTION)
+    if not parent:
+        raise ValueError('Thread not found')
+
+    replies = []
+    if window > 1:
+        replies, _, _ = keyset_page(
+            db.messages, {'parent_id': thread_id}, window - 1,
+            newest_first=True, projection=CONTEXT_PROJECTION
+        )
+    return _hydrate([parent] + replies[::-1]), parent['channel_id']
+
+
+def load_channel_context(channel_id, window):
+    """Load the newest `window` top-level messages of a channel, oldest first.
+
+    Served from the hot message cache when it holds enough of the channel.
+    """
+    channel_id = ObjectId(channel_id)
+    cached_page = message_cache.get_page(channel_id, window)
+    if cached_page is not None:
+        return [
+            {key: msg[key] for key in ('id', 'content', 'username', 'sender_id', 'created_at')}
+            for msg in reversed(cached_page)
+        ]
+
+    messages, _, _ = keyset_page(
+        db.messages, {'channel_id': channel_id, 'parent_id': None}, window,
+        newest_first=True, projection=CONTEXT_PROJECTION
+    )
+    return _hydrate(messages[::-1])
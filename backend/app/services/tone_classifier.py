@@ -0,0 +1,148 @@
+import re
+
+# Lexical cues for the tones AIService.analyze_message validates against
+HEDGES = [
+    'maybe', 'perhaps', 'possibly', 'i guess', 'i think', 'i suppose', 'kind of', 'sort of',
+    'if possible', 'if you can', 'if that\'s ok', 'if that is ok', 'sorry', 'just wondering',
+    'not sure', 'might', 'hopefully', 'i hope', 'probably', 'no worries if not', 'a bit',
+    'i was wondering', 'would it be possible', 'could maybe', 'i feel like'
+]
+# Uncertainty about facts, which is normal in a status update; only weak when softening an ask
+EPISTEMIC = {'maybe', 'perhaps', 'possibly', 'i guess', 'i think', 'i suppose', 'kind of', 'sort of',
+             'not sure', 'might', 'probably', 'i feel like'}
+REQUESTS = ['could you', 'would you', 'can you', 'can someone', 'could someone', 'please', 'could maybe',
+            'would it be possible', 'if possible', 'if you can', 'was wondering', 'just wondering']
+APOLOGIES = ['sorry', 'apologies', 'my bad']
+URGENCY = ['immediately', 'asap', 'right now', 'right away', 'now!', 'at once', 'no excuses', 'or else']
+HOSTILE = [
+    'stupid', 'ridiculous', 'useless', 'idiot', 'incompetent', 'pathetic', 'unacceptable',
+    'what is wrong with you', 'how many times', 'i told you', 'are you kidding', 'wtf',
+    'seriously?', 'shut up', 'do your job'
+]
+DEMANDS = ['you need to', 'you must', 'you have to', 'you better', 'you should have', 'i demand', 'fix this', 'do it']
+IMPERATIVE_VERBS = {'send', 'fix', 'stop', 'do', 'get', 'finish', 'give', 'answer', 'call', 'reply', 'change', 'redo', 'tell'}
+# Short messages leaning on these are often unclear, so they go to the model
+VAGUE = ['thing', 'things', 'stuff', 'whatever', 'idk', 'the other one', 'that one', 'etc', 'something']
+# Negative emotion or rhetorical questions: not neutral, but not enough alone to call aggressive
+EMOTIVE = [
+    'ugh', 'annoying', 'annoyed', 'frustrated', 'frustrating', 'angry', 'hate', 'terrible', 'awful',
+    'why would', 'why is', 'why does', 'why do', 'why are', 'again?'
+]
+POLITE = ['please', 'thanks', 'thank you', 'could you', 'would you', 'appreciate']
+
+_WORDS = re.compile(r"[A-Za-z']+")
+
+
+def _contains(text, phrases):
+    return [p for p in phrases if re.search(r'(?<![a-z])' + re.escape(p) + r'(?![a-z])', text)]
+
+
+def extract_features(message):
+    """Lexical features of a message used by classify_tone"""
+    text = message.strip()
+    lower = text.lower()
+    words = _WORDS.findall(text)
+    caps_words = [w for w in words if len(w) >= 3 and w.isupper()]
+    first_word = words[0].lower() if words else ''
+    return {
+        'words': len(words),
+        'hedges': _contains(lower, HEDGES),
+        'urgency': _contains(lower, URGENCY),
+        'hostile': _contains(lower, HOSTILE),
+        'demands': _contains(lower, DEMANDS),
+        'polite': _contains(lower, POLITE),
+        'request': bool(_contains(lower, REQUESTS)) or '?' in text,
+        'apology': bool(_contains(lower, APOLOGIES)),
+        'vague': _contains(lower, VAGUE),
+        'emotive': _contains(lower, EMOTIVE),
+        'imperative': first_word in IMPERATIVE_VERBS,
+        'exclamations': text.count('!'),
+        'questions': text.count('?'),
+        'caps_words': caps_words,
+        'caps_ratio': len(caps_words) / max(len(words), 1),
+        'longest_sentence': max((len(_WORDS.findall(s)) for s in re.split(r'[.!?\n]+', text)), default=0)
+    }
+
+
+def classify_tone(message):
+    """Classify clear-cut messages locally, without a model call.
+
+    Returns an analysis dict in the analyze_message format (plus `confidence`)
+    when the lexical cues are unambiguous, or None so the caller asks the model.
+    It only answers for short plain messages (neutral), requests or apologies
+    buried in hedging (weak) and stacked markers that include hostile, urgent or
+    demanding wording (aggressive); anything mixed or long enough to be confusing
+    is escalated. Exclamation marks, caps or an imperative opener alone never make
+    a message aggressive ("Get well soon!!").
+    """
+    if not message or not message.strip():
+        return None
+    f = extract_features(message)
+
+    aggressive_signals = (
+        len(f['hostile'])
+        + len(f['urgency'])
+        + len(f['demands'])
+        + (1 if f['caps_words'] and f['caps_ratio'] >= 0.2 else 0)
+        + (1 if f['exclamations'] >= 2 or f['questions'] >= 2 else 0)
+        + (1 if f['imperative'] and not f['polite'] else 0)
+    )
+    hedges = len(f['hedges'])
+    forceful_wording = f['hostile'] or f['urgency'] or f['demands']
+    # "I think we might ship on Friday" is a status update, not a weak ask
+    weak_hedges = hedges if f['request'] or f['apology'] else len([h for h in f['hedges'] if h not in EPISTEMIC])
+
+    # Long or run-on text needs the model's judgement (it may be confusing)
+    if f['words'] > 40 or f['longest_sentence'] > 30:
+        return None
+
+    if aggressive_signals >= 2 and forceful_wording and hedges == 0:
+        reasons = []
+        improvements = []
+        if f['hostile']:
+            reasons.append(f"hostile wording ({', '.join(repr(w) for w in f['hostile'])})")
+            improvements.append("Remove the hostile wording and describe the problem itself instead.")
+        if f['urgency'] or f['demands'] or f['imperative']:
+            reasons.append("demanding phrasing")
+            improvements.append("Add 'please' and explain why it matters instead of demanding it.")
+        if f['urgency']:
+            improvements.append("Give a specific deadline instead of words like 'immediately' or 'ASAP'.")
+        if f['caps_words']:
+            reasons.append("words in all caps")
+            improvements.append("Avoid writing in all caps; it reads as shouting.")
+        if f['exclamations'] >= 2 or f['questions'] >= 2:
+            reasons.append("repeated exclamation or question marks")
+            improvements.append("Use a single punctuation mark to keep it professional.")
+        return {
+            'tone': 'aggressive',
+            'impact': 'medium',
+            'confidence': min(0.75 + 0.05 * aggressive_signals, 0.95),
+            'reasoning': f"Uses {', '.join(reasons)}, which comes across as forceful.",
+            'improvements': improvements
+        }
+
+    if weak_hedges >= 2 and aggressive_signals == 0:
+        found = ', '.join(repr(h) for h in f['hedges'][:4])
+        return {
+            'tone': 'weak',
+            'impact': 'low',
+            'confidence': min(0.75 + 0.05 * hedges, 0.95),
+            'reasoning': f"Uses uncertain language ({found}) that undercuts the request.",
+            'improvements': [
+                f"Remove hedging words like {found} to sound more confident.",
+                "State clearly what you need and by when."
+            ]
+        }
+
+    if (f['words'] <= 12 and hedges == 0 and aggressive_signals == 0
+            and f['exclamations'] <= 1 and f['questions'] <= 1 and not f['caps_words']
+            and not f['vague'] and not f['emotive']):
+        return {
+            'tone': 'neutral',
+            'impact': 'low',
+            'confidence': 0.85,
+            'reasoning': "Short, plain message without hedging, pressure or ambiguity.",
+            'improvements': []
+        }
+
+    return None
@@ -5,6 +5,9 @@ from app import socketio, db
 from app.models.user import User
 from app.models.message import Message
 from app.models.channel import Channel
+from app.models.conversation import Conversation
+from app.models.receipt import ReadReceipt
+from app.services.ai_stream import ai_streams
 from datetime import datetime
 from bson import ObjectId
 
@@ -52,6 +55,20 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     print("Client disconnected")
+    user_id = session.get('user_id')
+    if user_id:
+        # Stop AI streams nobody is left to receive (this session is still in the room here)
+        remaining = [sid for sid, _ in socketio.server.manager.get_participants('/', str(user_id))
+                     if sid != request.sid]
+        if not remaining:
+            ai_streams.cancel_user(user_id)
+
+@socketio.on('ai_stream_cancel')
+def handle_ai_stream_cancel(data):
+    """Cancel an in-flight AI stream started by this user"""
+    user_id = session.get('user_id')
+    if user_id and data.get('stream_id'):
+        ai_streams.cancel(data['stream_id'], user_id)
 
 @socketio.on('join')
 def on_join(data):
@@ -236,6 +253,8 @@ def handle_new_message(data):
         channel = Channel.get_by_id(channel_id)
         if channel:
             channel.update({'last_message_at': datetime.utcnow()})
+            if channel.is_direct:
+                Conversation.record_message(channel, user_id, content, message.created_at)
         
         # Emit message to channel room
         emit('message_created', message.to_response_dict(), room=channel_id)
@@ -243,42 +262,46 @@ def handle_new_message(data):
     except Exception as e:
         print(f"New message error: {str(e)}")
 
+def _resolve_receipt_targets(data):
+    """Resolve a receipt payload to the newest message per channel.
+
+    Accepts {'message_id': id}, {'message_ids': [ids]} or a high-water mark
+    {'channel_id': id, 'up_to': iso_timestamp}.
+    """
+    if data.get('channel_id') and data.get('up_to'):
+        doc = ReadReceipt.latest_before(data['channel_id'], datetime.fromisoformat(data['up_to']))
+        return [doc] if doc else []
+    message_ids = data.get('message_ids') or ([data['message_id']] if data.get('message_id') else [])
+    return list(ReadReceipt.latest_per_channel(message_ids).values())
+
 @socketio.on('message_delivered')
 def handle_message_delivered(data):
-    """Handle message delivery status"""
+    """Handle message delivery receipts (single ID, batch of IDs or high-water mark)"""
     try:
-        message_id = data.get('message_id')
-        if not message_id:
-            return
-            
         user_id = session.get('user_id')
         if not user_id:
             return
             
-        # Mark message as delivered
-        message = Message.mark_delivered(message_id, user_id)
-        if message:
-            emit('message_delivery_updated', message.to_response_dict(), room=str(message.channel_id))
+        # Advance the delivered watermark once per channel
+        for doc in _resolve_receipt_targets(data):
+            receipt = ReadReceipt.advance(user_id, doc, read=False)
+            emit('message_delivery_updated', receipt, room=receipt['channel_id'])
             
     except Exception as e:
         print(f"Message delivery error: {str(e)}")
 
 @socketio.on('message_read')
 def handle_message_read(data):
-    """Handle message read status"""
+    """Handle message read receipts (single ID, batch of IDs or high-water mark)"""
     try:
-        message_id = data.get('message_id')
-        if not message_id:
-            return
-            
         user_id = session.get('user_id')
         if not user_id:
             return
             
-        # Mark message as read
-        message = Message.mark_read(message_id, user_id)
-        if message:
-            emit('message_read_updated', message.to_response_dict(), room=str(message.channel_id))
+        # Advance the read watermark once per channel
+        for doc in _resolve_receipt_targets(data):
+            receipt = ReadReceipt.advance(user_id, doc, read=True)
+            emit('message_read_updated', receipt, room=receipt['channel_id'])
             
     except Exception as e:
         print(f"Message read error: {str(e)}")
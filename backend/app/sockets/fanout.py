@@ -0,0 +1,72 @@
+import threading
+import time
+from socketio.pubsub_manager import PubSubManager
+from app import socketio
+
+
+class Fanout:
+    """Central fanout for server-originated socket events.
+
+    Callers name every room an event should reach (channel, thread and personal
+    rooms) in a single call. Socket.IO resolves the rooms to de-duplicated
+    sessions and encodes the packet once, so a socket that sits in several of
+    those rooms gets exactly one frame; with a pub/sub client manager the event
+    is also forwarded to the other processes. Per-event fanout size and emit
+    time are recorded for tuning.
+    """
+
+    def __init__(self, socketio):
+        self.socketio = socketio
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def emit(self, event, data, rooms, namespace='/'):
+        """Send `event` once to every session in any of `rooms`.
+
+        Returns the number of local recipient sockets, or None when a pub/sub
+        manager delivers to other processes too (the total is not known here).
+        """
+        rooms = list(dict.fromkeys(str(room) for room in rooms if room))
+        if not rooms:
+            return 0
+
+        manager = self.socketio.server.manager
+        recipients = None
+        if not isinstance(manager, PubSubManager):
+            recipients = sum(1 for _ in manager.get_participants(namespace, rooms))
+
+        start = time.perf_counter()
+        self.socketio.emit(event, data, to=rooms, namespace=namespace)
+        self._record(event, recipients, time.perf_counter() - start)
+        return recipients
+
+    def _record(self, event, recipients, emit_time):
+        with self._lock:
+            stats = self._stats.setdefault(event, {
+                'count': 0,
+                'counted': 0,  # Emits whose recipients are known (not forwarded over pub/sub)
+                'total_recipients': 0,
+                'max_recipients': 0,
+                'total_emit_ms': 0.0
+            })
+            stats['count'] += 1
+            if recipients is not None:
+                stats['counted'] += 1
+                stats['total_recipients'] += recipients
+                stats['max_recipients'] = max(stats['max_recipients'], recipients)
+            stats['total_emit_ms'] += emit_time * 1000
+
+    def get_stats(self):
+        """Get per-event fanout size and emit timings"""
+        with self._lock:
+            return {
+                event: {
+                    **stats,
+                    'avg_recipients': stats['total_recipients'] / stats['counted'] if stats['counted'] else None,
+                    'avg_emit_ms': stats['total_emit_ms'] / stats['count']
+                }
+                for event, stats in self._stats.items()
+            }
+
+
+fanout = Fanout(socketio)
@@ -0,0 +1,125 @@
+import os
+import pickle
+import threading
+import time
+from datetime import datetime
+from pymongo import MongoClient, CursorType
+from pymongo.errors import CollectionInvalid
+from socketio.pubsub_manager import PubSubManager
+
+# Size of the capped collection used as the Mongo message bus
+MONGO_QUEUE_SIZE_BYTES = 16 * 1024 * 1024
+
+
+class MongoPubSubManager(PubSubManager):
+    """Socket.IO client manager that relays events between processes through a
+    capped Mongo collection.
+
+    Every worker publishes emits, room changes and disconnects into the collection
+    and tails it with an awaitable tailable cursor, so a plain mongod is enough to
+    run several gunicorn workers or hosts without Redis.
+
+    :param url: MongoDB connection URL.
+    :param channel: Name shared by every process of the deployment.
+    :param db_name: Database holding the capped collection.
+    """
+    name = 'mongo'
+
+    def __init__(self, url='mongodb://localhost:27017/', channel='socketio', write_only=False,
+                 logger=None, db_name='slack_db', collection='socketio_events'):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.client = MongoClient(url)
+        database = self.client[db_name]
+        try:
+            database.create_collection(collection, capped=True, size=MONGO_QUEUE_SIZE_BYTES)
+        except CollectionInvalid:
+            pass  # Already created by another worker
+        self.collection = database[collection]
+
+    def _publish(self, data):
+        self.collection.insert_one({
+            'channel': self.channel,
+            'payload': pickle.dumps(data),
+            'created_at': datetime.utcnow()
+        })
+
+    def _listen(self):
+        # Start after whatever is already in the collection
+        query = {'channel': self.channel}
+        last = self.collection.find_one(query, sort=[('$natural', -1)], projection={'_id': 1})
+        last_id = last['_id'] if last else None
+
+        while True:
+            # Resume in insertion (natural) order by skipping up to the last event seen.
+            # ObjectIds minted by different processes are not ordered by insertion, so
+            # an `_id > last_id` filter would drop events. If the last event has been
+            # rolled out of the capped collection, everything left in it is newer.
+            skipping = last_id is not None and self.collection.find_one(
+                {'_id': last_id}, projection={'_id': 1}
+            ) is not None
+            cursor = self.collection.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+            while cursor.alive:
+                for doc in cursor:
+                    if skipping:
+                        skipping = doc['_id'] != last_id
+                        continue
+                    last_id = doc['_id']
+                    yield doc['payload']
+            # The cursor dies when the collection is empty or it was rolled over;
+            # back off briefly before re-opening it
+            time.sleep(0.1)
+
+
+class LocalPubSubManager(PubSubManager):
+    """In-process stand-in for a message broker.
+
+    Managers created with the same channel in one process share a broker, which
+    lets tests and benchmarks run several Socket.IO servers side by side as if
+    they were separate workers, without any external service.
+    """
+    name = 'local'
+
+    _brokers = {}
+    _brokers_lock = threading.Lock()
+
+    def __init__(self, channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.queue = None
+
+    def initialize(self):
+        # Queues must come from the server's async mode (threading, eventlet, ...)
+        self.queue = self.server.eio.create_queue()
+        with self._brokers_lock:
+            self._brokers.setdefault(self.channel, []).append(self.queue)
+        super().initialize()
+
+    def _publish(self, data):
+        payload = pickle.dumps(data)
+        with self._brokers_lock:
+            queues = list(self._brokers.get(self.channel, []))
+        for queue in queues:
+            queue.put(payload)
+
+    def _listen(self):
+        while True:
+            yield self.queue.get()
+
+
+def get_client_manager_options(url=None):
+    """Build SocketIO.init_app() options for the configured message queue.
+
+    SOCKETIO_MESSAGE_QUEUE selects the backend:
+      - unset: single process, no pub/sub
+      - local://: in-process broker (tests and benchmarks)
+      - mongodb://... or mongodb+srv://...: capped-collection bus on a plain mongod
+      - anything else (redis://, amqp://, kafka://): passed to Flask-SocketIO as message_queue
+    """
+    url = url if url is not None else os.getenv('SOCKETIO_MESSAGE_QUEUE')
+    channel = os.getenv('SOCKETIO_CHANNEL', 'flask-socketio')
+    if not url:
+        return {}
+    if url.startswith('local://'):
+        return {'client_manager': LocalPubSubManager(channel=channel)}
+    if url.startswith('mongodb://') or url.startswith('mongodb+srv://'):
+        return {'client_manager': MongoPubSubManager(url, channel=channel)}
+    return {'message_queue': url, 'channel': channel}
@@ -0,0 +1,20 @@
+def _eventlet_patched():
+    try:
+        from eventlet import patcher
+    except ImportError:
+        return False
+    return patcher.is_monkey_patched('socket')
+
+
+def run_blocking(fn, *args, **kwargs):
+    """Run CPU-bound or unpatchable blocking work without stalling other requests.
+
+    Under the eventlet runtime (ASYNC_MODE=eventlet) network I/O is cooperative,
+    but hashing, compression and disk writes still hold the hub, freezing every
+    socket served by the worker. Those calls are handed to eventlet's native
+    thread pool (EVENTLET_THREADPOOL_SIZE threads). In threading mode they run inline.
+    """
+    if _eventlet_patched():
+        from eventlet import tpool
+        return tpool.execute(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
@@ -0,0 +1,110 @@
+from bson import ObjectId
+from flask import g, has_app_context
+from app import db
+
+# Only the user fields that API responses actually embed
+USER_PROJECTION = {'username': 1, 'display_name': 1, 'avatar_url': 1}
+
+
+def _to_object_id(value):
+    """Convert a string or ObjectId to ObjectId, returning None if invalid"""
+    if isinstance(value, ObjectId):
+        return value
+    try:
+        return ObjectId(value)
+    except Exception:
+        return None
+
+
+class HydrationLoader:
+    """Per-request batch loader for users, files and channels referenced by API responses.
+
+    List endpoints prime the loader with every id they are about to serialize so each
+    collection is resolved with a single $in query instead of one find_one per item.
+    """
+
+    def __init__(self):
+        self._users = {}
+        self._files = {}
+        self._channels = {}
+        self.query_count = 0
+
+    def _load(self, cache, collection, ids, projection=None):
+        """Fetch any ids not already cached with one $in query"""
+        missing = set()
+        for value in ids:
+            object_id = _to_object_id(value)
+            if object_id is not None and object_id not in cache:
+                missing.add(object_id)
+        if not missing:
+            return
+
+        self.query_count += 1
+        for doc in collection.find({'_id': {'$in': list(missing)}}, projection):
+            cache[doc['_id']] = doc
+
+        # Remember misses so repeated lookups don't go back to the database
+        for object_id in missing:
+            cache.setdefault(object_id, None)
+
+    def load_users(self, user_ids):
+        self._load(self._users, db.users, user_ids, USER_PROJECTION)
+
+    def load_files(self, file_ids):
+        self._load(self._files, db.files, file_ids)
+
+    def load_channels(self, channel_ids):
+        self._load(self._channels, db.channels, channel_ids)
+
+    def get_user(self, user_id):
+        """Get a user document (username, display_name, avatar_url) by ID"""
+        self.load_users([user_id])
+        return self._users.get(_to_object_id(user_id))
+
+    def get_file(self, file_id):
+        """Get a File instance by ID"""
+        from app.models.file import File
+        self.load_files([file_id])
+        data = self._files.get(_to_object_id(file_id))
+        return File.from_dict(data) if data else None
+
+    def get_channel(self, channel_id):
+        """Get a Channel instance by ID"""
+        from app.models.channel import Channel
+        self.load_channels([channel_id])
+        data = self._channels.get(_to_object_id(channel_id))
+        return Channel.from_dict(data) if data else None
+
+    def prime_messages(self, messages):
+        """Batch-load senders and attached files for raw message documents or Message objects"""
+        sender_ids = []
+        file_ids = []
+        for msg in messages:
+            if isinstance(msg, dict):
+                sender_ids.append(msg.get('sender_id'))
+                file_ids.append(msg.get('file_id'))
+            else:
+                sender_ids.append(msg.sender_id)
+                file_ids.append(msg.file_id)
+        self.load_users([s for s in sender_ids if s])
+        self.load_files([f for f in file_ids if f])
+
+    def prime_channels(self, channels):
+        """Batch-load the members of a list of Channel objects"""
+        member_ids = []
+        for channel in channels:
+            member_ids.extend(channel.members)
+        self.load_users(member_ids)
+
+    def prime_invitations(self, invitations):
+        """Batch-load the channels referenced by a list of Invitation objects"""
+        self.load_channels([inv.channel_id for inv in invitations])
+
+
+def get_loader():
+    """Get the hydration loader for the current request, creating it on first use"""
+    if not has_app_context():
+        return HydrationLoader()
+    if 'hydration_loader' not in g:
+        g.hydration_loader = HydrationLoader()
+    return g.hydration_loader
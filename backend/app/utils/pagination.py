@@ -0,0 +1,108 @@
+import base64
+import json
+from datetime import datetime
+from bson import ObjectId
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def to_mongo_precision(value):
+    """Truncate a datetime to the milliseconds Mongo stores"""
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+
+def encode_cursor(doc, direction):
+    """Encode an opaque cursor pointing at a message's (created_at, _id) key"""
+    payload = {
+        # A key taken from an in-memory copy must compare like the stored value
+        't': to_mongo_precision(doc['created_at']).isoformat(),
+        'id': str(doc['_id']),
+        'd': direction
+    }
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor into (created_at, _id, direction); raises ValueError if malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction = payload['d']
+        if direction not in ('next', 'prev'):
+            raise ValueError(f"Unknown cursor direction: {direction}")
+        return datetime.fromisoformat(payload['t']), ObjectId(payload['id']), direction
+    except ValueError:
+        raise
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {str(e)}")
+
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE):
+    """Parse a ?limit= value, clamped to [1, MAX_PAGE_SIZE]"""
+    try:
+        limit = int(value) if value is not None else default
+    except (TypeError, ValueError):
+        raise ValueError('limit must be an integer')
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def keyset_page(collection, query, limit, cursor=None, newest_first=True, projection=None):
+    """Fetch one page of messages ordered by (created_at, _id).
+
+    Pages walk newest-to-oldest when `newest_first` is set, oldest-to-newest otherwise.
+    `next_cursor` continues the walk past the last item and `prev_cursor` walks back
+    from the first item; either is None when there is nothing more in that direction.
+    The query must be backed by an index ending in (created_at, _id) for this to
+    stay O(page).
+
+    Returns: (documents, next_cursor, prev_cursor)
+    """
+    order = -1 if newest_first else 1
+    backwards = False
+    page_query = query
+
+    if cursor:
+        created_at, cursor_id, direction = decode_cursor(cursor)
+        backwards = direction == 'prev'
+        # Walking forward uses the same comparison as the sort order; walking back flips it
+        op = '$lt' if (order == -1) != backwards else '$gt'
+        keyset = {'$or': [
+            {'created_at': {op: created_at}},
+            {'created_at': created_at, '_id': {op: cursor_id}}
+        ]}
+        page_query = {'$and': [query, keyset]} if '$or' in query else {**query, **keyset}
+
+    sort_order = -order if backwards else order
+    # Fetch one extra document to know whether another page exists
+    docs = list(collection.find(
+        page_query,
+        projection,
+        sort=[('created_at', sort_order), ('_id', sort_order)],
+        limit=limit + 1
+    ))
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    if backwards:
+        docs.reverse()
+
+    if not docs:
+        return docs, None, None
+
+    if backwards:
+        next_cursor = encode_cursor(docs[-1], 'next')
+        prev_cursor = encode_cursor(docs[0], 'prev') if has_more else None
+    else:
+        next_cursor = encode_cursor(docs[-1], 'next') if has_more else None
+        prev_cursor = encode_cursor(docs[0], 'prev') if cursor else None
+    return docs, next_cursor, prev_cursor
+
+
+def with_cursor_headers(response, next_cursor, prev_cursor):
+    """Attach page cursors to a list response as X-Next-Cursor / X-Prev-Cursor headers"""
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    if prev_cursor:
+        response.headers['X-Prev-Cursor'] = prev_cursor
+    return response
@@ -0,0 +1,37 @@
+try:
+    import tiktoken
+except ImportError:  # Optional: exact counts when installed, estimates otherwise
+    tiktoken = None
+
+_encodings = {}
+
+
+def _get_encoding(model):
+    if tiktoken is None:
+        return None
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding('cl100k_base')
+    return _encodings[model]
+
+
+def count_tokens(text, model='gpt-3.5-turbo'):
+    """Count the tokens of `text` for `model` without calling the API.
+
+    Uses tiktoken when it is installed. Otherwise estimates about 4 characters
+    per token, which is close for English chat text and slightly pessimistic for code.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages, model='gpt-3.5-turbo'):
+    """Count the prompt tokens of a chat messages array, including per-message overhead"""
+    # Each message is wrapped in role/separator tokens, and the reply is primed with 3 more
+    return sum(4 + count_tokens(m.get('content'), model) for m in messages) + 3
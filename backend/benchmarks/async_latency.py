@@ -0,0 +1,226 @@
+"""Measure Socket.IO round-trip latency while slow AI calls are in flight.
+
+Starts a fake OpenAI endpoint that takes AI_DELAY seconds per completion, then
+for each runtime profile starts a server with a Socket.IO ping handler and an
+HTTP route calling AIService.generate_response. A client pings over Socket.IO
+while CONCURRENCY AI requests are kept in flight and reports ping latency.
+
+    python benchmarks/async_latency.py                     # all profiles
+    python benchmarks/async_latency.py eventlet threading  # selected profiles
+
+Profiles:
+  eventlet-unpatched  eventlet server without monkey patching (blocks on every AI call)
+  eventlet            ASYNC_MODE=eventlet, the production profile
+  threading           ASYNC_MODE=threading, the development default
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+AI_DELAY = 2.0
+CONCURRENCY = 8
+DURATION = 6.0
+PING_INTERVAL = 0.05
+TIMEOUT = 30
+PROFILES = ['eventlet-unpatched', 'eventlet', 'threading']
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+# --- fake OpenAI upstream ---------------------------------------------------
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        # The key validation call (max_tokens=1) answers immediately
+        if body.get('max_tokens') != 1:
+            time.sleep(AI_DELAY)
+        payload = json.dumps({
+            'id': 'chatcmpl-bench',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'gpt-3.5-turbo'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': 'ok'},
+                'finish_reason': 'stop'
+            }],
+            'usage': {'prompt_tokens': 10, 'completion_tokens': 1, 'total_tokens': 11}
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_upstream():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeOpenAIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# --- server under test (runs in a subprocess per profile) -------------------
+
+def serve(profile, port, upstream_url):
+    os.environ['OPENAI_API_KEY'] = 'sk-bench'
+    os.environ['OPENAI_BASE_URL'] = upstream_url
+    if profile == 'eventlet-unpatched':
+        os.environ.pop('ASYNC_MODE', None)
+        async_mode = 'eventlet'
+    else:
+        os.environ['ASYNC_MODE'] = profile
+        async_mode = profile
+
+    # The app package applies the runtime profile (and monkey patching), so it
+    # has to be imported before anything else
+    from app.services.ai_service import AIService
+    from flask import Flask, jsonify
+    from flask_socketio import SocketIO
+
+    flask_app = Flask(__name__)
+    sio = SocketIO(flask_app, async_mode=async_mode)
+    ai_service = AIService()
+
+    @flask_app.route('/ai')
+    def ai():
+        response, _ = ai_service.generate_response(prompt='hello')
+        return jsonify({'response': response})
+
+    @sio.on('bench_ping')
+    def bench_ping():
+        return 'pong'
+
+    sio.run(flask_app, host='127.0.0.1', port=port, allow_unsafe_werkzeug=True, log_output=False)
+
+
+# --- client -----------------------------------------------------------------
+
+class PollingClient:
+    """Minimal Engine.IO v4 long-polling client, enough to time acked events"""
+
+    def __init__(self, port):
+        import httpx
+        self.http = httpx.Client(timeout=TIMEOUT)
+        base = f'http://127.0.0.1:{port}/socket.io/?EIO=4&transport=polling'
+        opened = self.http.get(base).text
+        self.url = base + '&sid=' + json.loads(opened[1:])['sid']
+        self.ack_id = 0
+        self.http.post(self.url, content='40')
+        self._receive()
+
+    def _receive(self):
+        packets = self.http.get(self.url).text.split('\x1e')
+        for packet in packets:
+            if packet == '2':  # Engine.IO ping
+                self.http.post(self.url, content='3')
+        return packets
+
+    def ping(self):
+        self.ack_id += 1
+        expected = f'43{self.ack_id}'
+        start = time.perf_counter()
+        self.http.post(self.url, content=f'42{self.ack_id}["bench_ping"]')
+        while not any(p.startswith(expected) for p in self._receive()):
+            pass
+        return (time.perf_counter() - start) * 1000
+
+
+def measure(port, with_load):
+    import httpx
+    client = PollingClient(port)
+    stop = threading.Event()
+    completed = []
+
+    def load():
+        with httpx.Client(timeout=TIMEOUT) as http:
+            while not stop.is_set():
+                try:
+                    http.get(f'http://127.0.0.1:{port}/ai')
+                    completed.append(1)
+                except httpx.HTTPError:
+                    pass
+
+    workers = [threading.Thread(target=load, daemon=True) for _ in range(CONCURRENCY if with_load else 0)]
+    for worker in workers:
+        worker.start()
+    time.sleep(0.2)
+
+    latencies = []
+    failed = 0
+    deadline = time.time() + DURATION
+    while time.time() < deadline:
+        try:
+            latencies.append(client.ping())
+        except httpx.HTTPError:
+            failed += 1
+            break  # The session is unusable after a timed-out poll
+        time.sleep(PING_INTERVAL)
+    stop.set()
+    return latencies, failed, len(completed)
+
+
+def run(profiles):
+    upstream = start_upstream()
+    upstream_url = f'http://127.0.0.1:{upstream.server_address[1]}/v1'
+
+    print(f"AI delay {AI_DELAY}s, {CONCURRENCY} AI calls in flight, {DURATION}s per run")
+    print(f"{'profile':<20}{'load':<7}{'pings':>6}{'failed':>7}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'AI/s':>7}")
+    for profile in profiles:
+        port = free_port()
+        proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--serve', profile, str(port), upstream_url],
+            cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            if not wait_for_port(port):
+                print(f"{profile:<20}server did not start")
+                continue
+            for with_load in (False, True):
+                latencies, failed, completed = measure(port, with_load)
+                stats = [percentile(latencies, 50), percentile(latencies, 95), max(latencies)] if latencies else [float('nan')] * 3
+                print(f"{profile:<20}{'yes' if with_load else 'idle':<7}{len(latencies):>6}{failed:>7}"
+                      f"{stats[0]:>10.1f}{stats[1]:>10.1f}{stats[2]:>10.1f}{completed / DURATION:>7.1f}")
+        finally:
+            proc.kill()
+            proc.wait()
+    upstream.shutdown()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--serve':
+        serve(sys.argv[2], int(sys.argv[3]), sys.argv[4])
+    else:
+        run(sys.argv[1:] or PROFILES)
@@ -0,0 +1,78 @@
+"""Measure cross-worker Socket.IO delivery latency through the pub/sub backend.
+
+Two Socket.IO servers stand in for two workers. A client session on worker B
+joins a room; worker A emits to that room and we time how long each event
+takes to reach the client through the message queue.
+
+    python benchmarks/pubsub_latency.py                      # in-process broker
+    python benchmarks/pubsub_latency.py mongodb://localhost  # capped-collection bus
+"""
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask_socketio import SocketIO
+from app.sockets.pubsub import get_client_manager_options
+
+
+def make_worker(url):
+    app = Flask(__name__)
+    options = get_client_manager_options(url)
+    socketio = SocketIO(app, async_mode='threading', **options)
+    # Start the manager's pub/sub listener thread
+    socketio.server.manager.initialize()
+    return socketio
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def run(url='local://', count=500):
+    worker_a = make_worker(url)
+    worker_b = make_worker(url)
+
+    # Register a fake client session on worker B and put it in the room
+    manager_b = worker_b.server.manager
+    sid = manager_b.connect('bench-eio-sid', '/')
+    manager_b.enter_room(sid, '/', 'bench-room')
+
+    # Record arrival time of every frame worker B pushes to its client
+    arrivals = {}
+    received = threading.Event()
+
+    def timed_send(eio_sid, eio_pkt):
+        arrivals[len(arrivals)] = time.perf_counter()
+        if len(arrivals) >= count:
+            received.set()
+
+    worker_b.server._send_eio_packet = timed_send
+
+    sent = []
+    for seq in range(count):
+        sent.append(time.perf_counter())
+        worker_a.emit('bench', {'seq': seq}, to='bench-room')
+        time.sleep(0.002)
+
+    if not received.wait(timeout=30):
+        print(f"Only {len(arrivals)}/{count} events arrived")
+    latencies_ms = [(arrivals[i] - sent[i]) * 1000 for i in range(len(arrivals))]
+    if not latencies_ms:
+        return
+
+    print(f"Backend: {url}")
+    print(f"Events:  {len(latencies_ms)}")
+    print(f"p50:     {percentile(latencies_ms, 50):.3f} ms")
+    print(f"p95:     {percentile(latencies_ms, 95):.3f} ms")
+    print(f"p99:     {percentile(latencies_ms, 99):.3f} ms")
+    print(f"max:     {max(latencies_ms):.3f} ms")
+
+
+if __name__ == '__main__':
+    run(sys.argv[1] if len(sys.argv) > 1 else 'local://')
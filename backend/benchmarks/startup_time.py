@@ -0,0 +1,93 @@
+"""Measure worker startup time against a healthy and a hung OpenAI endpoint.
+
+Each run boots the app in a fresh interpreter (like a gunicorn worker) and
+times the import, create_app() and the first /api/ai/health request. The
+"hung" upstream accepts connections but never answers, so any network call
+made during boot shows up as a stall.
+
+    python benchmarks/startup_time.py
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TIMEOUT = 60
+
+WORKER = r'''
+import json, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+response = app.test_client().get('/api/ai/health')
+answered = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (answered - created) * 1000,
+    'health': response.get_json()['upstream']['status']
+}))
+'''
+
+
+class HealthyHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        payload = json.dumps({'id': 'gpt-3.5-turbo', 'object': 'model', 'created': 0, 'owned_by': 'bench'}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_POST = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+def healthy_upstream():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), HealthyHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_address[1]}/v1'
+
+
+def hung_upstream():
+    # Listening but never accepting: connects succeed, reads never return
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(64)
+    hung_upstream.sock = sock
+    return f'http://127.0.0.1:{sock.getsockname()[1]}/v1'
+
+
+def boot(upstream_url):
+    env = dict(os.environ, OPENAI_API_KEY='sk-bench', OPENAI_BASE_URL=upstream_url)
+    try:
+        result = subprocess.run(
+            [sys.executable, '-c', WORKER], cwd=BACKEND_DIR, env=env,
+            capture_output=True, text=True, timeout=TIMEOUT
+        )
+    except subprocess.TimeoutExpired:
+        return None
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run():
+    print(f"{'upstream':<10}{'import ms':>11}{'create_app ms':>15}{'first req ms':>14}  health")
+    for name, make_upstream in (('healthy', healthy_upstream), ('hung', hung_upstream)):
+        timing = boot(make_upstream())
+        if timing is None:
+            print(f"{name:<10}did not boot within {TIMEOUT}s")
+            continue
+        print(f"{name:<10}{timing['import_ms']:>11.0f}{timing['create_app_ms']:>15.0f}"
+              f"{timing['first_request_ms']:>14.0f}  {timing['health']}")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,85 @@
+"""Measure the local tone pre-classifier against labeled corpora.
+
+Runs app.services.tone_classifier.classify_tone over the fixtures (one
+{"text", "tone"} object per line) and reports, per tone, how often the local
+answer was right (precision) and how much of that tone it answered (recall),
+plus the share of messages answered locally, i.e. the analyze-message model
+calls saved. Messages it escalates count as neither right nor wrong.
+
+The rules were tuned against fixtures/tone_corpus.jsonl; the held-out
+fixtures/tone_corpus_holdout.jsonl is the honest estimate, so don't tune
+against it (add failing cases to the tuning corpus instead).
+
+    python benchmarks/tone_classifier.py            # summary
+    python benchmarks/tone_classifier.py --errors   # also list misclassified messages
+"""
+import json
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from app.services.tone_classifier import classify_tone  # noqa: E402
+
+FIXTURES = os.path.join(BACKEND_DIR, 'benchmarks', 'fixtures')
+CORPORA = [
+    ('tuning', os.path.join(FIXTURES, 'tone_corpus.jsonl')),
+    ('held-out', os.path.join(FIXTURES, 'tone_corpus_holdout.jsonl'))
+]
+TONES = ['neutral', 'aggressive', 'weak', 'confusing']
+
+
+def load_corpus(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(corpus, show_errors=False):
+    stats = {tone: {'labeled': 0, 'predicted': 0, 'correct': 0} for tone in TONES}
+    errors = []
+    answered = 0
+
+    for example in corpus:
+        expected = example['tone']
+        stats[expected]['labeled'] += 1
+        result = classify_tone(example['text'])
+        if result is None:
+            continue
+        answered += 1
+        predicted = result['tone']
+        stats[predicted]['predicted'] += 1
+        if predicted == expected:
+            stats[expected]['correct'] += 1
+        else:
+            errors.append((example['text'], expected, predicted))
+
+    print(f"{'tone':<12}{'labeled':>9}{'answered':>10}{'precision':>11}{'recall':>9}")
+    for tone in TONES:
+        s = stats[tone]
+        precision = f"{s['correct'] / s['predicted']:.2f}" if s['predicted'] else '-'
+        recall = f"{s['correct'] / s['labeled']:.2f}" if s['labeled'] else '-'
+        print(f"{tone:<12}{s['labeled']:>9}{s['predicted']:>10}{precision:>11}{recall:>9}")
+
+    correct = sum(s['correct'] for s in stats.values())
+    print()
+    print(f"messages:                {len(corpus)}")
+    print(f"answered locally:        {answered} ({answered / len(corpus):.0%} fewer model calls)")
+    print(f"accuracy when answered:  {correct / answered:.2%}" if answered else "accuracy when answered:  -")
+
+    if show_errors and errors:
+        print()
+        for text, expected, predicted in errors:
+            print(f"  expected {expected:<10} got {predicted:<10} {text}")
+    return stats
+
+
+def run(show_errors=False):
+    for name, path in CORPORA:
+        print(f"== {name} corpus ({os.path.basename(path)})")
+        evaluate(load_corpus(path), show_errors)
+        print()
+
+
+if __name__ == '__main__':
+    run(show_errors='--errors' in sys.argv)
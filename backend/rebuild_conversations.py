@@ -0,0 +1,10 @@
+from app.models.conversation import Conversation
+
+def rebuild_conversations():
+    # Rebuild the recent chats rows from existing DM channels
+    print("Rebuilding DM conversations...")
+    rebuilt = Conversation.rebuild()
+    print(f"Rebuilt conversations for {rebuilt} DM channels")
+
+if __name__ == '__main__':
+    rebuild_conversations()
@@ -0,0 +1,10 @@
+from app.services.search_index import search_index
+
+def rebuild_search_index():
+    # Rebuild the full-text index from every stored message
+    print("Rebuilding message search index...")
+    indexed = search_index.rebuild()
+    print(f"Indexed {indexed} messages")
+
+if __name__ == '__main__':
+    rebuild_search_index()
@@ -56,6 +56,7 @@ const RETRY_DELAY = 1000; // 1 second
 const AutoReplyComposer = ({ 
   message,           // Current message to reply to or improve
   threadContext = [], // Array of previous messages in the thread (optional)
+  threadId = null,   // Thread to load the context from server-side (replaces threadContext)
   onSelectReply,     // Callback when a reply is selected
   onClose           // Callback to close the composer
 }) => {
@@ -159,7 +160,9 @@ const AutoReplyComposer = ({
         },
         body: JSON.stringify({
           message: message,
-          thread_context: !message.isQuickReply ? threadContext : undefined,
+          ...(!message.isQuickReply && (threadId
+            ? { thread_id: threadId }
+            : { thread_context: threadContext })),
           tone: selectedTone,
           length: selectedLength
         })
@@ -61,6 +61,11 @@ const ThreadPanel = ({
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState(null);
   const messagesEndRef = useRef(null);
+  const repliesContainerRef = useRef(null);
+  const lastScrollTopRef = useRef(0);
+  // Cursor for the page of earlier replies (X-Next-Cursor), null once the whole thread is loaded
+  const [olderCursor, setOlderCursor] = useState(null);
+  const [isLoadingOlder, setIsLoadingOlder] = useState(false);
 
   // Debug log current user
   useEffect(() => {
@@ -104,6 +109,72 @@ const ThreadPanel = ({
     }
   }, [selectedMessage]);
 
+  // Fetch one page of replies, newest first; nextCursor continues into earlier replies
+  const fetchRepliesPage = async (messageId, cursor = null) => {
+    const token = localStorage.getItem('token');
+    const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+    const response = await fetch(
+      `${import.meta.env.VITE_API_URL || 'http://localhost:5001'}/api/messages/${messageId}/replies${query}`,
+      {
+        headers: {
+          'Authorization': `Bearer ${token}`,
+        }
+      }
+    );
+
+    if (!response.ok) {
+      throw new Error('Failed to load replies');
+    }
+
+    return {
+      data: await response.json(),
+      nextCursor: response.headers.get('X-Next-Cursor')
+    };
+  };
+
+  // Load the page of replies before the oldest loaded one, keeping the scroll position
+  const loadOlderReplies = async () => {
+    if (!parentMessage || !olderCursor || isLoadingOlder) return;
+    
+    const messageId = parentMessage._id || parentMessage.id;
+    try {
+      setIsLoadingOlder(true);
+      const { data, nextCursor } = await fetchRepliesPage(messageId, olderCursor);
+      
+      const container = repliesContainerRef.current;
+      const previousHeight = container ? container.scrollHeight : 0;
+      setReplies(prev => {
+        const loadedIds = new Set(prev.map(reply => reply._id || reply.id));
+        const older = data.filter(reply => !loadedIds.has(reply._id || reply.id));
+        return [...older, ...prev].sort((a, b) => 
+          new Date(a.created_at) - new Date(b.created_at)
+        );
+      });
+      setOlderCursor(nextCursor);
+      
+      // Keep the reply that was at the top in view
+      requestAnimationFrame(() => {
+        if (container) {
+          container.scrollTop += container.scrollHeight - previousHeight;
+        }
+      });
+    } catch (error) {
+      console.error('Error loading earlier replies:', error);
+      setError('Failed to load earlier replies');
+    } finally {
+      setIsLoadingOlder(false);
+    }
+  };
+
+  const handleRepliesScroll = (event) => {
+    const { scrollTop } = event.currentTarget;
+    // Only when the user scrolls up near the top
+    if (scrollTop < 100 && scrollTop < lastScrollTopRef.current) {
+      loadOlderReplies();
+    }
+    lastScrollTopRef.current = scrollTop;
+  };
+
   // Effect to handle socket events for replies and load initial replies
   useEffect(() => {
     if (!parentMessage) return;
@@ -114,25 +185,12 @@ const ThreadPanel = ({
     // Track if component is mounted
     let isMounted = true;
     
-    // Load initial replies
+    // Load the newest page of replies; earlier ones are loaded on scroll
     const loadInitialReplies = async () => {
       try {
         setIsLoading(true);
-        const token = localStorage.getItem('token');
-        const response = await fetch(
-          `${import.meta.env.VITE_API_URL || 'http://localhost:5001'}/api/messages/${messageId}/replies`,
-          {
-            headers: {
-              'Authorization': `Bearer ${token}`,
-            }
-          }
-        );
-
-        if (!response.ok) {
-          throw new Error('Failed to load replies');
-        }
-
-        const data = await response.json();
+        setOlderCursor(null);
+        const { data, nextCursor } = await fetchRepliesPage(messageId);
         console.log('ThreadPanel - Received initial replies:', data);
 
         // Only update state if component is still mounted
@@ -144,6 +202,7 @@ const ThreadPanel = ({
 
           console.log('ThreadPanel - Setting sorted replies:', sortedReplies);
           setReplies(sortedReplies);
+          setOlderCursor(nextCursor);
         }
       } catch (error) {
         console.error('Error loading replies:', error);
@@ -195,7 +254,7 @@ const ThreadPanel = ({
         if (onSendReply) {
           onSendReply({
             ...parentMessage,
-            reply_count: (parentMessage.reply_count || 0) + 1
+            reply_count: data.reply_count ?? (parentMessage.reply_count || 0) + 1
           });
         }
       }
@@ -589,6 +648,9 @@ const ThreadPanel = ({
     );
   };
 
+  // Replies not loaded yet still count towards the thread's total
+  const replyCount = Math.max(parentMessage?.reply_count || 0, replies.length);
+
   const scrollToBottom = () => {
     if (messagesEndRef.current) {
       messagesEndRef.current.scrollIntoView({ behavior: 'smooth' });
@@ -642,18 +704,41 @@ const ThreadPanel = ({
       </Flex>
 
       {/* Messages Area */}
-      <VStack spacing={4} align="stretch" flex="1" overflowY="auto" p={4} bg={colorMode === 'dark' ? 'gray.900' : 'white'} className="custom-scrollbar">
+      <VStack
+        ref={repliesContainerRef}
+        onScroll={handleRepliesScroll}
+        spacing={4}
+        align="stretch"
+        flex="1"
+        overflowY="auto"
+        p={4}
+        bg={colorMode === 'dark' ? 'gray.900' : 'white'}
+        className="custom-scrollbar"
+      >
         {parentMessage && renderMessage(parentMessage, true)}
         
         {replies.length > 0 && (
           <>
             <Divider borderColor={colorMode === 'dark' ? 'gray.700' : 'gray.200'} />
             <Text color={colorMode === 'dark' ? 'gray.400' : 'gray.600'} fontSize="sm" px={4}>
-              {replies.length} {replies.length === 1 ? 'reply' : 'replies'}
+              {replyCount} {replyCount === 1 ? 'reply' : 'replies'}
             </Text>
           </>
         )}
         
+        {/* Earlier replies, also loaded when scrolling to the top */}
+        {olderCursor && (
+          <Button
+            size="sm"
+            variant="ghost"
+            alignSelf="center"
+            onClick={loadOlderReplies}
+            isLoading={isLoadingOlder}
+          >
+            Load earlier replies
+          </Button>
+        )}
+        
         {replies.map((reply, index) => {
           const messageId = reply._id || reply.id;
           if (!messageId) {
@@ -717,17 +802,7 @@ const ThreadPanel = ({
       {(showAIComposer || internalShowAIComposer) && (selectedMessage || internalSelectedMessage) && (
         <AutoReplyComposer
           message={selectedMessage || internalSelectedMessage}
-          threadContext={[parentMessage, ...replies].sort(
-            (a, b) => new Date(a.created_at) - new Date(b.created_at)
-          ).map(msg => ({
-            content: msg.content,
-            username: msg.username,
-            created_at: msg.created_at,
-            sender_id: msg.sender_id,
-            id: msg._id || msg.id,
-            channel_id: msg.channel_id,
-            is_direct: msg.is_direct
-          }))}
+          threadId={parentMessage._id || parentMessage.id}
           onSelectReply={handleAISuggestionSelect}
           onClose={() => {
             if (internalShowAIComposer) {
@@ -23,6 +23,9 @@ import { EditIcon, DownloadIcon, CheckIcon, CloseIcon } from '@chakra-ui/icons';
 import { useSelector } from 'react-redux';
 import { selectUser } from '../../store/slices/authSlice';
 
+const JOB_POLL_INTERVAL = 1500; // ms between notes job status checks
+const JOB_MAX_POLLS = 400; // about 10 minutes before giving up on a job
+
 const NotesModal = ({
   isOpen,
   onClose,
@@ -92,7 +95,31 @@ const NotesModal = ({
     }
   };
 
-  const generateNotes = async () => {
+  const waitForJob = async (jobId, token) => {
+    const jobUrl = `${import.meta.env.VITE_API_URL}/api/ai/jobs/${jobId}`;
+    for (let poll = 0; poll < JOB_MAX_POLLS; poll++) {
+      await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL));
+      const response = await fetch(jobUrl, {
+        headers: { 'Authorization': `Bearer ${token}` },
+        credentials: 'include'
+      });
+      if (!response.ok) {
+        throw new Error(`Failed to check notes generation: ${response.status}`);
+      }
+      const { data: job } = await response.json();
+      if (job.status === 'succeeded') {
+        return job.result;
+      }
+      if (job.status === 'failed') {
+        throw new Error(job.error || 'Failed to generate notes');
+      }
+    }
+    throw new Error('Notes generation is taking too long. Please try again later.');
+  };
+
+  // With `refresh`, the current notes are updated with the messages posted since
+  // they were generated (a new version) instead of being generated from scratch
+  const generateNotes = async (refresh = false) => {
     console.log('Generating notes...');
     try {
       let finalChannelId = channelId;
@@ -116,7 +143,8 @@ const NotesModal = ({
       
       const queryParams = new URLSearchParams({
         channel_id: finalChannelId,
-        ...(threadId ? { thread_id: threadId } : {})
+        ...(threadId ? { thread_id: threadId } : {}),
+        ...(refresh && notes?.id ? { note_id: notes.id } : {})
       });
       
       const apiUrl = `${import.meta.env.VITE_API_URL}/api/ai/generate-notes?${queryParams}`;
@@ -147,7 +175,8 @@ const NotesModal = ({
         throw new Error(data.error || data.message || 'Failed to generate notes');
       }
 
-      const notesData = data.data || data;
+      // Generation runs as a background job; poll until it finishes
+      const notesData = data.job_id ? await waitForJob(data.job_id, token) : (data.data || data);
       
       // Transform the response if needed
       const formattedNotes = {
@@ -439,13 +468,24 @@ const NotesModal = ({
             Close
           </Button>
           {notes && !isLoading && (
-            <Button
-              colorScheme="green"
-              onClick={generateNotes}
-              leftIcon={<Spinner size="sm" />}
-            >
-              Regenerate
-            </Button>
+            <>
+              <Button
+                colorScheme="green"
+                mr={3}
+                onClick={() => generateNotes(true)}
+                leftIcon={<Spinner size="sm" />}
+              >
+                Update
+              </Button>
+              <Button
+                colorScheme="green"
+                variant="outline"
+                onClick={() => generateNotes(false)}
+                leftIcon={<Spinner size="sm" />}
+              >
+                Regenerate
+              </Button>
+            </>
           )}
         </ModalFooter>
       </ModalContent>
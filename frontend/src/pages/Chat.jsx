@@ -68,7 +68,7 @@ import { FaHashtag } from 'react-icons/fa';
 import { BsChatDots } from 'react-icons/bs';
 import axios from 'axios';
 import { useNavigate } from 'react-router-dom';
-import { selectChannelMessages, setMessages, setLoading, setError } from '../store/slices/messagesSlice';
+import { selectChannelMessages, setMessages, prependMessages, setLoading, setError } from '../store/slices/messagesSlice';
 import { createSelector } from 'reselect';
 import { FiFileText } from 'react-icons/fi';
 import NotesModal from '../components/notes/NotesModal';
@@ -148,6 +148,9 @@ export default function Chat() {
   
   // 2. Refs
   const messagesEndRef = useRef(null);
+  const messagesContainerRef = useRef(null);
+  const lastScrollTopRef = useRef(0);
+  const newestMessageIdRef = useRef(null);
 
   // 3. State declarations
   const [currentChannel, setCurrentChannel] = useState(null);
@@ -176,6 +179,9 @@ export default function Chat() {
   const [messageSearchTerm, setMessageSearchTerm] = useState('');
   const [userSearchTerm, setUserSearchTerm] = useState('');
   const [showNotesModal, setShowNotesModal] = useState(false);
+  // Cursor for the next page of older history (X-Next-Cursor), null once it is all loaded
+  const [olderCursor, setOlderCursor] = useState(null);
+  const [isLoadingOlder, setIsLoadingOlder] = useState(false);
 
   // 4. Memoized selectors that depend on state
   const selectMessagesForChannel = useMemo(
@@ -238,6 +244,7 @@ export default function Chat() {
     
     try {
       dispatch(setLoading(true));
+      setOlderCursor(null);
       const token = localStorage.getItem('token');
       if (!token) {
         throw new Error('No authentication token found');
@@ -255,6 +262,7 @@ export default function Chat() {
       }
 
       const data = await response.json();
+      setOlderCursor(response.headers.get('X-Next-Cursor'));
       
       if (!Array.isArray(data)) {
         console.error('Received non-array messages data:', data);
@@ -433,6 +441,7 @@ export default function Chat() {
       let channelId = existingChannelId;
       let messages = [];
       let channelData = null;
+      let nextCursor = null;
 
       // Leave current channel if any
       if (currentChannel?.id) {
@@ -460,6 +469,7 @@ export default function Chat() {
         const data = await response.json();
         channelId = data.channel_id;
         messages = data.messages || [];
+        nextCursor = data.next_cursor || response.headers.get('X-Next-Cursor');
         channelData = data;
         console.log('Got DM channel ID:', channelId);
       } else {
@@ -480,6 +490,7 @@ export default function Chat() {
         }
 
         messages = await response.json();
+        nextCursor = response.headers.get('X-Next-Cursor');
       }
       
       // Always close thread when switching to DM
@@ -504,13 +515,16 @@ export default function Chat() {
       setCurrentChannel(dmChannel);
       setSelectedDmId(channelId);
       
-      // Ensure messages have the is_direct flag
-      const messagesWithDmFlag = messages.map(msg => ({
-        ...msg,
-        is_direct: true,
-        channel_id: channelId
-      }));
+      // Ensure messages have the is_direct flag, oldest first
+      const messagesWithDmFlag = messages
+        .map(msg => ({
+          ...msg,
+          is_direct: true,
+          channel_id: channelId
+        }))
+        .sort((a, b) => new Date(a.created_at) - new Date(b.created_at));
       dispatch(setMessages({ channelId, messages: messagesWithDmFlag }));
+      setOlderCursor(nextCursor);
       
       setIsDirectMessageOpen(false);
       
@@ -540,6 +554,71 @@ export default function Chat() {
     }
   }, [currentChannel?.id, dispatch, scrollToBottom]);
 
+  // Load the page of history before the oldest loaded message, keeping the scroll position
+  const loadOlderMessages = useCallback(async () => {
+    const channelId = currentChannel?.id;
+    if (!channelId || !olderCursor || isLoadingOlder) return;
+    
+    try {
+      setIsLoadingOlder(true);
+      const token = localStorage.getItem('token');
+      const response = await fetch(
+        `${import.meta.env.VITE_API_URL || 'http://localhost:5001'}/api/messages/channel/${channelId}?cursor=${encodeURIComponent(olderCursor)}`,
+        {
+          headers: {
+            'Authorization': `Bearer ${token}`,
+            'Content-Type': 'application/json'
+          }
+        }
+      );
+
+      if (!response.ok) {
+        throw new Error(`Failed to load older messages: ${response.status}`);
+      }
+
+      const data = await response.json();
+      const older = data
+        .map(msg => ({
+          ...msg,
+          reply_count: msg.reply_count || 0,
+          is_direct: currentChannel?.is_direct || false
+        }))
+        .sort((a, b) => new Date(a.created_at) - new Date(b.created_at));
+
+      const container = messagesContainerRef.current;
+      const previousHeight = container ? container.scrollHeight : 0;
+      dispatch(prependMessages({ channelId, messages: older }));
+      setOlderCursor(response.headers.get('X-Next-Cursor'));
+      
+      // Keep the message that was at the top in view
+      requestAnimationFrame(() => {
+        if (container) {
+          container.scrollTop += container.scrollHeight - previousHeight;
+        }
+      });
+    } catch (error) {
+      console.error('Error loading older messages:', error);
+      toast({
+        title: 'Error',
+        description: 'Failed to load older messages',
+        status: 'error',
+        duration: 3000,
+        isClosable: true,
+      });
+    } finally {
+      setIsLoadingOlder(false);
+    }
+  }, [currentChannel?.id, currentChannel?.is_direct, olderCursor, isLoadingOlder, dispatch, toast]);
+
+  const handleMessagesScroll = useCallback((event) => {
+    const { scrollTop } = event.currentTarget;
+    // Only when the user scrolls up near the top, not while scrolling down to the newest message
+    if (scrollTop < 100 && scrollTop < lastScrollTopRef.current) {
+      loadOlderMessages();
+    }
+    lastScrollTopRef.current = scrollTop;
+  }, [loadOlderMessages]);
+
   const handleNewReply = (data) => {
     // Update the message in the messages list with the new reply count
     setMessages(prev => prev.map(msg => {
@@ -686,11 +765,15 @@ export default function Chat() {
   }, [messages, messageSearchTerm]);
 
   useEffect(() => {
-    if (messages.length > 0) {
+    // Follow new messages, but stay in place when older history is prepended
+    const newest = messages[messages.length - 1];
+    const newestId = newest ? (newest._id || newest.id) : null;
+    if (newestId && newestId !== newestMessageIdRef.current) {
       requestAnimationFrame(() => {
         scrollToBottom();
       });
     }
+    newestMessageIdRef.current = newestId;
   }, [messages, scrollToBottom]);
 
   useEffect(() => {
@@ -907,6 +990,8 @@ export default function Chat() {
           <>
             {/* Messages Area */}
             <VStack
+              ref={messagesContainerRef}
+              onScroll={handleMessagesScroll}
               flex="1" 
               spacing={4}
               overflowY="auto" 
@@ -914,6 +999,19 @@ export default function Chat() {
               align="stretch"
               bg={colorMode === 'dark' ? 'gray.900' : 'gray.50'}
             >
+              {/* Older history, also loaded when scrolling to the top */}
+              {olderCursor && (
+                <Button
+                  size="sm"
+                  variant="ghost"
+                  alignSelf="center"
+                  onClick={loadOlderMessages}
+                  isLoading={isLoadingOlder}
+                >
+                  Load earlier messages
+                </Button>
+              )}
+
               {/* Pinned Messages Section */}
               {currentChannel?.pinned_messages?.length > 0 && (
                 <>
@@ -10,6 +10,18 @@ let socket = null;
 let reconnectTimer = null;
 const RECONNECT_DELAY = 5000; // 5 seconds
 
+// Parent message fields from a thread summary payload, leaving out any it doesn't carry
+const threadSummaryChanges = (data) => {
+  const changes = { reply_count: data.reply_count };
+  if (data.last_reply_at !== undefined) {
+    changes.last_reply_at = data.last_reply_at;
+  }
+  if (data.thread_participants !== undefined) {
+    changes.thread_participants = data.thread_participants;
+  }
+  return changes;
+};
+
 export const initializeSocket = (token) => {
   if (socket) {
     console.log('Socket already initialized');
@@ -61,23 +73,12 @@ export const initializeSocket = (token) => {
   // Listen for new messages
   socket.on('message_created', (data) => {
     console.log('Socket: Message created:', data);
-    // If it's a reply (has parent_id), handle as reply
+    // If it's a reply (has parent_id), handle as reply; adding it counts it on the parent once
     if (data.parent_id) {
       store.dispatch({ 
         type: 'messages/addReply', 
         payload: data 
       });
-      
-      // Update parent message reply count
-      store.dispatch({
-        type: 'messages/updateMessage',
-        payload: {
-          id: data.parent_id,
-          changes: {
-            reply_count: (data.parent_reply_count || 0) + 1
-          }
-        }
-      });
     } else {
       // Handle as normal message
       store.dispatch({ 
@@ -92,6 +93,14 @@ export const initializeSocket = (token) => {
     store.dispatch(updateMessage(message));
   });
 
+  // Tone analysis stored on a message after it was sent
+  socket.on('message_analysis', (data) => {
+    store.dispatch(updateMessage({
+      id: data.message_id,
+      changes: { analysis: data.analysis }
+    }));
+  });
+
   socket.on('message_deleted', (data) => {
     console.log('Received message deletion:', data);
     store.dispatch(deleteMessage({
@@ -203,19 +212,25 @@ export const initializeSocket = (token) => {
     // Add reply to thread
     store.dispatch({ 
       type: 'messages/addReply', 
-      payload: data 
+      payload: data.reply || data 
     });
     
-    // Update parent message reply count
-    store.dispatch({
-      type: 'messages/updateMessage',
-      payload: {
+    // The server sends the parent's thread summary as stored
+    if (data.reply_count !== undefined && data.reply_count !== null) {
+      store.dispatch(updateMessage({
         id: data.parent_id,
-        changes: {
-          reply_count: (data.parent_reply_count || 0) + 1
-        }
-      }
-    });
+        changes: threadSummaryChanges(data)
+      }));
+    }
+  });
+
+  // Thread summary changed without a new reply (e.g. a reply was deleted)
+  socket.on('reply_count_update', (data) => {
+    console.log('Socket: Received reply count update:', data);
+    store.dispatch(updateMessage({
+      id: data.message_id,
+      changes: threadSummaryChanges(data)
+    }));
   });
 
   return socket;
@@ -31,6 +31,15 @@ const messagesSlice = createSlice({
         state.messages[channelId].push(message);
       }
     },
+    prependMessages: (state, action) => {
+      const { channelId, messages } = action.payload;
+      const existing = state.messages[channelId] || [];
+      
+      // Older history goes in front; skip anything already loaded
+      const loadedIds = new Set(existing.map(m => m._id || m.id));
+      const older = messages.filter(m => !loadedIds.has(m._id || m.id));
+      state.messages[channelId] = [...older, ...existing];
+    },
     addReply: (state, action) => {
       const reply = action.payload;
       const parentId = reply.parent_id;
@@ -91,6 +100,7 @@ const messagesSlice = createSlice({
 
 export const {
   setMessages,
+  prependMessages,
   addMessage,
   addReply,
   updateMessage,